@@ -1,22 +1,11 @@
-import sqlite3
+# Antes: adicionava à mão a coluna `fonte` em bancos antigos.
+# Agora o schema é atualizado pelas migrações (app/migracoes.py), que rodam
+# sozinhas na importação; este script só força isso fora do pipeline.
+#
+#   python ajustar_banco.py            (mesmo que: python -m app.migracoes)
+#   python ajustar_banco.py verificar  (confere os planos dos relatórios)
 
-caminho = r".\banco\pendencias.db"
+from app.migracoes import main
 
-con = sqlite3.connect(caminho)
-cur = con.cursor()
-
-# Verificar colunas existentes
-cur.execute("PRAGMA table_info(pendencias_raw)")
-cols = [r[1] for r in cur.fetchall()]
-
-print("Colunas atuais:", cols)
-
-# Criar coluna fonte se não existir
-if "fonte" not in cols:
-    cur.execute("ALTER TABLE pendencias_raw ADD COLUMN fonte TEXT")
-    con.commit()
-    print("OK: coluna 'fonte' criada com sucesso.")
-else:
-    print("OK: coluna 'fonte' já existe.")
-
-con.close()
+if __name__ == "__main__":
+    main()
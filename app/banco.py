@@ -1,7 +1,11 @@
 import sqlite3
 import hashlib
 from datetime import datetime
-from typing import Dict, Any, Iterable, List
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Tuple
+
+from .migracoes import migrar
+from .raw_compacto import iniciar_raw_compacto
 
 def conectar(db_path: str) -> sqlite3.Connection:
     con = sqlite3.connect(db_path)
@@ -10,53 +14,177 @@ def conectar(db_path: str) -> sqlite3.Connection:
     con.execute("PRAGMA foreign_keys=ON;")
     return con
 
+def conectar_leitura(db_path: str) -> sqlite3.Connection:
+    """
+    Só leitura (mode=ro), para as consultas da API: não migra nem cria
+    nada, então o schema já tem que ter passado por iniciar().
+    """
+    return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+
 def iniciar(con: sqlite3.Connection) -> None:
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS pendencias_raw (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      hash_registro TEXT NOT NULL UNIQUE,
+    """
+    Cria/atualiza o schema (pendencias_raw, import_log: ver migracoes.py),
+    o resumo materializado e o RAW compacto.
+    """
+    migrar(con)
+    iniciar_resumo(con)
+    iniciar_raw_compacto(con)
 
-      fonte TEXT,
-      arquivo_origem TEXT,
-      aba_origem TEXT,
-      linha_origem INTEGER,
+# =========================
+# Contribuintes (cnpj, cgf, razao) -> id
+# =========================
+#
+# pendencias_raw guarda só contribuinte_id (migração 4); os textos ficam
+# uma vez em contribuintes. Quem grava monta as tuplas com os três textos
+# na frente e troca pelo id aqui, lote a lote, na transação do INSERT.
 
-      cnpj TEXT,
-      cgf TEXT,
-      razao TEXT,
+_SQL_ID_CONTRIBUINTE = "SELECT id FROM contribuintes WHERE cnpj=? AND cgf=? AND razao=?"
 
-      tipo_pendencia TEXT,
-      periodo TEXT,
-      detalhe TEXT,
+def ids_contribuintes(con: sqlite3.Connection, chaves: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], int]:
+    """{(cnpj, cgf, razao): id}, criando os que ainda não existem. Não faz commit."""
+    distintas = set(chaves)
+    con.executemany("INSERT OR IGNORE INTO contribuintes (cnpj, cgf, razao) VALUES (?,?,?)", distintas)
+    return {k: con.execute(_SQL_ID_CONTRIBUINTE, k).fetchone()[0] for k in distintas}
 
-      valor NUMERIC,
-      data_referencia TEXT,
-      data_coleta TEXT NOT NULL,
+def trocar_contribuintes(con: sqlite3.Connection, linhas: List[tuple]) -> List[tuple]:
+    """(cnpj, cgf, razao, *resto) -> (contribuinte_id, *resto). NULL vira ''."""
+    chaves = [(t[0] or "", t[1] or "", t[2] or "") for t in linhas]
+    ids = ids_contribuintes(con, chaves)
+    return [(ids[k],) + t[3:] for k, t in zip(chaves, linhas)]
 
-      raw_json TEXT
-    );
-    """)
+# =========================
+# Resumo materializado (contribuinte, tipo_pendencia, periodo)
+# =========================
+#
+# Mantido a cada importação, na mesma transação do INSERT em pendencias_raw:
+# só as linhas novas (id > último id antes do lote) são agregadas e somadas
+# ao que já existe. Assim o resumo custa proporcional às linhas novas.
+# Agrupa por contribuinte_id (inteiro); os textos entram só na leitura
+# (resumo._SQL_RESUMO). NOT INDEXED: sem ele o SQLite prefere varrer
+# idx_raw_contribuinte inteiro (já sai agrupado) em vez do intervalo de id.
+
+_SQL_AGREGAR = """
+SELECT
+  contribuinte_id,
+  COALESCE(tipo_pendencia,'') AS tipo_pendencia,
+  COALESCE(periodo,'') AS periodo,
+  COUNT(*) AS qtd,
+  SUM(COALESCE(valor,0)) AS valor_total,
+  MAX(data_coleta) AS ultima_coleta
+FROM pendencias_raw NOT INDEXED
+WHERE id > ? AND COALESCE(tipo_pendencia,'') <> ''
+GROUP BY 1, 2, 3
+"""
 
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_cnpj ON pendencias_raw(cnpj);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_cgf ON pendencias_raw(cgf);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_tipo ON pendencias_raw(tipo_pendencia);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_periodo ON pendencias_raw(periodo);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_fonte ON pendencias_raw(fonte);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_arquivo ON pendencias_raw(arquivo_origem);")
+def iniciar_resumo(con: sqlite3.Connection) -> None:
+    existia = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='resumo_pendencias'"
+    ).fetchone() is not None
 
     con.execute("""
-    CREATE TABLE IF NOT EXISTS import_log (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      arquivo_origem TEXT NOT NULL,
-      hash_arquivo TEXT NOT NULL,
-      data_importacao TEXT NOT NULL,
-      linhas_lidas INTEGER NOT NULL,
-      linhas_inseridas INTEGER NOT NULL,
-      UNIQUE(arquivo_origem, hash_arquivo)
+    CREATE TABLE IF NOT EXISTS resumo_pendencias (
+      contribuinte_id INTEGER NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      periodo TEXT NOT NULL,
+
+      qtd INTEGER NOT NULL,
+      valor_total REAL NOT NULL,
+      ultima_coleta TEXT,
+
+      PRIMARY KEY (contribuinte_id, tipo_pendencia, periodo)
     );
     """)
+
+    # cobre o df_resumo_pendencias (ORDER BY ultima_coleta DESC, qtd DESC)
+    # sem ler a tabela nem ordenar em B-tree temporária
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_resumo_ordem ON resumo_pendencias
+      (ultima_coleta DESC, qtd DESC, contribuinte_id, tipo_pendencia, periodo, valor_total);
+    """)
+
+    # banco antigo (ou migrado para contribuintes): calcula tudo a partir de pendencias_raw
+    if not existia:
+        reconstruir_resumo(con)
     con.commit()
 
+def ultimo_id_raw(con: sqlite3.Connection) -> int:
+    return con.execute("SELECT COALESCE(MAX(id), 0) FROM pendencias_raw").fetchone()[0]
+
+_SQL_SOMAR_RESUMO = """
+INSERT INTO resumo_pendencias
+  (contribuinte_id, tipo_pendencia, periodo, qtd, valor_total, ultima_coleta)
+""" + _SQL_AGREGAR + """
+ON CONFLICT (contribuinte_id, tipo_pendencia, periodo) DO UPDATE SET
+  qtd = qtd + excluded.qtd,
+  valor_total = valor_total + excluded.valor_total,
+  ultima_coleta = CASE
+    WHEN ultima_coleta IS NULL OR excluded.ultima_coleta > ultima_coleta
+    THEN excluded.ultima_coleta ELSE ultima_coleta END;
+"""
+
+def atualizar_resumo(con: sqlite3.Connection, apos_id: int) -> None:
+    """
+    Soma ao resumo as linhas de pendencias_raw com id > apos_id.
+    Não faz commit (roda dentro da transação da importação).
+    """
+    con.execute(_SQL_SOMAR_RESUMO, (apos_id,))
+
+# coletas já arquivadas (particoes.py) não estão mais em pendencias_raw:
+# entram pelo resumo_arquivado
+_SQL_RESUMO_ARQUIVADO = """
+SELECT contribuinte_id, tipo_pendencia, periodo, qtd, valor_total, ultima_coleta
+FROM resumo_arquivado
+"""
+
+def reconstruir_resumo(con: sqlite3.Connection) -> None:
+    """
+    Recalcula resumo_pendencias do zero (resumo_arquivado + GROUP BY em toda
+    a pendencias_raw) e registra em reconstrucoes_resumo (muda versao_dados).
+    """
+    con.execute("DELETE FROM resumo_pendencias;")
+    con.execute("INSERT INTO resumo_pendencias " + _SQL_RESUMO_ARQUIVADO)
+    atualizar_resumo(con, 0)
+    con.execute(
+        "INSERT INTO reconstrucoes_resumo (reconstruido_em) VALUES (?)",
+        (datetime.now().isoformat(timespec="seconds"),),
+    )
+
+def divergencias_resumo(con: sqlite3.Connection) -> int:
+    """
+    Compara o resumo materializado com o GROUP BY completo (qtd,
+    valor_total arredondado, ultima_coleta; mais o já arquivado) e retorna
+    quantas linhas aparecem só de um dos lados. 0 = tudo certo.
+    """
+    sql_completo = f"""
+    SELECT contribuinte_id, tipo_pendencia, periodo, SUM(qtd), ROUND(SUM(valor_total), 2), MAX(ultima_coleta)
+    FROM ({_SQL_AGREGAR} UNION ALL {_SQL_RESUMO_ARQUIVADO})
+    GROUP BY 1, 2, 3
+    """
+    sql_materializado = """
+    SELECT contribuinte_id, tipo_pendencia, periodo, qtd, ROUND(valor_total, 2), ultima_coleta
+    FROM resumo_pendencias
+    """
+    sql = f"""
+    SELECT
+      (SELECT COUNT(*) FROM (SELECT * FROM ({sql_completo}) EXCEPT SELECT * FROM ({sql_materializado})))
+      +
+      (SELECT COUNT(*) FROM (SELECT * FROM ({sql_materializado}) EXCEPT SELECT * FROM ({sql_completo})));
+    """
+    return con.execute(sql, (0, 0)).fetchone()[0]
+
+def versao_dados(con: sqlite3.Connection) -> str:
+    """
+    Muda a cada arquivo importado (último id do import_log), a cada mês de
+    coleta arquivado (particoes_arquivadas), a cada reconstrução do resumo
+    (reconstrucoes_resumo) e a cada migração (user_version):
+    "<schema>.<import>.<arquivo>.<resumo>". Serve de ETag na API.
+    """
+    schema = con.execute("PRAGMA user_version").fetchone()[0]
+    ultimo = con.execute("SELECT COALESCE(MAX(id), 0) FROM import_log").fetchone()[0]
+    arquivado = con.execute("SELECT COALESCE(MAX(id), 0) FROM particoes_arquivadas").fetchone()[0]
+    reconstruido = con.execute("SELECT COALESCE(MAX(id), 0) FROM reconstrucoes_resumo").fetchone()[0]
+    return f"{schema}.{ultimo}.{arquivado}.{reconstruido}"
+
 def _norm(v: Any) -> str:
     return "" if v is None else str(v).strip()
 
@@ -80,6 +208,34 @@ def arquivo_ja_importado(con: sqlite3.Connection, nome: str, h: str) -> bool:
     )
     return cur.fetchone() is not None
 
+# tuplas com (cnpj, cgf, razao) na frente: trocar_contribuintes põe o id no lugar
+_SQL_INSERIR_RAW = """
+INSERT OR IGNORE INTO pendencias_raw (
+  contribuinte_id,
+  hash_registro, fonte, arquivo_origem, aba_origem, linha_origem,
+  tipo_pendencia, periodo, detalhe,
+  valor, data_referencia, data_coleta, raw_json
+) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?);
+"""
+
+def inserir_lote(
+    con: sqlite3.Connection,
+    sql: str,
+    linhas: List[tuple],
+    tamanho_lote: int = 5000,
+) -> int:
+    """
+    executemany em blocos de `tamanho_lote`. Com INSERT OR IGNORE, retorna
+    só as linhas realmente inseridas: rowcount do executemany soma o
+    changes() de cada execução, que não conta gatilhos nem outros comandos
+    da conexão (total_changes contava).
+    """
+    inseridas = 0
+    for i in range(0, len(linhas), max(1, tamanho_lote)):
+        cur = con.executemany(sql, linhas[i:i + tamanho_lote])
+        inseridas += max(cur.rowcount, 0)
+    return inseridas
+
 def inserir_raw(
     con: sqlite3.Connection,
     rows: Iterable[Dict[str, Any]],
@@ -87,13 +243,13 @@ def inserir_raw(
     fonte: str,
     arquivo_origem: str,
     hash_arquivo_str: str,
+    tamanho_lote: int = 5000,
 ) -> Dict[str, int]:
     now = datetime.now().isoformat(timespec="seconds")
     rows_list: List[Dict[str, Any]] = list(rows)
     lidas = len(rows_list)
 
-    cur = con.cursor()
-    inseridas = 0
+    linhas: List[tuple] = []
 
     for i, r in enumerate(rows_list, start=1):
         rr = dict(r)
@@ -106,22 +262,18 @@ def inserir_raw(
 
         rr["hash_registro"] = hash_registro(rr)
 
-        try:
-            cur.execute("""
-            INSERT INTO pendencias_raw (
-              hash_registro, fonte, arquivo_origem, aba_origem, linha_origem,
-              cnpj, cgf, razao, tipo_pendencia, periodo, detalhe,
-              valor, data_referencia, data_coleta, raw_json
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);
-            """, (
-                rr.get("hash_registro"), rr.get("fonte"), rr.get("arquivo_origem"), rr.get("aba_origem"), rr.get("linha_origem"),
-                rr.get("cnpj"), rr.get("cgf"), rr.get("razao"), rr.get("tipo_pendencia"), rr.get("periodo"), rr.get("detalhe"),
-                rr.get("valor"), rr.get("data_referencia"), rr.get("data_coleta"), rr.get("raw_json")
-            ))
-            inseridas += 1
-        except sqlite3.IntegrityError:
-            pass
+        linhas.append((
+            rr.get("cnpj"), rr.get("cgf"), rr.get("razao"),
+            rr.get("hash_registro"), rr.get("fonte"), rr.get("arquivo_origem"), rr.get("aba_origem"), rr.get("linha_origem"),
+            rr.get("tipo_pendencia"), rr.get("periodo"), rr.get("detalhe"),
+            rr.get("valor"), rr.get("data_referencia"), rr.get("data_coleta"), rr.get("raw_json")
+        ))
+
+    id_antes = ultimo_id_raw(con)
+    inseridas = inserir_lote(con, _SQL_INSERIR_RAW, trocar_contribuintes(con, linhas), tamanho_lote)
+    atualizar_resumo(con, id_antes)
 
+    cur = con.cursor()
     cur.execute("""
     INSERT OR IGNORE INTO import_log
     (arquivo_origem, hash_arquivo, data_importacao, linhas_lidas, linhas_inseridas)
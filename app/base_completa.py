@@ -5,9 +5,16 @@ import traceback
 
 from .rodar import main as rodar_pipeline
 from .organizar_arquivos import main as organizar_arquivos
+from .trava import trava_pipeline
 
 
 def main():
+    # as duas etapas sob a mesma trava: nem a API nem outro CLI entram no meio
+    with trava_pipeline(ao_esperar=lambda: print("⏳ Outro pipeline está rodando, aguardando...")):
+        _main()
+
+
+def _main():
     print("==========================================")
     print("🚀 BASE COMPLETA - INICIANDO")
     print("==========================================")
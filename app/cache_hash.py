@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+# =========================
+# Cache de hash de arquivos
+# =========================
+#
+# Importação e organizador calculam o MD5 de cada planilha para saber se
+# ela já foi importada. Arquivo que fica na entrada (copiado em vez de
+# movido) era lido inteiro de novo a cada execução, pelas duas etapas.
+#
+# Aqui guardamos (caminho, tamanho, mtime_ns) -> md5 num SQLite à parte.
+# Se o stat() bate com o que está no cache, não lê o arquivo; se mudou
+# qualquer um dos três, recalcula e atualiza.
+
+# entradas sem uso há mais que isso são apagadas ao abrir o cache
+DIAS_SEM_USO = 30
+
+
+def hash_md5(path: Path) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def abrir_cache(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL;")
+    con.execute("PRAGMA synchronous=NORMAL;")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS cache_hash (
+        caminho TEXT PRIMARY KEY,
+        tamanho INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        hash_md5 TEXT NOT NULL,
+        usado_em TEXT NOT NULL
+    );
+    """)
+    limite = (datetime.now() - timedelta(days=DIAS_SEM_USO)).isoformat(timespec="seconds")
+    con.execute("DELETE FROM cache_hash WHERE usado_em < ?", (limite,))
+    con.commit()
+    return con
+
+
+def consultar_hash(con: sqlite3.Connection, path: Path) -> Tuple[Optional[str], os.stat_result]:
+    """
+    (md5 do cache ou None, stat do arquivo). O stat volta para ser passado a
+    guardar_hash depois do cálculo: se o arquivo mudar enquanto é lido, o
+    mtime gravado é o antigo e a próxima consulta recalcula.
+    """
+    st = path.stat()
+    row = con.execute(
+        "SELECT tamanho, mtime_ns, hash_md5, usado_em FROM cache_hash WHERE caminho=?",
+        (str(path.resolve()),),
+    ).fetchone()
+    if not row or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+        return None, st
+
+    # só regrava usado_em uma vez por dia (leitura pura no caso comum)
+    agora = datetime.now().isoformat(timespec="seconds")
+    if row[3][:10] != agora[:10]:
+        con.execute("UPDATE cache_hash SET usado_em=? WHERE caminho=?", (agora, str(path.resolve())))
+        con.commit()
+    return row[2], st
+
+
+def guardar_hash(con: sqlite3.Connection, path: Path, st: os.stat_result, h: str) -> None:
+    con.execute(
+        """
+        INSERT INTO cache_hash (caminho, tamanho, mtime_ns, hash_md5, usado_em)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(caminho) DO UPDATE SET
+            tamanho=excluded.tamanho, mtime_ns=excluded.mtime_ns,
+            hash_md5=excluded.hash_md5, usado_em=excluded.usado_em
+        """,
+        (str(path.resolve()), st.st_size, st.st_mtime_ns, h, datetime.now().isoformat(timespec="seconds")),
+    )
+    con.commit()
+
+
+def hash_com_cache(con: Optional[sqlite3.Connection], path: Path) -> str:
+    """
+    MD5 do arquivo, lendo o conteúdo só se tamanho/mtime mudaram desde a
+    última vez. con=None: sempre calcula (sem cache).
+    """
+    if con is None:
+        return hash_md5(path)
+
+    h, st = consultar_hash(con, path)
+    if h is None:
+        h = hash_md5(path)
+        guardar_hash(con, path, st, h)
+    return h
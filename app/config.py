@@ -9,6 +9,10 @@ PASTA_ERROS = ROOT / "erros"
 
 PASTA_BANCO = ROOT / "banco"
 DB_PATH = PASTA_BANCO / "pendencias.db"
+# um pipeline por vez escrevendo no banco (API, rodar, base_completa)
+TRAVA_PATH = PASTA_BANCO / "pipeline.lock"
+# md5 das planilhas por (caminho, tamanho, mtime): evita reler arquivo que não mudou
+CACHE_HASH_PATH = PASTA_BANCO / "cache_hash.db"
 
 # Planilha do gestor (ID)
 GESTAO_SPREADSHEET_ID = os.getenv("GESTAO_SPREADSHEET_ID", "1oGbxbJ9VKN85n6DhbiBok7qkNWd8JhuJTVF8kgHbtwA")
@@ -21,10 +25,52 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive",
 ]
 
-# ✅ SOMENTE 3 ABAS
+# ✅ SOMENTE 4 ABAS
 ABA_RESUMO_PENDENCIAS = "RESUMO_PENDENCIAS"
 ABA_DETALHES = "DETALHES"
+ABA_EVENTOS = "EVENTOS"  # NOVA/RESOLVIDA/ALTERADA entre coletas (eventos.py)
 ABA_STATUS = "STATUS"
 
 MAX_LINHAS_EXPORT = 50000
 MAX_LINHAS_DETALHES = 200000  # detalhes pode ser grande
+MAX_LINHAS_EVENTOS = 50000  # no Sheets, os mais recentes
+
+# Para onde exportar, separados por vírgula: "sheets" (planilha do gestor, com
+# os cortes acima), "xlsx" e "csv" (arquivos em PASTA_SAIDA, sem corte)
+DESTINOS_EXPORT = [d.strip().lower() for d in os.getenv("DESTINOS_EXPORT", "sheets").split(",") if d.strip()]
+PASTA_SAIDA = ROOT / "saida"
+ARQUIVO_XLSX = PASTA_SAIDA / "pendencias.xlsx"
+
+# hashes do que já foi escrito em cada aba (exportação por delta)
+ESTADO_EXPORT_PATH = PASTA_BANCO / "estado_export.json"
+# versão dos dados já exportada por destino + contagens do último resumo:
+# sem importação nova, a execução só atualiza o STATUS
+ESTADO_SAIDAS_PATH = PASTA_BANCO / "estado_saidas.json"
+# "1" = resume e exporta mesmo sem dados novos (igual a rodar --forcar / POST /run?forcar=true)
+FORCAR_SAIDAS = os.getenv("FORCAR_SAIDAS", "0") == "1"
+
+# meses de coleta que ficam no banco quente além do atual; os mais antigos vão
+# para um SQLite comprimido por mês em PASTA_ARQUIVO (ver particoes.py). 0 = não arquiva
+ARQUIVAR_APOS_MESES = int(os.getenv("ARQUIVAR_APOS_MESES", "0"))
+PASTA_ARQUIVO = PASTA_BANCO / "arquivo"
+
+# snapshot Parquet de pendencias_raw para análise (precisa de pyarrow; sem ele a etapa é pulada)
+SNAPSHOT_DIR = PASTA_BANCO / "snapshot"
+SNAPSHOT_ATIVO = os.getenv("SNAPSHOT_ATIVO", "1") == "1"
+
+# Cota do Sheets: ~60 escritas/min por usuário; fica uma folga para o STATUS e retries
+SHEETS_REQ_POR_MINUTO = int(os.getenv("SHEETS_REQ_POR_MINUTO", "50"))
+SHEETS_CELULAS_POR_BLOCO = int(os.getenv("SHEETS_CELULAS_POR_BLOCO", "50000"))
+
+# Leitura das planilhas: "auto" (calamine se instalado, senão openpyxl), "calamine" ou "openpyxl"
+MOTOR_EXCEL = os.getenv("MOTOR_EXCEL", "auto")
+TAMANHO_LOTE = int(os.getenv("TAMANHO_LOTE", "5000"))  # linhas por lote na importação
+# processos lendo/normalizando planilhas em paralelo (1 = sequencial)
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+# compressão do RAW de auditoria: "auto" (zstd se instalado, senão zlib), "zlib" ou "zstd"
+CODEC_RAW = os.getenv("CODEC_RAW", "auto")
+
+# Vigia da pasta de entrada (python -m app.vigiar), em segundos
+VIGIAR_ESTABILIDADE = float(os.getenv("VIGIAR_ESTABILIDADE", "3"))  # tamanho/mtime parados por esse tempo
+VIGIAR_VARREDURA = float(os.getenv("VIGIAR_VARREDURA", "5"))  # sem inotify: intervalo entre varreduras
+VIGIAR_INTERVALO_SAIDAS = float(os.getenv("VIGIAR_INTERVALO_SAIDAS", "30"))  # resumo + Sheets no máximo 1x nesse intervalo
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import base64
+import heapq
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from .normalizar import limpar_cgf, limpar_cnpj_raiz
+
+
+# =========================
+# Consultas da API (GET /pendencias, GET /resumo)
+# =========================
+#
+# Para o auditor que quer as pendências de uma empresa sem abrir a aba
+# DETALHES inteira. Tudo sai por índice:
+#   - cnpj/cgf viram ids de contribuintes (UNIQUE(cnpj, cgf, razao), ou
+#     idx_contribuintes_cgf quando vem só o cgf);
+#     pendencias_raw por idx_raw_contribuinte, resumo pela chave primária
+#   - paginação por chave (keyset), nunca OFFSET: a página seguinte começa
+#     depois da última linha devolvida, então a página 500 custa o mesmo
+#     que a primeira e não pula/repete linha se entrar importação no meio
+#       /pendencias: id decrescente (mais recentes primeiro)
+#       /resumo:     (contribuinte_id, tipo_pendencia, periodo)
+#   - o cursor volta em "proximo" (texto opaco; None = acabou)
+#   - nada de SCAN da tabela inteira nem B-tree temporária no plano
+#     (tests/test_planos.py confere as consultas que saem daqui)
+#
+# banco.versao_dados (user_version + último import_log + arquivo +
+# reconstrução do resumo) vira o ETag: entre duas importações a mesma
+# pergunta devolve 304 ao cliente, ou sai do CacheConsultas sem tocar no
+# banco.
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+_ID_MAXIMO = 2 ** 63 - 1  # "cursor" da primeira página de /pendencias
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _codificar_cursor(valores: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(valores).encode("utf-8")).decode("ascii")
+
+
+def _ler_cursor(cursor: Optional[str], tipos: Tuple[type, ...]) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(valores, list) or len(valores) != len(tipos):
+            raise ValueError
+        return [tipo(v) for tipo, v in zip(tipos, valores)]
+    except Exception:
+        raise CursorInvalido(f"cursor inválido: {cursor!r}")
+
+
+def _ids_contribuintes(con: sqlite3.Connection, cnpj: Optional[str], cgf: Optional[str]) -> Optional[List[int]]:
+    """ids de contribuintes com esse cnpj/cgf (só dígitos, como gravados); None = sem filtro."""
+    conds, params = [], []
+    if cnpj:
+        conds.append("cnpj = ?")
+        params.append(limpar_cnpj_raiz(cnpj))
+    if cgf:
+        conds.append("cgf = ?")
+        params.append(limpar_cgf(cgf))
+    if not conds:
+        return None
+    sql = f"SELECT id FROM contribuintes WHERE {' AND '.join(conds)}"
+    return [r[0] for r in con.execute(sql, params)]
+
+
+def _pagina(cur: sqlite3.Cursor, limite: int) -> List[Dict[str, Any]]:
+    colunas = [d[0] for d in cur.description]
+    return [dict(zip(colunas, r)) for r in cur.fetchmany(limite)]
+
+
+# =========================
+# GET /pendencias
+# =========================
+
+_SQL_PENDENCIAS = """
+SELECT
+  r.id,
+  c.cnpj,
+  c.cgf,
+  c.razao,
+  r.tipo_pendencia,
+  COALESCE(r.periodo,'') AS periodo,
+  CAST(COALESCE(r.valor,0) AS REAL) AS valor,
+  COALESCE(r.detalhe,'') AS detalhe,
+  COALESCE(r.data_referencia,'') AS data_referencia,
+  COALESCE(r.arquivo_origem,'') AS arquivo_origem,
+  COALESCE(r.aba_origem,'') AS aba_origem,
+  r.linha_origem,
+  COALESCE(r.data_coleta,'') AS data_coleta
+FROM pendencias_raw r
+JOIN contribuintes c ON c.id = r.contribuinte_id
+WHERE {filtros}
+ORDER BY r.id DESC
+LIMIT ?
+"""
+
+
+def _linhas_pendencias(con: sqlite3.Connection, filtros: List[str], params: List[Any], n: int) -> List[Dict[str, Any]]:
+    cur = con.execute(_SQL_PENDENCIAS.format(filtros=" AND ".join(filtros)), params + [n])
+    itens = _pagina(cur, n)
+    cur.close()
+    return itens
+
+
+def consultar_pendencias(
+    con: sqlite3.Connection,
+    *,
+    cnpj: Optional[str] = None,
+    cgf: Optional[str] = None,
+    tipo: Optional[str] = None,
+    periodo: Optional[str] = None,
+    limite: int = LIMITE_PADRAO,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Linhas classificadas de pendencias_raw (as mesmas da aba DETALHES), mais recentes primeiro."""
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    apos = _ler_cursor(cursor, (int,))
+
+    ids = _ids_contribuintes(con, cnpj, cgf)
+    if ids is not None and not ids:
+        return {"itens": [], "proximo": None}
+
+    # id < ? sempre, até na primeira página: sem filtro a consulta anda pela
+    # chave primária de trás para frente em vez de um SCAN da tabela
+    filtros = ["COALESCE(r.tipo_pendencia,'') <> ''", "r.id < ?"]
+    params: List[Any] = [apos[0] if apos is not None else _ID_MAXIMO]
+    # com contribuinte, o índice dele é o mais seletivo; sem estatísticas o
+    # SQLite preferiria idx_raw_tipo/idx_raw_periodo (duas restrições com o
+    # id < ?), então o "+" tira esses índices da escolha
+    mais = "+" if ids is not None else ""
+    if tipo:
+        filtros.append(f"{mais}r.tipo_pendencia = ?")
+        params.append(tipo)
+    if periodo:
+        filtros.append(f"{mais}r.periodo = ?")
+        params.append(periodo)
+
+    # uma a mais: diz se existe página seguinte sem um COUNT(*)
+    if ids is None:
+        itens = _linhas_pendencias(con, filtros, params, limite + 1)
+    else:
+        # um cnpj costuma ter vários cgf: com contribuinte_id IN (...) o
+        # SQLite perde a ordem do índice e ordena numa B-tree temporária.
+        # Uma consulta por id (cada uma já em id decrescente) e junta aqui
+        filtros.append("r.contribuinte_id = ?")
+        paginas = [_linhas_pendencias(con, filtros, params + [i], limite + 1) for i in ids]
+        itens = list(islice(heapq.merge(*paginas, key=lambda item: item["id"], reverse=True), limite + 1))
+
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo = _codificar_cursor([itens[-1]["id"]])
+    return {"itens": itens, "proximo": proximo}
+
+
+# =========================
+# GET /resumo
+# =========================
+
+_SQL_RESUMO_API = """
+SELECT
+  r.contribuinte_id,
+  c.cnpj,
+  c.cgf,
+  c.razao,
+  r.tipo_pendencia,
+  r.periodo,
+  r.qtd,
+  ROUND(r.valor_total, 2) AS valor_total,
+  r.ultima_coleta
+FROM resumo_pendencias r
+JOIN contribuintes c ON c.id = r.contribuinte_id
+WHERE {filtros}
+ORDER BY r.contribuinte_id, r.tipo_pendencia, r.periodo
+LIMIT ?
+"""
+
+
+def _linhas_resumo(con: sqlite3.Connection, filtros: List[str], params: List[Any], n: int) -> List[Dict[str, Any]]:
+    cur = con.execute(_SQL_RESUMO_API.format(filtros=" AND ".join(filtros) or "1"), params + [n])
+    itens = _pagina(cur, n)
+    cur.close()
+    return itens
+
+
+def consultar_resumo(
+    con: sqlite3.Connection,
+    *,
+    cnpj: Optional[str] = None,
+    cgf: Optional[str] = None,
+    tipo: Optional[str] = None,
+    periodo: Optional[str] = None,
+    limite: int = LIMITE_PADRAO,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Linhas de resumo_pendencias (as mesmas da aba RESUMO_PENDENCIAS), na ordem da chave primária."""
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    apos = _ler_cursor(cursor, (int, str, str))
+
+    ids = _ids_contribuintes(con, cnpj, cgf)
+    if ids is not None and not ids:
+        return {"itens": [], "proximo": None}
+
+    filtros: List[str] = []
+    params: List[Any] = []
+    if tipo:
+        # "+": com tipo_pendencia = ? o SQLite tira o tipo do ORDER BY e
+        # ordena o resto numa B-tree temporária em vez de seguir a chave
+        filtros.append("+r.tipo_pendencia = ?")
+        params.append(tipo)
+    if periodo:
+        filtros.append("r.periodo = ?")
+        params.append(periodo)
+    if apos is not None:
+        filtros.append("(r.contribuinte_id, r.tipo_pendencia, r.periodo) > (?, ?, ?)")
+        params.extend(apos)
+
+    if ids is None:
+        itens = _linhas_resumo(con, filtros, params, limite + 1)
+    else:
+        # como em /pendencias, nada de IN (...): a ordem começa pelo
+        # contribuinte_id, então as consultas por id, em ordem, já se emendam
+        filtros.append("r.contribuinte_id = ?")
+        itens = []
+        for i in sorted(ids):
+            itens += _linhas_resumo(con, filtros, params + [i], limite + 1 - len(itens))
+            if len(itens) > limite:
+                break
+
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        u = itens[-1]
+        proximo = _codificar_cursor([u["contribuinte_id"], u["tipo_pendencia"], u["periodo"]])
+    for item in itens:
+        del item["contribuinte_id"]
+    return {"itens": itens, "proximo": proximo}
+
+
+# =========================
+# Cache por versão dos dados
+# =========================
+
+class CacheConsultas:
+    """
+    Respostas por (consulta, parâmetros), válidas enquanto versao_dados não
+    muda: a primeira chamada depois de uma importação esvazia tudo.
+    Uma instância por processo da API (as rotas rodam em threads).
+    """
+
+    def __init__(self, max_itens: int = 512):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.faltas = 0
+        self._versao: Optional[str] = None
+        self._itens: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, versao: str, chave: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        with self._trava:
+            if versao != self._versao:
+                self._versao = versao
+                self._itens.clear()
+            valor = self._itens.get(chave)
+            if valor is None:
+                self.faltas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(self, versao: str, chave: Tuple[Any, ...], valor: Dict[str, Any]) -> None:
+        with self._trava:
+            if versao != self._versao:
+                return
+            self._itens[chave] = valor
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+
+CONSULTAS = {
+    "pendencias": consultar_pendencias,
+    "resumo": consultar_resumo,
+}
+
+
+def consultar(
+    con: sqlite3.Connection,
+    cache: CacheConsultas,
+    versao: str,
+    nome: str,
+    **parametros: Any,
+) -> Dict[str, Any]:
+    """Resposta de CONSULTAS[nome] para a versão dos dados `versao` (de versao_dados), do cache quando possível."""
+    chave = (nome,) + tuple(sorted(parametros.items()))
+    resposta = cache.obter(versao, chave)
+    if resposta is None:
+        resposta = {"versao": versao, **CONSULTAS[nome](con, **parametros)}
+        cache.guardar(versao, chave, resposta)
+    return resposta
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+import pandas as pd
+
+from .telemetria import Telemetria
+
+
+# =========================
+# Destinos da exportação
+# =========================
+#
+# O rodar.py entrega os mesmos dados (resumo, detalhes, eventos, texto de
+# status) a cada destino configurado em DESTINOS_EXPORT:
+#   - "sheets": planilha do gestor (exportar.DestinoSheets), com corte em
+#     MAX_LINHAS_EXPORT / MAX_LINHAS_DETALHES
+#   - "xlsx" / "csv": arquivos locais em PASTA_SAIDA
+#     (exportar_local.DestinoXlsx / DestinoCsv), sem corte e em streaming
+#
+# Um destino novo só precisa herdar de Destino e implementar exportar()
+# (abstrato: sem ele, a classe já falha ao ser instanciada em _criar_destinos).
+#
+# Sem dados novos (versão dos dados igual à da última exportação, ver
+# rodar._atualizar_saidas) o destino não é reescrito: só exportar_status,
+# para o STATUS mostrar a execução de agora. alvo() identifica o que foi
+# escrito (trocou a planilha/arquivo -> exporta de novo) e saida_existe()
+# diz se continua lá.
+
+# DataFrame já carregado, ou função que gera os lotes (chamada a cada
+# leitura: o Sheets lê a fonte duas vezes, uma para os hashes e outra para
+# enviar; com lotes, nenhuma das duas junta tudo em memória).
+FonteDados = Union[pd.DataFrame, Callable[[], Iterable[pd.DataFrame]]]
+
+
+def lotes_da_fonte(fonte: FonteDados) -> Iterator[pd.DataFrame]:
+    return iter([fonte]) if isinstance(fonte, pd.DataFrame) else iter(fonte())
+
+
+class Destino(ABC):
+    nome = "destino"
+
+    # quantas linhas o destino aceita (None = todas). O rodar.py corta os
+    # detalhes já no SQL (LIMIT) com esse valor.
+    max_linhas_resumo: Optional[int] = None
+    max_linhas_detalhes: Optional[int] = None
+    max_linhas_eventos: Optional[int] = None
+
+    @abstractmethod
+    def exportar(
+        self,
+        *,
+        df_resumo: FonteDados,
+        df_detalhes: FonteDados,
+        texto_status: str,
+        df_eventos: Optional[FonteDados] = None,
+        telemetria: Optional[Telemetria] = None,
+    ) -> Any:
+        """df_eventos: aba de eventos (eventos.py); None = destino sem essa aba."""
+
+    def exportar_status(self, texto_status: str, telemetria: Optional[Telemetria] = None) -> None:
+        """Reescreve só o STATUS (padrão: nada; o STATUS fica o da última exportação)."""
+
+    def alvo(self) -> str:
+        return self.nome
+
+    def saida_existe(self) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.nome}>"
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from gspread.utils import rowcol_to_a1
+
+
+# =========================
+# Envio para o Sheets em blocos, dentro da cota
+# =========================
+#
+# - divide os valores em blocos de até `celulas_por_bloco` células
+# - no máximo `req_por_minuto` chamadas por janela de 60s
+# - erro temporário (429 / 5xx / conexão): espera exponencial e tenta de novo
+# - cada bloco confirmado fica registrado em `checkpoints`; se a execução
+#   cair no meio, a próxima continua do último bloco confirmado
+#   (desde que os valores sejam os mesmos)
+
+STATUS_TEMPORARIOS = (429, 500, 502, 503, 504)
+
+
+def _status(e: Exception) -> Optional[int]:
+    resp = getattr(e, "response", None)
+    status = getattr(resp, "status_code", None)
+    if status is None:
+        status = getattr(e, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def erro_temporario(e: Exception) -> bool:
+    if _status(e) in STATUS_TEMPORARIOS:
+        return True
+    try:
+        import requests
+        return isinstance(e, (requests.ConnectionError, requests.Timeout))
+    except Exception:
+        return False
+
+
+def assinatura_valores(values: List[List[Any]]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for linha in values:
+        h.update("\x1f".join(map(str, linha)).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+class EnvioSheets:
+    """
+    Agenda as chamadas ao Sheets: orçamento de requisições por minuto,
+    retry com backoff exponencial e blocos com checkpoint.
+
+    `checkpoints` é um dict persistido pelo chamador; `ao_confirmar` é
+    chamado depois de cada bloco confirmado (para salvar esse dict).
+    """
+
+    def __init__(
+        self,
+        *,
+        req_por_minuto: int = 50,
+        celulas_por_bloco: int = 50000,
+        tentativas: int = 6,
+        espera_inicial: float = 2.0,
+        espera_maxima: float = 64.0,
+        checkpoints: Optional[Dict[str, Any]] = None,
+        ao_confirmar: Optional[Callable[[], None]] = None,
+        relogio: Callable[[], float] = time.monotonic,
+        dormir: Callable[[float], None] = time.sleep,
+    ):
+        self.req_por_minuto = max(1, req_por_minuto)
+        self.celulas_por_bloco = max(1, celulas_por_bloco)
+        self.tentativas = max(1, tentativas)
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.checkpoints = checkpoints if checkpoints is not None else {}
+        self.ao_confirmar = ao_confirmar
+        self.relogio = relogio
+        self.dormir = dormir
+
+        self._chamadas: Deque[float] = deque()
+        self.requisicoes = 0
+        self.retentativas = 0
+
+    # -------------------------
+    # cota + retry
+    # -------------------------
+
+    def _aguardar_cota(self) -> None:
+        agora = self.relogio()
+        while self._chamadas and agora - self._chamadas[0] >= 60.0:
+            self._chamadas.popleft()
+
+        if len(self._chamadas) >= self.req_por_minuto:
+            self.dormir(60.0 - (agora - self._chamadas[0]))
+            self._chamadas.popleft()
+
+        self._chamadas.append(self.relogio())
+
+    def chamar(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Chamada idempotente (update/clear): tenta de novo em 429, 5xx e falha de conexão."""
+        return self._chamar(fn, args, kwargs, idempotente=True)
+
+    def chamar_uma_vez(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Chamada que não pode ser repetida às cegas (inserir/apagar linhas):
+        só tenta de novo em 429, quando o Google garante que nada foi aplicado.
+        """
+        return self._chamar(fn, args, kwargs, idempotente=False)
+
+    def _chamar(self, fn: Callable[..., Any], args: Any, kwargs: Any, idempotente: bool) -> Any:
+        for tentativa in range(self.tentativas):
+            self._aguardar_cota()
+            self.requisicoes += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                repetir = erro_temporario(e) if idempotente else _status(e) == 429
+                if not repetir or tentativa == self.tentativas - 1:
+                    raise
+                self.retentativas += 1
+                espera = min(self.espera_maxima, self.espera_inicial * (2 ** tentativa))
+                self.dormir(espera + random.uniform(0, espera / 4))
+
+    # -------------------------
+    # blocos
+    # -------------------------
+
+    def linhas_por_bloco(self, ncols: int) -> int:
+        return max(1, self.celulas_por_bloco // max(1, ncols))
+
+    def enviar_valores(
+        self,
+        ws: Any,
+        values: Iterable[List[Any]],
+        chave: str,
+        *,
+        limpar: Callable[[], None] | None = None,
+        assinatura: Optional[str] = None,
+        ncols: Optional[int] = None,
+    ) -> None:
+        """
+        Escreve `values` a partir de A1, bloco a bloco.
+        `limpar` roda antes do primeiro bloco (não roda quando está retomando).
+
+        `values` pode ser um iterador (streaming): aí `assinatura` e `ncols`
+        vêm do chamador e só um bloco fica em memória por vez.
+        """
+        if assinatura is None or ncols is None:
+            values = list(values)
+            if not values:
+                if limpar is not None:
+                    self.chamar(limpar)
+                return
+            assinatura = assinatura_valores(values)
+            ncols = len(values[0])
+
+        n = self.linhas_por_bloco(ncols)
+
+        cp = self.checkpoints.get(chave)
+        if cp and cp.get("assinatura") == assinatura and cp.get("linhas_por_bloco") == n:
+            inicio = int(cp.get("blocos_ok", 0))
+        else:
+            inicio = 0
+            if limpar is not None:
+                self.chamar(limpar)
+            self.checkpoints[chave] = {"assinatura": assinatura, "linhas_por_bloco": n, "blocos_ok": 0}
+            self._confirmar()
+
+        linhas = iter(values)
+        b = 0
+        while True:
+            bloco = list(islice(linhas, n))
+            if not bloco:
+                break
+            if b >= inicio:
+                self.chamar(ws.update, values=bloco, range_name=rowcol_to_a1(b * n + 1, 1))
+                self.checkpoints[chave]["blocos_ok"] = b + 1
+                self._confirmar()
+            b += 1
+
+        # terminou: não há o que retomar
+        self.checkpoints.pop(chave, None)
+        self._confirmar()
+
+    def enviar_trechos(self, ws: Any, trechos: Iterable[Dict[str, Any]]) -> None:
+        """
+        ws.batch_update com vários ranges, agrupados para cada chamada ficar
+        abaixo de `celulas_por_bloco` (trecho grande demais é quebrado).
+        """
+        lote: List[Dict[str, Any]] = []
+        celulas = 0
+
+        for t in self._quebrar_trechos(trechos):
+            c = sum(len(linha) for linha in t["values"])
+            if lote and celulas + c > self.celulas_por_bloco:
+                self.chamar(ws.batch_update, lote)
+                lote, celulas = [], 0
+            lote.append(t)
+            celulas += c
+
+        if lote:
+            self.chamar(ws.batch_update, lote)
+
+    def _quebrar_trechos(self, trechos: Iterable[Dict[str, Any]]):
+        for t in trechos:
+            values = t["values"]
+            linha0 = t["linha"]
+            if not values:
+                continue
+            ncols = len(values[0])
+            n = self.linhas_por_bloco(ncols)
+            for i in range(0, len(values), n):
+                parte = values[i:i + n]
+                yield {
+                    "range": f"{rowcol_to_a1(linha0 + i, 1)}:{rowcol_to_a1(linha0 + i + len(parte) - 1, ncols)}",
+                    "values": parte,
+                }
+
+    def _confirmar(self) -> None:
+        if self.ao_confirmar is not None:
+            self.ao_confirmar()
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from .normalizar import regra_da_aba
+from .regras_abas import REGRAS
+
+
+# =========================
+# Eventos entre coletas (NOVA / RESOLVIDA / ALTERADA)
+# =========================
+#
+# Chave de negócio de uma pendência:
+#   tipo_pendencia + cnpj + cgf + periodo + item
+# com o item vindo da regra da aba (regras_abas "item": CHAVE DFE,
+# COD_RECEITA, ...), gravado em pendencias_raw.item.
+#
+# pendencias_vigentes guarda, por chave, o que a coleta mais recente de
+# cada contribuinte/tipo trouxe (qtd de linhas e valor somado). Cada
+# arquivo importado é comparado com ela, na mesma transação da inserção:
+#   - só as linhas novas (id > último id antes do arquivo, pela rowid)
+#     viram o conjunto de chaves da coleta, numa tabela temporária
+#   - o escopo da coleta é (contribuintes presentes no arquivo) x (tipos
+#     das abas lidas): pendência de fora do escopo não é dada como
+#     resolvida só porque o arquivo não trazia aquele contribuinte/aba
+#   - NOVA:      chave da coleta que não está em vigentes
+#     RESOLVIDA: chave vigente do escopo que não veio na coleta
+#     ALTERADA:  chave nos dois, com qtd, valor (2 casas) ou rótulos
+#                diferentes
+#   - rótulos: numa aba com `marcas` (Outros limitadores) o item é vazio,
+#     uma pendência por contribuinte, e os rótulos marcados (o detalhe:
+#     "CADIN=SIM; ...") são comparados como valor: trocar um rótulo é uma
+#     ALTERADA, não RESOLVIDA + NOVA
+#   todas por chave primária; nem pendencias_raw nem vigentes são
+#   varridas inteiras
+#
+# A primeira coleta de cada (contribuinte, tipo) é a base: entra em
+# vigentes sem gerar evento (senão o primeiro arquivo depois da migração
+# viraria um evento por linha). Limitação: aba vazia não chega ao
+# importador, então um tipo que zerou para todos no arquivo não fecha.
+
+NOVA = "NOVA"
+RESOLVIDA = "RESOLVIDA"
+ALTERADA = "ALTERADA"
+
+_CHAVE = ("cnpj", "cgf", "tipo_pendencia", "periodo", "item")
+_MESMA_CHAVE = " AND ".join(f"{{a}}.{c} = {{b}}.{c}" for c in _CHAVE)
+_MESMO_ESCOPO = " AND ".join(f"{{a}}.{c} = {{b}}.{c}" for c in _CHAVE[:3])
+
+_TIPOS_COM_ROTULOS = ", ".join(f"'{r['tipo']}'" for r in REGRAS if r.get("marcas"))
+
+
+def _iniciar_temporarias(con: sqlite3.Connection) -> None:
+    # *_anterior: o que vigentes tinha para a chave (NULL = não tinha)
+    con.execute("""
+    CREATE TEMP TABLE IF NOT EXISTS chaves_coleta (
+      cnpj TEXT NOT NULL,
+      cgf TEXT NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      periodo TEXT NOT NULL,
+      item TEXT NOT NULL,
+      contribuinte_id INTEGER NOT NULL,
+      qtd INTEGER NOT NULL,
+      valor_total REAL NOT NULL,
+      rotulos TEXT NOT NULL,
+      qtd_anterior INTEGER,
+      valor_anterior REAL,
+      rotulos_anterior TEXT,
+      PRIMARY KEY (cnpj, cgf, tipo_pendencia, periodo, item)
+    ) WITHOUT ROWID;
+    """)
+    con.execute("""
+    CREATE TEMP TABLE IF NOT EXISTS escopo_coleta (
+      cnpj TEXT NOT NULL,
+      cgf TEXT NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      PRIMARY KEY (cnpj, cgf, tipo_pendencia)
+    ) WITHOUT ROWID;
+    """)
+    con.execute("DELETE FROM temp.chaves_coleta")
+    con.execute("DELETE FROM temp.escopo_coleta")
+
+
+def tipos_das_abas(abas: Iterable[str]) -> List[str]:
+    """tipo_pendencia de cada aba com regra (sem repetir)."""
+    tipos = {regra["tipo"] for regra in map(regra_da_aba, abas) if regra is not None}
+    return sorted(tipos)
+
+
+_SQL_CHAVES_COLETA = f"""
+INSERT INTO temp.chaves_coleta
+SELECT n.*, v.qtd, v.valor_total, v.rotulos
+FROM (
+  SELECT
+    c.cnpj, c.cgf, r.tipo_pendencia, COALESCE(r.periodo,'') AS periodo, COALESCE(r.item,'') AS item,
+    MAX(r.contribuinte_id), COUNT(*), ROUND(SUM(COALESCE(r.valor,0)), 2),
+    CASE WHEN r.tipo_pendencia IN ({_TIPOS_COM_ROTULOS}) THEN MAX(COALESCE(r.detalhe,'')) ELSE '' END
+  FROM pendencias_raw r NOT INDEXED
+  JOIN contribuintes c ON c.id = r.contribuinte_id
+  WHERE r.id > ? AND COALESCE(r.tipo_pendencia,'') <> ''
+  GROUP BY 1, 2, 3, 4, 5
+) n
+LEFT JOIN pendencias_vigentes v ON {_MESMA_CHAVE.format(a='v', b='n')}
+"""
+
+_SQL_ESCOPO_COLETA = """
+INSERT INTO temp.escopo_coleta
+SELECT DISTINCT c.cnpj, c.cgf, t.tipo
+FROM (SELECT DISTINCT contribuinte_id FROM pendencias_raw NOT INDEXED WHERE id > ?) r
+JOIN contribuintes c ON c.id = r.contribuinte_id
+CROSS JOIN (SELECT value AS tipo FROM json_each(?)) t
+"""
+
+_SQL_INSERIR_EVENTO = """
+INSERT INTO eventos_pendencias (
+  evento, data_coleta, arquivo_origem, contribuinte_id,
+  cnpj, cgf, tipo_pendencia, periodo, item,
+  qtd_anterior, valor_anterior, qtd, valor,
+  rotulos_anterior, rotulos
+)
+"""
+
+_MUDOU = (
+    "(n.qtd_anterior IS NULL OR n.qtd_anterior <> n.qtd"
+    " OR ROUND(n.valor_anterior, 2) <> n.valor_total OR n.rotulos_anterior <> n.rotulos)"
+)
+
+# CROSS JOIN fixa a ordem: percorre o escopo e busca vigentes pelo prefixo
+# da chave primária (sem isso o SQLite varre vigentes inteira)
+_RESOLVIDAS = f"""
+FROM temp.escopo_coleta e
+CROSS JOIN pendencias_vigentes v ON {_MESMO_ESCOPO.format(a='v', b='e')}
+WHERE NOT EXISTS (SELECT 1 FROM temp.chaves_coleta n WHERE {_MESMA_CHAVE.format(a='n', b='v')})
+"""
+
+
+def registrar_eventos(con: sqlite3.Connection, apos_id: int, tipos: Iterable[str]) -> Dict[str, int]:
+    """
+    Compara as linhas com id > apos_id (um arquivo recém-inserido) com
+    pendencias_vigentes, grava os eventos e atualiza vigentes/escopos.
+    `tipos`: os das abas lidas no arquivo (tipos_das_abas).
+    Não faz commit (roda dentro da transação da importação).
+    Retorna quantos eventos de cada tipo.
+    """
+    tipos = list(tipos)
+    contagem = {NOVA: 0, RESOLVIDA: 0, ALTERADA: 0}
+    if not tipos:
+        return contagem
+
+    data_coleta, arquivo = con.execute(
+        "SELECT MAX(data_coleta), MAX(arquivo_origem) FROM pendencias_raw NOT INDEXED WHERE id > ?", (apos_id,)
+    ).fetchone()
+    if data_coleta is None and arquivo is None:
+        return contagem
+
+    # conjunto de chaves da coleta (só as linhas do arquivo, pela rowid),
+    # já com o estado anterior de cada chave: uma busca em vigentes por chave
+    _iniciar_temporarias(con)
+    con.execute(_SQL_CHAVES_COLETA, (apos_id,))
+    con.execute(_SQL_ESCOPO_COLETA, (apos_id, json.dumps(tipos)))
+    coleta = (data_coleta, arquivo)
+
+    # base: escopo ainda não coletado não gera evento
+    ja_coletado = f"EXISTS (SELECT 1 FROM escopos_coletados s WHERE {_MESMO_ESCOPO.format(a='s', b='n')})"
+    for (evento,) in con.execute(_SQL_INSERIR_EVENTO + f"""
+    SELECT CASE WHEN n.qtd_anterior IS NULL THEN '{NOVA}' ELSE '{ALTERADA}' END, ?, ?, n.contribuinte_id,
+           n.cnpj, n.cgf, n.tipo_pendencia, n.periodo, n.item,
+           n.qtd_anterior, n.valor_anterior, n.qtd, n.valor_total,
+           NULLIF(n.rotulos_anterior, ''), NULLIF(n.rotulos, '')
+    FROM temp.chaves_coleta n
+    WHERE {_MUDOU} AND (n.qtd_anterior IS NOT NULL OR {ja_coletado})
+    RETURNING evento
+    """, coleta).fetchall():
+        contagem[evento] += 1
+
+    contagem[RESOLVIDA] = con.execute(_SQL_INSERIR_EVENTO + f"""
+    SELECT '{RESOLVIDA}', ?, ?, v.contribuinte_id,
+           v.cnpj, v.cgf, v.tipo_pendencia, v.periodo, v.item,
+           v.qtd, v.valor_total, NULL, NULL,
+           NULLIF(v.rotulos, ''), NULL
+    {_RESOLVIDAS}
+    """, coleta).rowcount
+
+    # vigentes passa a ser o conjunto desta coleta, dentro do escopo; chave
+    # que não mudou nem é regravada
+    con.execute(f"""
+    DELETE FROM pendencias_vigentes
+    WHERE ({", ".join(_CHAVE)}) IN (SELECT {", ".join("v." + c for c in _CHAVE)} {_RESOLVIDAS})
+    """)
+    con.execute(f"""
+    INSERT INTO pendencias_vigentes
+      (cnpj, cgf, tipo_pendencia, periodo, item, contribuinte_id, qtd, valor_total, rotulos)
+    SELECT cnpj, cgf, tipo_pendencia, periodo, item, contribuinte_id, qtd, valor_total, rotulos
+    FROM temp.chaves_coleta n WHERE {_MUDOU}
+    ON CONFLICT (cnpj, cgf, tipo_pendencia, periodo, item) DO UPDATE SET
+      contribuinte_id = excluded.contribuinte_id,
+      qtd = excluded.qtd,
+      valor_total = excluded.valor_total,
+      rotulos = excluded.rotulos
+    """)
+    con.execute("""
+    INSERT INTO escopos_coletados (cnpj, cgf, tipo_pendencia, data_coleta)
+    SELECT cnpj, cgf, tipo_pendencia, ? FROM temp.escopo_coleta WHERE true
+    ON CONFLICT (cnpj, cgf, tipo_pendencia) DO UPDATE SET data_coleta = excluded.data_coleta
+    """, (data_coleta,))
+
+    return contagem
+
+
+# =========================
+# Aba EVENTOS
+# =========================
+
+_SQL_EVENTOS = """
+SELECT
+  COALESCE(e.data_coleta,'') AS data_coleta,
+  e.evento,
+  e.cnpj,
+  e.cgf,
+  COALESCE(c.razao,'') AS razao,
+  e.tipo_pendencia,
+  e.periodo,
+  e.item,
+  e.qtd_anterior,
+  ROUND(e.valor_anterior, 2) AS valor_anterior,
+  e.qtd,
+  ROUND(e.valor, 2) AS valor,
+  COALESCE(e.rotulos_anterior,'') AS rotulos_anterior,
+  COALESCE(e.rotulos,'') AS rotulos,
+  COALESCE(e.arquivo_origem,'') AS arquivo_origem
+FROM eventos_pendencias e
+LEFT JOIN contribuintes c ON c.id = e.contribuinte_id
+ORDER BY e.id DESC
+LIMIT ?
+"""
+
+
+def iterar_eventos(
+    con: sqlite3.Connection,
+    limite: Optional[int] = None,
+    tamanho_lote: int = 20000,
+) -> Iterator[pd.DataFrame]:
+    """
+    Eventos, mais recentes primeiro, em lotes (LIMIT no SQL). Sempre gera
+    pelo menos um lote (vazio, com as colunas).
+    """
+    cur = con.execute(_SQL_EVENTOS, (-1 if limite is None else limite,))
+    try:
+        colunas = [d[0] for d in cur.description]
+        primeiro = True
+        while True:
+            linhas = cur.fetchmany(tamanho_lote)
+            if not linhas and not primeiro:
+                break
+            primeiro = False
+            # object: qtd_anterior/qtd nulos não viram float (1 -> 1.0)
+            yield pd.DataFrame(linhas, columns=colunas, dtype=object)
+            if not linhas:
+                break
+    finally:
+        cur.close()
@@ -1,42 +1,390 @@
 from __future__ import annotations
 
-from typing import List
-import pandas as pd
+import bisect
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import gspread
 from google.oauth2.service_account import Credentials
 
+from .destinos import Destino, FonteDados, lotes_da_fonte
+from .envio_sheets import EnvioSheets
+from .telemetria import Telemetria
+
 
 def _cliente_gspread(credentials_file: str, scopes: List[str]) -> gspread.Client:
     creds = Credentials.from_service_account_file(credentials_file, scopes=scopes)
     return gspread.authorize(creds)
 
 
-def _ensure_ws(ss: gspread.Spreadsheet, title: str, rows: int = 2000, cols: int = 20) -> gspread.Worksheet:
+def _ensure_ws(
+    ss: gspread.Spreadsheet,
+    title: str,
+    rows: int = 2000,
+    cols: int = 20,
+    envio: Optional[EnvioSheets] = None,
+) -> gspread.Worksheet:
+    chamar = envio.chamar if envio is not None else _chamar_direto
     try:
-        return ss.worksheet(title)
+        return chamar(ss.worksheet, title)
     except gspread.WorksheetNotFound:
-        return ss.add_worksheet(title=title, rows=rows, cols=cols)
+        return chamar(ss.add_worksheet, title=title, rows=rows, cols=cols)
+
+
+def _chamar_direto(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    return fn(*args, **kwargs)
+
+
+def _linhas_da_fonte(fonte: FonteDados, max_linhas: int) -> Iterator[List[Any]]:
+    """Cabeçalho + até max_linhas linhas, já como texto (vazio -> "")."""
+    lotes = lotes_da_fonte(fonte)
+    restantes = max_linhas
+    cabecalho = False
+
+    for lote in lotes:
+        if not cabecalho:
+            yield lote.columns.tolist()
+            cabecalho = True
+        if restantes <= 0:
+            break
+        parte = lote.head(restantes)
+        restantes -= len(parte)
+        yield from parte.fillna("").astype(str).values.tolist()
+
+
+# =========================
+# Exportação incremental (delta)
+# =========================
+#
+# Para cada aba guardamos localmente um hash por linha do que foi escrito
+# da última vez. Na próxima exportação comparamos as listas de hashes
+# (_plano_delta, linear) e mandamos só:
+#   - 1 chamada estrutural (insere/apaga linhas), se precisar
+#   - 1 chamada de valores com os trechos que mudaram
+# Sem estado (primeira vez, aba recriada, nº de colunas mudou) -> reescreve tudo.
+
+# acima disso o pedido estrutural fica grande demais; reescreve tudo
+MAX_OPERACOES_DELTA = 2000
+
+
+def _hash_linha(linha: List[str]) -> str:
+    return hashlib.blake2b("\x1f".join(map(str, linha)).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def carregar_estado(path: Optional[Path]) -> Dict[str, Any]:
+    if path is None or not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        # estado corrompido: próxima exportação reescreve tudo
+        return {}
+
+
+def salvar_estado(path: Optional[Path], estado: Dict[str, Any]) -> None:
+    if path is None:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(estado), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# O estado da exportação fica em dois arquivos:
+#   - estado_path: hashes de cada aba (um por linha, 200k no DETALHES),
+#     gravado uma vez, no fim da exportação
+#   - <nome>.envios.json: checkpoints dos blocos e as abas em escrita
+#     ("pendentes"), pequeno, gravado a cada bloco confirmado
+# Aba pendente ao carregar = escrita começada e não terminada: os hashes dela
+# no arquivo principal não valem mais e ela é reescrita inteira.
+
+def _caminho_envios(path: Path) -> Path:
+    return path.with_name(path.stem + ".envios" + path.suffix)
+
+
+def _carregar_estado_export(path: Path) -> Dict[str, Any]:
+    estado = carregar_estado(path)
+    envios = carregar_estado(_caminho_envios(path))
+    if envios:
+        for chave in envios.get("pendentes", []):
+            estado.pop(chave, None)
+        estado["envios"] = envios.get("envios", {})
+        estado["pendentes"] = list(envios.get("pendentes", []))
+    return estado
+
+
+def _salvar_envios(path: Path, estado: Dict[str, Any]) -> None:
+    salvar_estado(
+        _caminho_envios(path),
+        {"envios": estado.get("envios", {}), "pendentes": estado.get("pendentes", [])},
+    )
+
+
+def _salvar_estado_export(path: Path, estado: Dict[str, Any]) -> None:
+    salvar_estado(path, {k: v for k, v in estado.items() if k not in ("envios", "pendentes")})
+    # o arquivo principal agora bate com a planilha
+    estado["pendentes"] = []
+    _salvar_envios(path, estado)
+
+
+def _plano_delta(
+    antigos: List[str],
+    novos: List[str],
+    limite: int = MAX_OPERACOES_DELTA,
+) -> Optional[Tuple[List[Tuple[str, int, int]], List[Tuple[int, int]]]]:
+    """
+    Compara hashes antigos x novos (índice 0 = cabeçalho).
+    Retorna:
+      estrutura: [("inserir"|"apagar", inicio, fim)] em coordenadas da
+                 planilha antiga (0-based, fim exclusivo), do fim para o
+                 começo (aplicar nessa ordem não desloca os seguintes)
+      trechos:   [(inicio, fim)] em coordenadas finais com linhas a escrever
+    ou None se passar de `limite` operações estruturais (reescreve tudo).
+
+    Linear (fora um bisect): as linhas cujo hash aparece uma vez só nas
+    duas listas servem de âncora, fica a maior sequência delas na mesma
+    ordem e cada intervalo entre âncoras vira uma troca. Pode sair com mais
+    operações que um diff mínimo (linha repetida não ancora), nunca errado.
+    """
+    estrutura: List[Tuple[str, int, int]] = []
+    trechos: List[Tuple[int, int]] = []
+
+    def trocar(i1: int, i2: int, j1: int, j2: int) -> bool:
+        # pontas iguais do intervalo não precisam ser escritas
+        while i1 < i2 and j1 < j2 and antigos[i1] == novos[j1]:
+            i1 += 1
+            j1 += 1
+        while i1 < i2 and j1 < j2 and antigos[i2 - 1] == novos[j2 - 1]:
+            i2 -= 1
+            j2 -= 1
+
+        n_velhas = i2 - i1
+        n_novas = j2 - j1
+
+        if n_velhas == n_novas:
+            # mesmo tamanho: só as posições que mudaram
+            j = j1
+            while j < j2:
+                if antigos[i1 + j - j1] == novos[j]:
+                    j += 1
+                    continue
+                k = j
+                while k < j2 and antigos[i1 + k - j1] != novos[k]:
+                    k += 1
+                trechos.append((j, k))
+                j = k
+            return True
+
+        if n_novas > n_velhas:
+            estrutura.append(("inserir", i2, i2 + (n_novas - n_velhas)))
+        else:
+            estrutura.append(("apagar", i1 + n_novas, i2))
+        if n_novas:
+            trechos.append((j1, j2))
+        return len(estrutura) <= limite
+
+    # âncoras: hash único nas duas listas, em ordem de `antigos`
+    vezes_antigos = Counter(antigos)
+    vezes_novos = Counter(novos)
+    posicao_nova = {h: j for j, h in enumerate(novos) if vezes_novos[h] == 1 and vezes_antigos[h] == 1}
+    pares = [(i, posicao_nova[h]) for i, h in enumerate(antigos) if h in posicao_nova]
+
+    # maior subsequência crescente em j (patience sorting)
+    topos: List[int] = []
+    indice_topo: List[int] = []
+    anterior = [-1] * len(pares)
+    for k, (_, j) in enumerate(pares):
+        p = bisect.bisect_left(topos, j)
+        if p == len(topos):
+            topos.append(j)
+            indice_topo.append(k)
+        else:
+            topos[p] = j
+            indice_topo[p] = k
+        anterior[k] = indice_topo[p - 1] if p else -1
+
+    ancoras: List[Tuple[int, int]] = []
+    k = indice_topo[-1] if indice_topo else -1
+    while k >= 0:
+        ancoras.append(pares[k])
+        k = anterior[k]
+    ancoras.reverse()
+
+    i0 = j0 = 0
+    for i, j in ancoras + [(len(antigos), len(novos))]:
+        if (i0 < i or j0 < j) and not trocar(i0, i, j0, j):
+            return None
+        i0, j0 = i + 1, j + 1
 
+    estrutura.reverse()
+    return estrutura, trechos
 
-def _df_to_values(df: pd.DataFrame) -> List[List[str]]:
-    df2 = df.copy().fillna("")
-    return [df2.columns.tolist()] + df2.astype(str).values.tolist()
 
+def _pedido_estrutura(ws: gspread.Worksheet, op: str, inicio: int, fim: int) -> Dict[str, Any]:
+    faixa = {"sheetId": ws.id, "dimension": "ROWS", "startIndex": inicio, "endIndex": fim}
+    if op == "inserir":
+        return {"insertDimension": {"range": faixa, "inheritFromBefore": inicio > 0}}
+    return {"deleteDimension": {"range": faixa}}
+
+
+def _assinatura(hashes: List[str]) -> str:
+    return hashlib.blake2b("".join(hashes).encode("ascii"), digest_size=16).hexdigest()
+
+
+def _escrever_tudo(
+    ws: gspread.Worksheet,
+    linhas: Iterable[List[Any]],
+    hashes: List[str],
+    ncols: int,
+    envio: EnvioSheets,
+    chave: str,
+) -> None:
+    envio.enviar_valores(
+        ws, linhas, chave, limpar=ws.clear,
+        assinatura=_assinatura(hashes), ncols=ncols,
+    )
+
+
+def _selecionar_trechos(
+    linhas: Iterable[List[Any]],
+    trechos: List[Tuple[int, int]],
+    max_linhas_trecho: int,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre a fonte uma vez e separa só as linhas dos trechos, em pedaços
+    de até max_linhas_trecho (não guarda a fonte inteira).
+    """
+    k = 0
+    buf: List[List[Any]] = []
+    inicio_buf = 0
+
+    for i, linha in enumerate(linhas):
+        while k < len(trechos) and i >= trechos[k][1]:
+            k += 1
+        if k == len(trechos):
+            break
+        a, b = trechos[k]
+        if i < a:
+            continue
+        if not buf:
+            inicio_buf = i
+        buf.append(linha)
+        if len(buf) >= max_linhas_trecho or i == b - 1:
+            yield {"linha": inicio_buf + 1, "values": buf}
+            buf = []
+
+    if buf:
+        yield {"linha": inicio_buf + 1, "values": buf}
+
+
+def _escrever_delta(
+    ss: gspread.Spreadsheet,
+    ws: gspread.Worksheet,
+    linhas: Iterable[List[Any]],
+    ncols: int,
+    estrutura: List[Tuple[str, int, int]],
+    trechos: List[Tuple[int, int]],
+    envio: EnvioSheets,
+) -> None:
+    if estrutura:
+        envio.chamar_uma_vez(
+            ss.batch_update,
+            {"requests": [_pedido_estrutura(ws, op, a, b) for op, a, b in estrutura]},
+        )
+
+    if trechos:
+        envio.enviar_trechos(ws, _selecionar_trechos(linhas, trechos, envio.linhas_por_bloco(ncols)))
+
+
+def escrever_df(
+    ss: gspread.Spreadsheet,
+    aba: str,
+    df: FonteDados,
+    max_linhas: int,
+    estado: Optional[Dict[str, Any]] = None,
+    envio: Optional[EnvioSheets] = None,
+) -> int:
+    """
+    Escreve df (até max_linhas) na aba e retorna quantas linhas de dados tem. Com `estado` (dict persistido pelo
+    chamador), manda só o que mudou desde a última escrita e atualiza o estado.
+    Todas as chamadas passam pelo `envio` (blocos, cota e retry).
+
+    `df` pode ser uma função que gera lotes (ver FonteDados): a fonte é lida
+    uma vez para calcular os hashes e outra para enviar, sem nunca juntar
+    tudo em memória.
+    """
+    if envio is None:
+        envio = EnvioSheets()
+
+    # 1ª passada: só os hashes das linhas (cabeçalho = índice 0)
+    hashes: List[str] = []
+    ncols = 0
+    for i, linha in enumerate(_linhas_da_fonte(df, max_linhas)):
+        if i == 0:
+            ncols = len(linha)
+        hashes.append(_hash_linha(linha))
 
-def escrever_df(ss: gspread.Spreadsheet, aba: str, df: pd.DataFrame, max_linhas: int) -> None:
-    df_out = df.head(max_linhas).copy()
     rows = max(2000, min(max_linhas + 10, 200000))
-    cols = max(10, len(df_out.columns) + 2)
+    cols = max(10, ncols + 2)
+
+    ws = _ensure_ws(ss, aba, rows=rows, cols=cols, envio=envio)
+    chave = f"{ss.id}/{aba}"
 
-    ws = _ensure_ws(ss, aba, rows=rows, cols=cols)
-    ws.clear()
-    ws.update(values=_df_to_values(df_out), range_name="A1")
+    # 2ª passada (lazy): lida de novo só enquanto envia
+    def linhas() -> Iterator[List[Any]]:
+        return _linhas_da_fonte(df, max_linhas)
 
+    if estado is None:
+        _escrever_tudo(ws, linhas(), hashes, ncols, envio, chave)
+        return len(hashes) - 1
 
-def escrever_status(ss: gspread.Spreadsheet, aba: str, status_texto: str) -> None:
-    ws = _ensure_ws(ss, aba, rows=80, cols=6)
-    ws.clear()
-    ws.update(values=[["STATUS"], [status_texto]], range_name="A1")
+    # se algo falhar no meio, a aba fica sem estado e a próxima vez reescreve
+    # tudo; "pendentes" garante isso mesmo se o processo morrer antes de o
+    # estado inteiro ser gravado (é salvo com os checkpoints)
+    anterior = estado.pop(chave, None)
+    pendentes = estado.setdefault("pendentes", [])
+    if chave not in pendentes:
+        pendentes.append(chave)
+        if envio.ao_confirmar is not None:
+            envio.ao_confirmar()
+
+    delta = None
+    if (
+        anterior
+        and anterior.get("sheet_id") == ws.id
+        and anterior.get("colunas") == ncols
+        and ws.row_count >= len(anterior.get("hashes", []))
+    ):
+        delta = _plano_delta(anterior["hashes"], hashes)
+
+    if delta is None:
+        _escrever_tudo(ws, linhas(), hashes, ncols, envio, chave)
+    else:
+        _escrever_delta(ss, ws, linhas(), ncols, *delta, envio)
+
+    estado[chave] = {"sheet_id": ws.id, "colunas": ncols, "hashes": hashes}
+    return len(hashes) - 1
+
+
+def escrever_status(
+    ss: gspread.Spreadsheet,
+    aba: str,
+    status_texto: str,
+    envio: Optional[EnvioSheets] = None,
+    etapas: Optional[List[List[Any]]] = None,
+) -> None:
+    """etapas: tabela da telemetria (cabeçalho + uma linha por etapa), abaixo do texto."""
+    chamar = envio.chamar if envio is not None else _chamar_direto
+    ws = _ensure_ws(ss, aba, rows=80, cols=6, envio=envio)
+    values: List[List[Any]] = [["STATUS"], [status_texto]]
+    if etapas:
+        values += [[""]] + etapas
+    chamar(ws.clear)
+    chamar(ws.update, values=values, range_name="A1")
 
 
 def exportar_para_sheets(
@@ -47,15 +395,134 @@ def exportar_para_sheets(
     aba_resumo_pendencias: str,
     aba_detalhes: str,
     aba_status: str,
-    df_resumo: pd.DataFrame,
-    df_detalhes: pd.DataFrame,
+    df_resumo: FonteDados,
+    df_detalhes: FonteDados,
     texto_status: str,
     max_linhas_resumo: int,
     max_linhas_detalhes: int,
+    aba_eventos: Optional[str] = None,
+    df_eventos: Optional[FonteDados] = None,
+    max_linhas_eventos: int = 50000,
+    estado_path: Optional[Path] = None,
+    req_por_minuto: int = 50,
+    celulas_por_bloco: int = 50000,
+    telemetria: Optional[Telemetria] = None,
 ) -> None:
+    """
+    telemetria: mede exportacao_resumo/exportacao_detalhes/exportacao_eventos/
+    exportacao_status e a tabela das etapas vai para a aba de status.
+    aba_eventos/df_eventos: só escreve a aba de eventos com os dois.
+    estado_path: arquivo com os hashes do que já foi escrito em cada aba
+    (os checkpoints de envio ficam ao lado, em <nome>.envios.json). Se informado, RESUMO/DETALHES são
+    atualizados por delta e uma escrita interrompida é retomada do último
+    bloco confirmado; se None, cada aba é limpa e reescrita inteira.
+    """
     gc = _cliente_gspread(credentials_file, scopes)
     ss = gc.open_by_key(spreadsheet_id)
 
-    escrever_df(ss, aba_resumo_pendencias, df_resumo, max_linhas=max_linhas_resumo)
-    escrever_df(ss, aba_detalhes, df_detalhes, max_linhas=max_linhas_detalhes)
-    escrever_status(ss, aba_status, texto_status)
+    estado = _carregar_estado_export(estado_path) if estado_path is not None else None
+
+    envio = EnvioSheets(
+        req_por_minuto=req_por_minuto,
+        celulas_por_bloco=celulas_por_bloco,
+        checkpoints=estado.setdefault("envios", {}) if estado is not None else None,
+        # a cada bloco só os checkpoints; os hashes vão no fim
+        ao_confirmar=(lambda: _salvar_envios(estado_path, estado)) if estado is not None else None,
+    )
+
+    tel = telemetria or Telemetria(memoria=False)
+
+    try:
+        with tel.etapa("exportacao_resumo") as m:
+            m.linhas = escrever_df(ss, aba_resumo_pendencias, df_resumo, max_linhas=max_linhas_resumo, estado=estado, envio=envio)
+        with tel.etapa("exportacao_detalhes") as m:
+            m.linhas = escrever_df(ss, aba_detalhes, df_detalhes, max_linhas=max_linhas_detalhes, estado=estado, envio=envio)
+        if aba_eventos and df_eventos is not None:
+            with tel.etapa("exportacao_eventos") as m:
+                m.linhas = escrever_df(ss, aba_eventos, df_eventos, max_linhas=max_linhas_eventos, estado=estado, envio=envio)
+    finally:
+        if estado is not None:
+            _salvar_estado_export(estado_path, estado)
+
+    with tel.etapa("exportacao_status"):
+        escrever_status(ss, aba_status, texto_status, envio=envio, etapas=tel.tabela_status())
+
+
+class DestinoSheets(Destino):
+    """A planilha do gestor como destino (ver destinos.py)."""
+
+    nome = "sheets"
+
+    def __init__(
+        self,
+        spreadsheet_id: str,
+        credentials_file: str,
+        scopes: List[str],
+        *,
+        aba_resumo_pendencias: str,
+        aba_detalhes: str,
+        aba_status: str,
+        max_linhas_resumo: int,
+        max_linhas_detalhes: int,
+        aba_eventos: Optional[str] = None,
+        max_linhas_eventos: int = 50000,
+        estado_path: Optional[Path] = None,
+        req_por_minuto: int = 50,
+        celulas_por_bloco: int = 50000,
+    ):
+        self.spreadsheet_id = spreadsheet_id
+        self.credentials_file = credentials_file
+        self.scopes = scopes
+        self.abas = dict(
+            aba_resumo_pendencias=aba_resumo_pendencias,
+            aba_detalhes=aba_detalhes,
+            aba_eventos=aba_eventos,
+            aba_status=aba_status,
+        )
+        self.max_linhas_resumo = max_linhas_resumo
+        self.max_linhas_detalhes = max_linhas_detalhes
+        self.max_linhas_eventos = max_linhas_eventos
+        self.estado_path = estado_path
+        self.req_por_minuto = req_por_minuto
+        self.celulas_por_bloco = celulas_por_bloco
+
+    def exportar(
+        self,
+        *,
+        df_resumo: FonteDados,
+        df_detalhes: FonteDados,
+        texto_status: str,
+        df_eventos: Optional[FonteDados] = None,
+        telemetria: Optional[Telemetria] = None,
+    ) -> None:
+        exportar_para_sheets(
+            self.spreadsheet_id,
+            self.credentials_file,
+            self.scopes,
+            **self.abas,
+            df_resumo=df_resumo,
+            df_detalhes=df_detalhes,
+            texto_status=texto_status,
+            max_linhas_resumo=self.max_linhas_resumo,
+            max_linhas_detalhes=self.max_linhas_detalhes,
+            df_eventos=df_eventos,
+            max_linhas_eventos=self.max_linhas_eventos,
+            estado_path=self.estado_path,
+            req_por_minuto=self.req_por_minuto,
+            celulas_por_bloco=self.celulas_por_bloco,
+            telemetria=telemetria,
+        )
+
+    def exportar_status(self, texto_status: str, telemetria: Optional[Telemetria] = None) -> None:
+        tel = telemetria or Telemetria(memoria=False)
+        ss = _cliente_gspread(self.credentials_file, self.scopes).open_by_key(self.spreadsheet_id)
+        envio = EnvioSheets(req_por_minuto=self.req_por_minuto, celulas_por_bloco=self.celulas_por_bloco)
+        with tel.etapa("exportacao_status"):
+            escrever_status(ss, self.abas["aba_status"], texto_status, envio=envio, etapas=tel.tabela_status())
+
+    def alvo(self) -> str:
+        # o corte muda o que vai para a planilha
+        return (
+            f"sheets:{self.spreadsheet_id}:{self.max_linhas_resumo}:{self.max_linhas_detalhes}"
+            f":{self.abas['aba_eventos']}:{self.max_linhas_eventos}"
+        )
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import csv
+import math
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .destinos import Destino, FonteDados, lotes_da_fonte
+from .telemetria import Telemetria
+
+
+# =========================
+# Exportação local (XLSX / CSV)
+# =========================
+#
+# Sem corte de linhas (o Sheets para em MAX_LINHAS_DETALHES): os lotes de
+# iterar_detalhes vão direto para o arquivo, um por vez, então a memória
+# não cresce com o tamanho do banco.
+#   - XLSX: openpyxl em write_only (cada linha vai para um XML temporário
+#     no disco). Passou do limite de linhas do Excel, continua em
+#     "DETALHES (2)", "DETALHES (3)"... com o cabeçalho repetido.
+#   - CSV: um arquivo por aba (utf-8-sig, abre certo no Excel).
+# A aba de eventos (eventos.py) só sai com aba_eventos e df_eventos.
+# Os dois escrevem num .tmp e só trocam pelo arquivo final no fim: quem
+# estiver lendo nunca vê arquivo pela metade.
+
+LINHAS_EXCEL = 1_048_576  # por planilha, contando o cabeçalho
+MAX_TITULO_ABA = 31
+
+
+def _linhas(fonte: FonteDados) -> Tuple[List[str], Iterator[List[Any]]]:
+    """(cabeçalho, linhas com valores nativos; NaN -> None), lote a lote."""
+    lotes = lotes_da_fonte(fonte)
+    primeiro = next(lotes, None)
+    if primeiro is None:
+        return [], iter(())
+
+    def gerar() -> Iterator[List[Any]]:
+        for lote in chain([primeiro], lotes):
+            for t in lote.itertuples(index=False, name=None):
+                yield [None if isinstance(v, float) and math.isnan(v) else v for v in t]
+
+    return [str(c) for c in primeiro.columns], gerar()
+
+
+def _tmp(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+
+# =========================
+# XLSX
+# =========================
+
+def _titulo_continuacao(titulo: str, n: int) -> str:
+    sufixo = f" ({n})"
+    return titulo[:MAX_TITULO_ABA - len(sufixo)] + sufixo
+
+
+def _limpar(linha: List[Any]) -> List[Any]:
+    # em write_only um caractere de controle no meio do texto derruba a aba
+    # inteira (o append falha e o gerador da aba fecha), então limpa antes
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    return [ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v for v in linha]
+
+
+class DestinoXlsx(Destino):
+    """Um .xlsx com as abas (resumo, detalhes, eventos, status)."""
+
+    nome = "xlsx"
+
+    def __init__(
+        self,
+        arquivo: Path,
+        *,
+        aba_resumo_pendencias: str,
+        aba_detalhes: str,
+        aba_status: str,
+        aba_eventos: Optional[str] = None,
+        linhas_por_aba: int = LINHAS_EXCEL - 1,
+    ):
+        self.arquivo = Path(arquivo)
+        self.aba_resumo_pendencias = aba_resumo_pendencias
+        self.aba_detalhes = aba_detalhes
+        self.aba_eventos = aba_eventos
+        self.aba_status = aba_status
+        self.linhas_por_aba = linhas_por_aba
+
+    def _escrever_abas(self, wb, titulo: str, fonte: FonteDados) -> int:
+        """Escreve a fonte a partir da aba `titulo`, abrindo continuações quando enche. Retorna nº de linhas."""
+        cabecalho, linhas = _linhas(fonte)
+        ws = wb.create_sheet(titulo[:MAX_TITULO_ABA])
+        ws.append(cabecalho)
+        n_abas, na_aba, total = 1, 0, 0
+
+        for linha in linhas:
+            if na_aba == self.linhas_por_aba:
+                n_abas += 1
+                ws = wb.create_sheet(_titulo_continuacao(titulo, n_abas))
+                ws.append(cabecalho)
+                na_aba = 0
+            ws.append(_limpar(linha))
+            na_aba += 1
+            total += 1
+
+        return total
+
+    def exportar(
+        self,
+        *,
+        df_resumo: FonteDados,
+        df_detalhes: FonteDados,
+        texto_status: str,
+        df_eventos: Optional[FonteDados] = None,
+        telemetria: Optional[Telemetria] = None,
+    ) -> Path:
+        from openpyxl import Workbook
+
+        tel = telemetria or Telemetria(memoria=False)
+        self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+        wb = Workbook(write_only=True)
+
+        with tel.etapa("xlsx_resumo") as m:
+            m.linhas = self._escrever_abas(wb, self.aba_resumo_pendencias, df_resumo)
+        with tel.etapa("xlsx_detalhes") as m:
+            m.linhas = self._escrever_abas(wb, self.aba_detalhes, df_detalhes)
+        if self.aba_eventos and df_eventos is not None:
+            with tel.etapa("xlsx_eventos") as m:
+                m.linhas = self._escrever_abas(wb, self.aba_eventos, df_eventos)
+
+        # o save junta os XML temporários no zip: fica medido aqui
+        with tel.etapa("xlsx_status"):
+            ws = wb.create_sheet(self.aba_status)
+            for linha in [["STATUS"], [texto_status], []] + tel.tabela_status():
+                ws.append(_limpar(linha))
+            tmp = _tmp(self.arquivo)
+            try:
+                wb.save(tmp)
+                tmp.replace(self.arquivo)
+            finally:
+                tmp.unlink(missing_ok=True)
+
+        return self.arquivo
+
+    # exportar_status: não sobrescreve (o STATUS está dentro do .xlsx e
+    # regravar o arquivo custa a exportação inteira)
+
+    def alvo(self) -> str:
+        return f"xlsx:{self.arquivo.resolve()}"
+
+    def saida_existe(self) -> bool:
+        return self.arquivo.exists()
+
+
+# =========================
+# CSV
+# =========================
+
+class DestinoCsv(Destino):
+    """Um .csv por aba na pasta (ex.: saida/DETALHES.csv)."""
+
+    nome = "csv"
+
+    def __init__(
+        self,
+        pasta: Path,
+        *,
+        aba_resumo_pendencias: str,
+        aba_detalhes: str,
+        aba_status: str,
+        aba_eventos: Optional[str] = None,
+        separador: str = ",",
+    ):
+        self.pasta = Path(pasta)
+        self.aba_resumo_pendencias = aba_resumo_pendencias
+        self.aba_detalhes = aba_detalhes
+        self.aba_eventos = aba_eventos
+        self.aba_status = aba_status
+        self.separador = separador
+
+    def _escrever(self, aba: str, cabecalho: List[Any], linhas: Iterator[List[Any]]) -> int:
+        destino = self.pasta / f"{aba}.csv"
+        tmp = _tmp(destino)
+        total = 0
+        try:
+            with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+                w = csv.writer(f, delimiter=self.separador)
+                w.writerow(cabecalho)
+                for linha in linhas:
+                    w.writerow(linha)
+                    total += 1
+            tmp.replace(destino)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return total
+
+    def exportar(
+        self,
+        *,
+        df_resumo: FonteDados,
+        df_detalhes: FonteDados,
+        texto_status: str,
+        df_eventos: Optional[FonteDados] = None,
+        telemetria: Optional[Telemetria] = None,
+    ) -> Path:
+        tel = telemetria or Telemetria(memoria=False)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+
+        with tel.etapa("csv_resumo") as m:
+            m.linhas = self._escrever(self.aba_resumo_pendencias, *_linhas(df_resumo))
+        with tel.etapa("csv_detalhes") as m:
+            m.linhas = self._escrever(self.aba_detalhes, *_linhas(df_detalhes))
+        if self.aba_eventos and df_eventos is not None:
+            with tel.etapa("csv_eventos") as m:
+                m.linhas = self._escrever(self.aba_eventos, *_linhas(df_eventos))
+        with tel.etapa("csv_status"):
+            self._escrever(self.aba_status, ["STATUS"], iter([[texto_status], []] + tel.tabela_status()))
+
+        return self.pasta
+
+    def exportar_status(self, texto_status: str, telemetria: Optional[Telemetria] = None) -> None:
+        tel = telemetria or Telemetria(memoria=False)
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        with tel.etapa("csv_status"):
+            self._escrever(self.aba_status, ["STATUS"], iter([[texto_status], []] + tel.tabela_status()))
+
+    def alvo(self) -> str:
+        return f"csv:{self.pasta.resolve()}:{self.separador}"
+
+    def saida_existe(self) -> bool:
+        return all((self.pasta / f"{aba}.csv").exists() for aba in (self.aba_resumo_pendencias, self.aba_detalhes))
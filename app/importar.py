@@ -1,32 +1,32 @@
 from __future__ import annotations
 
-import os
-import json
 import time
-import hashlib
+import queue
 import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
 import sqlite3
+from pandas.io.parsers import TextParser
 
-from .normalizar import normalizar_por_aba
+from .banco import atualizar_resumo, iniciar, inserir_lote, trocar_contribuintes, ultimo_id_raw
+from .cache_hash import abrir_cache, hash_com_cache, hash_md5
+from .eventos import registrar_eventos, tipos_das_abas
+from .leitor import iterar_lotes
+from .normalizar import compilar_aba, estatisticas_memo
+from .raw_compacto import Bloco, gravar_bloco, montar_bloco, resolver_codec
+from .regras_abas import REGRAS
+from .telemetria import Telemetria
 
 
 # =========================
 # Utilitários de arquivo
 # =========================
 
-def _hash_arquivo_md5(path: Path) -> str:
-    h = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
 def _nome_destino_unico(dest_dir: Path, nome: str) -> Path:
     dest = dest_dir / nome
     if not dest.exists():
@@ -85,42 +85,8 @@ def _conectar_db(db_path: Path) -> sqlite3.Connection:
 
 
 def _iniciar_schema(con: sqlite3.Connection) -> None:
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS import_log (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      arquivo_origem TEXT,
-      hash_md5 TEXT UNIQUE,
-      data_importacao TEXT
-    );
-    """)
-
-    con.execute("""
-    CREATE TABLE IF NOT EXISTS pendencias_raw (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-
-      cnpj TEXT,
-      cgf TEXT,
-      razao TEXT,
-
-      tipo_pendencia TEXT,
-      periodo TEXT,
-      valor REAL,
-      detalhe TEXT,
-      data_referencia TEXT,
-
-      arquivo_origem TEXT,
-      aba_origem TEXT,
-      linha_origem INTEGER,
-
-      data_coleta TEXT,
-      raw_json TEXT
-    );
-    """)
-
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_tipo ON pendencias_raw(tipo_pendencia);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_cnpj ON pendencias_raw(cnpj);")
-    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_cgf ON pendencias_raw(cgf);")
-    con.commit()
+    # mesmo schema do banco.iniciar (migrações em migracoes.py)
+    iniciar(con)
 
 
 def _ja_importado(con: sqlite3.Connection, hash_md5: str) -> bool:
@@ -128,10 +94,20 @@ def _ja_importado(con: sqlite3.Connection, hash_md5: str) -> bool:
     return row is not None
 
 
-def _registrar_importacao(con: sqlite3.Connection, arquivo: str, hash_md5: str) -> None:
+def _registrar_importacao(
+    con: sqlite3.Connection,
+    arquivo: str,
+    hash_md5: str,
+    linhas_lidas: int,
+    linhas_inseridas: int,
+) -> None:
     con.execute(
-        "INSERT OR IGNORE INTO import_log(arquivo_origem, hash_md5, data_importacao) VALUES (?,?,?)",
-        (arquivo, hash_md5, datetime.now().isoformat(timespec="seconds")),
+        """
+        INSERT OR IGNORE INTO import_log
+          (arquivo_origem, hash_md5, data_importacao, linhas_lidas, linhas_inseridas)
+        VALUES (?,?,?,?,?)
+        """,
+        (arquivo, hash_md5, datetime.now().isoformat(timespec="seconds"), linhas_lidas, linhas_inseridas),
     )
     con.commit()
 
@@ -140,66 +116,281 @@ def _registrar_importacao(con: sqlite3.Connection, arquivo: str, hash_md5: str)
 # Leitura Excel
 # =========================
 
-ABAS_ACEITAS = {
-    "Omissões de EFD",
-    "Débitos",
-    "Omissões e divergências de NFE",
-    "NFe inexistente declarada",
-    "Omissões e Divergências CFe",
-    "CTE escriturado com divergência",
-    "NFe sem REG_PAS",
-    "Outros limitadores",
-}
-
-def _ler_excel(path: Path) -> Dict[str, pd.DataFrame]:
-    # engine=openpyxl é o padrão para xlsx
-    xls = pd.read_excel(path, sheet_name=None, engine="openpyxl")
-    # mantém só as abas que interessam
-    return {aba: df for aba, df in xls.items() if aba in ABAS_ACEITAS}
+# abas com regra em regras_abas.REGRAS (as outras nem são lidas)
+ABAS_ACEITAS = {regra["aba"] for regra in REGRAS}
 
+def _celula_pandas(v: Any) -> Any:
+    """Valor da célula como o leitor openpyxl do pandas entrega ao parser."""
+    if v is None:
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
 
-def _to_row_dict(df: pd.DataFrame, idx: int) -> Dict[str, Any]:
-    row = df.iloc[idx].to_dict()
-    # normaliza colunas (mantém nomes originais)
-    return {k: (None if (isinstance(v, float) and pd.isna(v)) else v) for k, v in row.items()}
 
-
-def _inserir_linha(
-    con: sqlite3.Connection,
+def _ler_excel(
+    path: Path,
+    *,
+    motor: str = "auto",
+    tamanho_lote: int = 5000,
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Lê só as abas de ABAS_ACEITAS, em lotes (streaming).
+    Gera (aba, df_lote); o índice do df é a linha_origem.
+
+    Os tipos das colunas são inferidos como no pd.read_excel (mesmo
+    TextParser, mesmos parâmetros): CGF em texto "060001234" vira
+    60001234, coluna de inteiros com vazios vira float etc. Sem isso
+    cnpj/cgf, hash_registro e o RAW mudariam para as mesmas linhas já
+    importadas. A inferência é por lote: numa aba maior que
+    `tamanho_lote`, uma coluna cujo tipo muda entre lotes (ou uma linha
+    vazia num lote e inteiros em outro) sai diferente da planilha inteira.
+    """
+    for aba, colunas, linhas, com_vazias in iterar_lotes(path, ABAS_ACEITAS, motor=motor, tamanho_lote=tamanho_lote):
+        dados = [[_celula_pandas(v) for v in valores] for _, valores in linhas]
+        if com_vazias:
+            # a linha vazia do pd.read_excel: NaN em todas as colunas
+            dados.append([""] * len(colunas))
+        df = TextParser(dados, names=colunas, header=None, skip_blank_lines=False).read()
+        df = df.iloc[:len(linhas)]
+        df.index = [linha for linha, _ in linhas]
+        yield aba, df
+
+
+# as tuplas de _tupla_linha trazem (cnpj, cgf, razao) na frente; a
+# gravadora troca pelo contribuinte_id (banco.trocar_contribuintes)
+_SQL_INSERIR = """
+INSERT OR IGNORE INTO pendencias_raw (
+  contribuinte_id,
+  tipo_pendencia, periodo, valor, detalhe, data_referencia, item,
+  arquivo_origem, aba_origem, linha_origem,
+  data_coleta, raw_json
+) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+
+def _tupla_linha(
     base: Dict[str, Any],
     arquivo_origem: str,
     aba_origem: str,
     linha_origem: int,
     data_coleta: str,
-    raw_json: str,
-) -> None:
-    con.execute(
-        """
-        INSERT INTO pendencias_raw (
-          cnpj, cgf, razao,
-          tipo_pendencia, periodo, valor, detalhe, data_referencia,
-          arquivo_origem, aba_origem, linha_origem,
-          data_coleta, raw_json
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
-        """,
-        (
-            base.get("cnpj", "") or "",
-            base.get("cgf", "") or "",
-            base.get("razao", "") or "",
-            base.get("tipo_pendencia", "") or "",
-            base.get("periodo", "") or "",
-            base.get("valor", None),
-            base.get("detalhe", "") or "",
-            base.get("data_referencia", "") or "",
-            arquivo_origem,
-            aba_origem,
-            linha_origem,
-            data_coleta,
-            raw_json,
-        ),
+    raw_json: Optional[str],
+) -> Tuple[Any, ...]:
+    return (
+        base.get("cnpj", "") or "",
+        base.get("cgf", "") or "",
+        base.get("razao", "") or "",
+        base.get("tipo_pendencia", "") or "",
+        base.get("periodo", "") or "",
+        base.get("valor", None),
+        base.get("detalhe", "") or "",
+        base.get("data_referencia", "") or "",
+        base.get("item", "") or "",
+        arquivo_origem,
+        aba_origem,
+        linha_origem,
+        data_coleta,
+        raw_json,
     )
 
 
+# =========================
+# Leitura + normalização (sem banco; roda também nos processos do pool)
+# =========================
+
+def _lotes_do_arquivo(
+    path: Path,
+    data_coleta: str,
+    motor: str,
+    tamanho_lote: int,
+    codec_raw: str = "auto",
+    telemetria: Optional[Telemetria] = None,
+) -> Iterator[Tuple[List[Tuple[Any, ...]], Bloco]]:
+    """
+    Gera, lote a lote, (tuplas prontas para o INSERT, bloco RAW comprimido).
+    O RAW vai para raw_bloco (ver raw_compacto); raw_json fica NULL.
+    Tempo de leitura e de normalização vão para `telemetria`.
+    """
+    arquivo_nome = path.name
+    tel = telemetria or Telemetria(memoria=False)
+
+    # lê abas relevantes, lote a lote (linhas vazias já vêm descartadas)
+    lotes = _ler_excel(path, motor=motor, tamanho_lote=tamanho_lote)
+    while True:
+        with tel.etapa("leitura") as m:
+            item = next(lotes, None)
+            if item is not None:
+                m.linhas = len(item[1])
+        if item is None:
+            break
+        aba, df = item
+
+        with tel.etapa("normalizacao") as m:
+            memo_antes = estatisticas_memo()
+            # regra da aba compilada para este cabeçalho (em cache entre lotes e arquivos)
+            normalizar_linha = compilar_aba(aba, tuple(df.columns))
+
+            linhas = []
+            originais = []
+
+            # linha_origem vem no índice do lote
+            for linha_origem, valores in zip(df.index, df.itertuples(index=False, name=None)):
+                linha_origem = int(linha_origem)
+                valores = [_sem_nan(v) for v in valores]
+                base = normalizar_linha(valores)
+
+                # guarda RAW completo (para auditoria), sem repetir os nomes das colunas
+                originais.append((linha_origem, valores))
+
+                linhas.append(_tupla_linha(
+                    base,
+                    arquivo_origem=arquivo_nome,
+                    aba_origem=aba,
+                    linha_origem=linha_origem,
+                    data_coleta=data_coleta,
+                    raw_json=None,
+                ))
+
+            bloco = montar_bloco(aba, df.columns, originais, codec_raw)
+            m.linhas = len(linhas)
+            for nome, depois in estatisticas_memo().items():
+                antes = memo_antes.get(nome, {"acertos": 0, "faltas": 0})
+                tel.somar_cache(nome, acertos=depois["acertos"] - antes["acertos"], faltas=depois["faltas"] - antes["faltas"])
+
+        # fora do `with`: o tempo em que o consumidor grava o lote não conta aqui
+        yield linhas, bloco
+
+
+def _sem_nan(v: Any) -> Any:
+    return None if (isinstance(v, float) and pd.isna(v)) else v
+
+
+def _ler_arquivo_no_pool(
+    path: Path,
+    data_coleta: str,
+    motor: str,
+    tamanho_lote: int,
+    codec_raw: str = "auto",
+) -> Tuple[List[Tuple[List[Tuple[Any, ...]], Bloco]], Dict[str, Dict[str, Any]], Dict[str, Dict[str, int]]]:
+    # executado num processo do ProcessPoolExecutor; a telemetria do leitor
+    # (etapas e caches) volta junto e é somada à da execução pela gravadora
+    tel = Telemetria()
+    try:
+        lotes = list(_lotes_do_arquivo(path, data_coleta, motor, tamanho_lote, codec_raw, tel))
+        return lotes, tel.dados(), tel.dados_caches()
+    finally:
+        tel.parar()
+
+
+# =========================
+# Gravação (só quem tem a conexão chama)
+# =========================
+
+def _gravar_arquivo(
+    con: sqlite3.Connection,
+    path: Path,
+    hash_md5: str,
+    lotes: Iterable[Tuple[List[Tuple[Any, ...]], Bloco]],
+    pasta_processados: Path,
+    tamanho_lote: int,
+    detalhes: List[Dict[str, Any]],
+    telemetria: Optional[Telemetria] = None,
+) -> Tuple[int, int]:
+    """
+    Insere os lotes de um arquivo numa transação, registra no import_log e
+    move/copia para processados. Retorna (linhas_lidas, linhas_inseridas).
+    """
+    arquivo_nome = path.name
+    tel = telemetria or Telemetria(memoria=False)
+
+    linhas_lidas = 0
+    linhas_inseridas = 0
+    abas = set()
+
+    # insere em transação (bem mais rápido)
+    con.execute("BEGIN;")
+    id_antes = ultimo_id_raw(con)
+
+    for linhas, bloco in lotes:
+        with tel.etapa("insercao") as m:
+            linhas_lidas += len(linhas)
+            linhas_inseridas += inserir_lote(con, _SQL_INSERIR, trocar_contribuintes(con, linhas), tamanho_lote)
+            gravar_bloco(con, arquivo_nome, bloco)
+            abas.add(bloco[0])
+            m.linhas = len(linhas)
+
+    with tel.etapa("eventos") as m:
+        # NOVA/RESOLVIDA/ALTERADA contra a coleta anterior (ver eventos.py)
+        eventos = registrar_eventos(con, id_antes, tipos_das_abas(abas))
+        m.linhas = sum(eventos.values())
+
+    with tel.etapa("insercao"):
+        # resumo_pendencias na mesma transação (só as linhas novas)
+        atualizar_resumo(con, id_antes)
+
+        con.commit()
+
+    # registra no log (dedupe por hash)
+    _registrar_importacao(con, arquivo_nome, hash_md5, linhas_lidas, linhas_inseridas)
+
+    detalhes.append({
+        "arquivo": arquivo_nome,
+        "status": "OK",
+        "linhas_lidas": linhas_lidas,
+        "linhas_inseridas": linhas_inseridas,
+        "eventos": eventos,
+    })
+
+    # move/copia para processados
+    status_move, erro_move, destino_final = mover_ou_copiar_para_processados(path, pasta_processados)
+
+    if status_move == "MOVIDO_PROCESSADOS":
+        # nada a fazer
+        pass
+    elif status_move == "COPIADO_PROCESSADOS":
+        detalhes.append({
+            "arquivo": arquivo_nome,
+            "status": "COPIADO_PROCESSADOS",
+            "destino": destino_final,
+            "aviso": "Arquivo estava em uso (WinError 32). Copiado para processados e mantido na entrada.",
+            "erro_move": erro_move
+        })
+    else:
+        detalhes.append({
+            "arquivo": arquivo_nome,
+            "status": "IMPORTADO_MAS_NAO_MOVIDO",
+            "erro_move": erro_move
+        })
+
+    return linhas_lidas, linhas_inseridas
+
+
+def _registrar_erro(
+    con: sqlite3.Connection | None,
+    path: Path,
+    pasta_erros: Path,
+    erro: Exception,
+    detalhes: List[Dict[str, Any]],
+) -> None:
+    # desfaz o que o arquivo chegou a inserir (a leitura agora é dentro da transação)
+    if con is not None and con.in_transaction:
+        con.rollback()
+
+    # tenta mandar para erros
+    try:
+        destino_err = _nome_destino_unico(pasta_erros, path.name)
+        shutil.copy2(str(path), str(destino_err))
+    except Exception:
+        pass
+
+    detalhes.append({
+        "arquivo": path.name,
+        "status": "ERRO",
+        "erro": str(erro)
+    })
+
+
 # =========================
 # API principal
 # =========================
@@ -209,16 +400,138 @@ def importar_pasta(
     pasta_processados: Path,
     pasta_erros: Path,
     db_path: Path,
+    *,
+    motor_excel: str = "auto",
+    tamanho_lote: int = 5000,
+    workers: int = 1,
+    progresso: Optional[Callable[[Dict[str, Any]], None]] = None,
+    cache_hash_path: Optional[Path] = None,
+    codec_raw: str = "auto",
+    telemetria: Optional[Telemetria] = None,
 ) -> Dict[str, Any]:
-
+    """
+    Importa todos os .xlsx de `pasta_entrada`.
+
+    progresso: chamado depois de cada arquivo com as contagens até ali.
+    cache_hash_path: cache de MD5 por (caminho, tamanho, mtime); arquivo que
+    não mudou desde a última vez não é lido de novo só para calcular o hash.
+    codec_raw: compressão dos blocos RAW ("auto", "zlib", "zstd").
+    telemetria: recebe tempo/linhas/memória das etapas hash, leitura,
+    normalizacao, insercao e eventos.
+
+    workers > 1: leitura + normalização dos arquivos em paralelo
+    (ProcessPoolExecutor) e uma única thread gravadora dona da conexão
+    SQLite. `detalhes` sai na mesma ordem e com os mesmos status do modo
+    sequencial.
+    """
     pasta_entrada.mkdir(parents=True, exist_ok=True)
+
+    arquivos = sorted([p for p in pasta_entrada.glob("*.xlsx") if p.is_file()])
+
+    return importar_arquivos(
+        arquivos, pasta_processados, pasta_erros, db_path,
+        motor_excel=motor_excel, tamanho_lote=tamanho_lote,
+        workers=workers, progresso=progresso, cache_hash_path=cache_hash_path,
+        codec_raw=codec_raw, telemetria=telemetria,
+    )
+
+
+def importar_arquivos(
+    arquivos: List[Path],
+    pasta_processados: Path,
+    pasta_erros: Path,
+    db_path: Path,
+    *,
+    motor_excel: str = "auto",
+    tamanho_lote: int = 5000,
+    workers: int = 1,
+    progresso: Optional[Callable[[Dict[str, Any]], None]] = None,
+    cache_hash_path: Optional[Path] = None,
+    codec_raw: str = "auto",
+    telemetria: Optional[Telemetria] = None,
+) -> Dict[str, Any]:
+    """
+    Importa só os `arquivos` informados (usado pelo vigiar, que importa
+    cada arquivo assim que ele termina de ser gravado).
+    """
     pasta_processados.mkdir(parents=True, exist_ok=True)
     pasta_erros.mkdir(parents=True, exist_ok=True)
 
-    arquivos = sorted([p for p in pasta_entrada.glob("*.xlsx") if p.is_file()])
     detalhes: List[Dict[str, Any]] = []
 
-    total = len(arquivos)
+    # falha cedo (zstd sem o pacote) em vez de arquivo por arquivo
+    codec_raw = resolver_codec(codec_raw)
+
+    data_coleta = datetime.now().isoformat(timespec="seconds")
+
+    tel = telemetria or Telemetria(memoria=False)
+    cache = abrir_cache(cache_hash_path) if cache_hash_path is not None else None
+
+    def hashear(p: Path) -> str:
+        with tel.etapa("hash"):
+            return hash_com_cache(cache, p)
+
+    try:
+        if workers > 1 and len(arquivos) > 1:
+            contagem = _importar_em_paralelo(
+                arquivos, pasta_processados, pasta_erros, db_path,
+                data_coleta, motor_excel, tamanho_lote, workers, detalhes, progresso,
+                hashear, codec_raw, tel,
+            )
+        else:
+            contagem = _importar_em_sequencia(
+                arquivos, pasta_processados, pasta_erros, db_path,
+                data_coleta, motor_excel, tamanho_lote, detalhes, progresso,
+                hashear, codec_raw, tel,
+            )
+    finally:
+        if cache is not None:
+            cache.close()
+
+    importados, linhas_lidas_total, linhas_inseridas_total = contagem
+
+    return {
+        "arquivos_total": len(arquivos),
+        "arquivos_importados": importados,
+        "linhas_lidas": linhas_lidas_total,
+        "linhas_inseridas": linhas_inseridas_total,
+        "detalhes": detalhes
+    }
+
+
+def _avisar(
+    progresso: Optional[Callable[[Dict[str, Any]], None]],
+    total: int,
+    feitos: int,
+    importados: int,
+    lidas: int,
+    inseridas: int,
+) -> None:
+    if progresso is None:
+        return
+    progresso({
+        "arquivos_total": total,
+        "arquivos_feitos": feitos,
+        "arquivos_importados": importados,
+        "linhas_lidas": lidas,
+        "linhas_inseridas": inseridas,
+    })
+
+
+def _importar_em_sequencia(
+    arquivos: List[Path],
+    pasta_processados: Path,
+    pasta_erros: Path,
+    db_path: Path,
+    data_coleta: str,
+    motor: str,
+    tamanho_lote: int,
+    detalhes: List[Dict[str, Any]],
+    progresso: Optional[Callable[[Dict[str, Any]], None]] = None,
+    hashear: Callable[[Path], str] = hash_md5,
+    codec_raw: str = "auto",
+    telemetria: Optional[Telemetria] = None,
+) -> Tuple[int, int, int]:
     importados = 0
     linhas_lidas_total = 0
     linhas_inseridas_total = 0
@@ -226,119 +539,150 @@ def importar_pasta(
     con = _conectar_db(db_path)
     _iniciar_schema(con)
 
-    data_coleta = datetime.now().isoformat(timespec="seconds")
-
-    for path in arquivos:
-        arquivo_nome = path.name
-
+    for feitos, path in enumerate(arquivos, 1):
         try:
-            hash_md5 = _hash_arquivo_md5(path)
+            hash_md5 = hashear(path)
 
             if _ja_importado(con, hash_md5):
-                detalhes.append({"arquivo": arquivo_nome, "status": "JA_IMPORTADO"})
+                detalhes.append({"arquivo": path.name, "status": "JA_IMPORTADO"})
                 continue
 
-            # lê abas relevantes
-            abas = _ler_excel(path)
+            lidas, inseridas = _gravar_arquivo(
+                con, path, hash_md5,
+                _lotes_do_arquivo(path, data_coleta, motor, tamanho_lote, codec_raw, telemetria),
+                pasta_processados, tamanho_lote, detalhes, telemetria,
+            )
 
-            linhas_lidas = 0
-            linhas_inseridas = 0
+            importados += 1
+            linhas_lidas_total += lidas
+            linhas_inseridas_total += inseridas
 
-            # insere em transação (bem mais rápido)
-            con.execute("BEGIN;")
+        except Exception as e:
+            _registrar_erro(con, path, pasta_erros, e, detalhes)
 
-            for aba, df in abas.items():
-                # remove linhas completamente vazias
-                df2 = df.dropna(how="all")
-                if df2.empty:
-                    continue
+        finally:
+            _avisar(progresso, len(arquivos), feitos, importados, linhas_lidas_total, linhas_inseridas_total)
 
-                for i in range(len(df2)):
-                    rowdict = _to_row_dict(df2, i)
-
-                    # normaliza (classifica)
-                    base = normalizar_por_aba(aba, rowdict)
-
-                    # guarda RAW completo (para auditoria)
-                    raw = {
-                        "aba": aba,
-                        "row": rowdict
-                    }
-                    raw_json = json.dumps(raw, ensure_ascii=False, default=str)
-
-                    # linha_origem: +2 porque 1 é header, e i é 0-indexed
-                    linha_origem = int(i) + 2
-
-                    _inserir_linha(
-                        con,
-                        base=base,
-                        arquivo_origem=arquivo_nome,
-                        aba_origem=aba,
-                        linha_origem=linha_origem,
-                        data_coleta=data_coleta,
-                        raw_json=raw_json,
+    con.close()
+    return importados, linhas_lidas_total, linhas_inseridas_total
+
+
+def _importar_em_paralelo(
+    arquivos: List[Path],
+    pasta_processados: Path,
+    pasta_erros: Path,
+    db_path: Path,
+    data_coleta: str,
+    motor: str,
+    tamanho_lote: int,
+    workers: int,
+    detalhes: List[Dict[str, Any]],
+    progresso: Optional[Callable[[Dict[str, Any]], None]] = None,
+    hashear: Callable[[Path], str] = hash_md5,
+    codec_raw: str = "auto",
+    telemetria: Optional[Telemetria] = None,
+) -> Tuple[int, int, int]:
+    # hashes já importados (a gravadora confere de novo antes de inserir,
+    # por causa de arquivos repetidos dentro da mesma pasta)
+    con = _conectar_db(db_path)
+    _iniciar_schema(con)
+    ja_importados = {r[0] for r in con.execute("SELECT hash_md5 FROM import_log")}
+    con.close()
+
+    # fila em ordem de arquivo: (path, hash_md5, future, erro)
+    fila: queue.Queue = queue.Queue()
+    # limita quantos arquivos lidos ficam esperando a gravação (memória)
+    em_voo = threading.BoundedSemaphore(workers * 2)
+    contagem = [0, 0, 0]
+    feitos = [0]
+    # erro que derrubou a gravadora (conexão, progresso...): o laço principal
+    # para de enviar arquivos e ele sobe para quem chamou, como no sequencial
+    erro_gravadora: List[BaseException] = []
+
+    def gravadora() -> None:
+        try:
+            gravar_fila()
+        except BaseException as e:
+            erro_gravadora.append(e)
+
+    def gravar_fila() -> None:
+        con_w = _conectar_db(db_path)
+        try:
+            while True:
+                item = fila.get()
+                if item is None:
+                    return
+                path, hash_md5, fut, erro = item
+                try:
+                    if erro is not None:
+                        raise erro
+
+                    if fut is None:
+                        detalhes.append({"arquivo": path.name, "status": "JA_IMPORTADO"})
+                        continue
+
+                    try:
+                        lotes, medidas, caches = fut.result()
+                    finally:
+                        em_voo.release()
+                    if telemetria is not None:
+                        telemetria.juntar(medidas, caches)
+
+                    if _ja_importado(con_w, hash_md5):
+                        detalhes.append({"arquivo": path.name, "status": "JA_IMPORTADO"})
+                        continue
+
+                    lidas, inseridas = _gravar_arquivo(
+                        con_w, path, hash_md5, lotes,
+                        pasta_processados, tamanho_lote, detalhes, telemetria,
                     )
+                    contagem[0] += 1
+                    contagem[1] += lidas
+                    contagem[2] += inseridas
 
-                    linhas_lidas += 1
-                    linhas_inseridas += 1
+                except Exception as e:
+                    _registrar_erro(con_w, path, pasta_erros, e, detalhes)
 
-            con.commit()
+                finally:
+                    feitos[0] += 1
+                    _avisar(progresso, len(arquivos), feitos[0], *contagem)
+        finally:
+            con_w.close()
 
-            # registra no log (dedupe por hash)
-            _registrar_importacao(con, arquivo_nome, hash_md5)
+    t = threading.Thread(target=gravadora, name="importar-gravadora", daemon=True)
+    t.start()
 
-            importados += 1
-            linhas_lidas_total += linhas_lidas
-            linhas_inseridas_total += linhas_inseridas
-
-            detalhes.append({
-                "arquivo": arquivo_nome,
-                "status": "OK",
-                "linhas_lidas": linhas_lidas,
-                "linhas_inseridas": linhas_inseridas
-            })
-
-            # move/copia para processados
-            status_move, erro_move, destino_final = mover_ou_copiar_para_processados(path, pasta_processados)
-
-            if status_move == "MOVIDO_PROCESSADOS":
-                # nada a fazer
-                pass
-            elif status_move == "COPIADO_PROCESSADOS":
-                detalhes.append({
-                    "arquivo": arquivo_nome,
-                    "status": "COPIADO_PROCESSADOS",
-                    "destino": destino_final,
-                    "aviso": "Arquivo estava em uso (WinError 32). Copiado para processados e mantido na entrada.",
-                    "erro_move": erro_move
-                })
-            else:
-                detalhes.append({
-                    "arquivo": arquivo_nome,
-                    "status": "IMPORTADO_MAS_NAO_MOVIDO",
-                    "erro_move": erro_move
-                })
+    def reservar_vaga() -> bool:
+        # com a gravadora morta ninguém mais libera o semáforo
+        while not em_voo.acquire(timeout=0.5):
+            if not t.is_alive():
+                return False
+        return True
 
-        except Exception as e:
-            # tenta mandar para erros
-            try:
-                destino_err = _nome_destino_unico(pasta_erros, arquivo_nome)
-                shutil.copy2(str(path), str(destino_err))
-            except Exception:
-                pass
-
-            detalhes.append({
-                "arquivo": arquivo_nome,
-                "status": "ERRO",
-                "erro": str(e)
-            })
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path in arquivos:
+                if not t.is_alive():
+                    break
+                try:
+                    hash_md5 = hashear(path)
+                except Exception as e:
+                    fila.put((path, None, None, e))
+                    continue
 
-    con.close()
+                if hash_md5 in ja_importados:
+                    fila.put((path, hash_md5, None, None))
+                    continue
 
-    return {
-        "arquivos_total": total,
-        "arquivos_importados": importados,
-        "linhas_lidas": linhas_lidas_total,
-        "linhas_inseridas": linhas_inseridas_total,
-        "detalhes": detalhes
-    }
+                if not reservar_vaga():
+                    break
+                fut = pool.submit(_ler_arquivo_no_pool, path, data_coleta, motor, tamanho_lote, codec_raw)
+                fila.put((path, hash_md5, fut, None))
+    finally:
+        fila.put(None)
+        t.join()
+
+    if erro_gravadora:
+        raise erro_gravadora[0]
+
+    return contagem[0], contagem[1], contagem[2]
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+
+# =========================
+# Leitor de planilhas (streaming)
+# =========================
+#
+# Abre SOMENTE as abas aceitas e entrega as linhas aos poucos, em lotes,
+# sem materializar o workbook inteiro (pd.read_excel(sheet_name=None) lia
+# e convertia todas as abas antes de filtrar).
+#
+# Motores:
+#   - "calamine": python-calamine (requirements.txt; bem mais rápido)
+#   - "openpyxl": modo read_only + iter_rows
+#   - "auto": tenta calamine e cai para openpyxl se não estiver instalado,
+#             se o arquivo não abrir ou se a leitura falhar no meio (aí o
+#             openpyxl relê e continua do lote seguinte ao último entregue)
+#
+# O workbook é sempre fechado ao terminar (ou abandonar) a leitura: no
+# Windows um arquivo aberto não pode ser movido para processados/.
+
+MOTORES = ("auto", "calamine", "openpyxl")
+
+# (aba, colunas, [(linha_origem, valores), ...], com_vazias)
+# com_vazias: havia linha vazia entre as linhas do lote. Ela não vira linha
+# (antes: dropna(how="all")), mas no pd.read_excel deixava NaN em todas as
+# colunas, e isso muda o tipo que o importar infere para o lote
+Lote = Tuple[str, List[Any], List[Tuple[int, Tuple[Any, ...]]], bool]
+
+
+def _vazio(v: Any) -> bool:
+    return v is None or (isinstance(v, str) and v == "")
+
+
+def _aparar(linha: Sequence[Any]) -> List[Any]:
+    """Tira as células vazias do fim da linha (como o pandas)."""
+    fim = len(linha)
+    while fim and _vazio(linha[fim - 1]):
+        fim -= 1
+    return list(linha[:fim])
+
+
+def _nomes_colunas(header: Sequence[Any]) -> List[Any]:
+    """
+    Mesma convenção do pandas: célula vazia vira "Unnamed: N"
+    e nomes repetidos ganham sufixo ".1", ".2", ...
+    """
+    vistos: dict = {}
+    out: List[Any] = []
+    for i, c in enumerate(header):
+        nome = f"Unnamed: {i}" if _vazio(c) else c
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        else:
+            vistos[nome] = 0
+        out.append(nome)
+    return out
+
+
+def _valor_calamine(v: Any) -> Any:
+    """
+    Deixa o valor do calamine igual ao do openpyxl:
+      ""        -> None
+      5.0       -> 5
+      date(...) -> datetime(...)
+    """
+    if isinstance(v, str):
+        return None if v == "" else v
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if isinstance(v, date) and not isinstance(v, datetime):
+        return datetime(v.year, v.month, v.day)
+    return v
+
+
+def _lotes_da_aba(
+    aba: str,
+    linhas: Iterable[Sequence[Any]],
+    tamanho_lote: int,
+    calamine: bool,
+) -> Iterator[Lote]:
+    cabecalho: Optional[List[Any]] = None
+    colunas: List[Any] = []
+    n = 0
+    lote: List[Tuple[int, Tuple[Any, ...]]] = []
+    vazias = 0
+    com_vazias = False
+
+    for linha in linhas:
+        if calamine:
+            linha = [_valor_calamine(v) for v in linha]
+        linha = _aparar(linha)
+
+        # linhas totalmente vazias são descartadas (antes: dropna(how="all"))
+        if not linha:
+            if cabecalho is not None:
+                vazias += 1
+            continue
+
+        if cabecalho is None:
+            cabecalho = linha
+            colunas = _nomes_colunas(cabecalho)
+            continue
+
+        # coluna sem cabeçalho mas com dados: o pandas a mantinha como
+        # "Unnamed: N". Só se sabe que ela existe quando aparece: o lote em
+        # curso ganha a coluna (vazia nas linhas anteriores); os lotes já
+        # entregues ficam sem ela
+        if len(linha) > len(colunas):
+            extra = (None,) * (len(linha) - len(colunas))
+            lote = [(i, valores + extra) for i, valores in lote]
+            colunas = _nomes_colunas(cabecalho + [None] * (len(linha) - len(cabecalho)))
+
+        if vazias:
+            com_vazias = True
+            vazias = 0
+
+        # linha_origem: mesma numeração de antes (posição entre as linhas
+        # não vazias, +2 porque 1 é o header)
+        lote.append((n + 2, tuple(linha) + (None,) * (len(colunas) - len(linha))))
+        n += 1
+
+        if len(lote) >= tamanho_lote:
+            yield aba, colunas, lote, com_vazias
+            lote, com_vazias = [], False
+
+    if lote:
+        yield aba, colunas, lote, com_vazias
+
+
+def _iterar_openpyxl(path: Path, abas: Set[str], tamanho_lote: int) -> Iterator[Lote]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(str(path), read_only=True, data_only=True)
+    try:
+        for aba in wb.sheetnames:
+            if aba not in abas:
+                continue
+            ws = wb[aba]
+            # a tag <dimension> pode estar errada (ex.: "A1" gravado por
+            # outro programa): sem isto o iter_rows para nela e a aba sai
+            # vazia. O pandas faz o mesmo
+            ws.reset_dimensions()
+            yield from _lotes_da_aba(aba, ws.iter_rows(values_only=True), tamanho_lote, False)
+    finally:
+        wb.close()
+
+
+def _abrir_calamine(path: Path):
+    from python_calamine import CalamineWorkbook
+    return CalamineWorkbook.from_path(str(path))
+
+
+def _iterar_calamine(wb, abas: Set[str], tamanho_lote: int) -> Iterator[Lote]:
+    for aba in wb.sheet_names:
+        if aba not in abas:
+            continue
+        ws = wb.get_sheet_by_name(aba)
+        yield from _lotes_da_aba(aba, ws.iter_rows(), tamanho_lote, True)
+
+
+def _continuar_openpyxl(
+    path: Path,
+    abas: Set[str],
+    tamanho_lote: int,
+    entregues: List[Tuple[str, int]],
+    falha: Exception,
+) -> Iterator[Lote]:
+    """
+    Relê com openpyxl e pula os lotes que o calamine já entregou
+    ((aba, nº de linhas) de cada um). Os dois motores geram os mesmos
+    lotes; se não baterem, não dá para continuar sem repetir ou perder
+    linha e o erro original sobe.
+    """
+    n = 0
+    for lote in _iterar_openpyxl(path, abas, tamanho_lote):
+        if n < len(entregues):
+            if (lote[0], len(lote[2])) != entregues[n]:
+                raise falha
+            n += 1
+            continue
+        yield lote
+    if n < len(entregues):
+        raise falha
+
+
+def iterar_lotes(
+    path: Path,
+    abas: Set[str],
+    *,
+    motor: str = "auto",
+    tamanho_lote: int = 5000,
+) -> Iterator[Lote]:
+    """
+    Gera (aba, colunas, linhas, com_vazias) em lotes de até `tamanho_lote`
+    linhas, somente para as abas em `abas`. Os valores saem como estão na
+    célula (sem a inferência de tipo por coluna do pandas; ver
+    importar._ler_excel).
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de leitura inválido: {motor} (use {', '.join(MOTORES)})")
+
+    if motor in ("auto", "calamine"):
+        try:
+            wb = _abrir_calamine(path)
+        except Exception:
+            if motor == "calamine":
+                raise
+            wb = None
+
+        if wb is not None:
+            entregues: List[Tuple[str, int]] = []
+            falha: Optional[Exception] = None
+            try:
+                for lote in _iterar_calamine(wb, abas, tamanho_lote):
+                    yield lote
+                    entregues.append((lote[0], len(lote[2])))
+            except Exception as e:
+                if motor == "calamine":
+                    raise
+                falha = e
+            finally:
+                wb.close()
+
+            if falha is not None:
+                yield from _continuar_openpyxl(path, abas, tamanho_lote, entregues, falha)
+            return
+
+    yield from _iterar_openpyxl(path, abas, tamanho_lote)
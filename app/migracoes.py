@@ -0,0 +1,520 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+# =========================
+# Migrações do banco (PRAGMA user_version)
+# =========================
+#
+# Antes existiam dois schemas para as mesmas tabelas:
+#   - importar._iniciar_schema: import_log(hash_md5 UNIQUE), pendencias_raw
+#     sem hash_registro/fonte
+#   - banco.iniciar: import_log(hash_arquivo, linhas_*, NOT NULL),
+#     pendencias_raw(hash_registro NOT NULL UNIQUE, fonte)
+# e quem criava o banco primeiro decidia qual valia (o outro quebrava com
+# "no such column: fonte" ou "NOT NULL constraint failed"). O
+# ajustar_banco.py corrigia à mão só a coluna fonte.
+#
+# Agora os dois chamam migrar(con): cada migração roda uma vez, na ordem,
+# numa transação, e grava o número em PRAGMA user_version.
+#
+# Para mudar o schema: acrescentar uma função no fim de MIGRACOES (nunca
+# alterar uma que já foi publicada).
+
+# colunas de cada tabela no schema unificado (nenhuma NOT NULL: importar e
+# banco.inserir_raw preenchem conjuntos diferentes)
+_DDL_PENDENCIAS_RAW = """
+CREATE TABLE {nome} (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  hash_registro TEXT,
+
+  fonte TEXT,
+  arquivo_origem TEXT,
+  aba_origem TEXT,
+  linha_origem INTEGER,
+
+  cnpj TEXT,
+  cgf TEXT,
+  razao TEXT,
+
+  tipo_pendencia TEXT,
+  periodo TEXT,
+  detalhe TEXT,
+
+  valor REAL,
+  data_referencia TEXT,
+  data_coleta TEXT,
+
+  raw_json TEXT
+);
+"""
+
+_DDL_IMPORT_LOG = """
+CREATE TABLE {nome} (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  arquivo_origem TEXT,
+  hash_md5 TEXT,
+  hash_arquivo TEXT,
+  data_importacao TEXT,
+  linhas_lidas INTEGER,
+  linhas_inseridas INTEGER
+);
+"""
+
+
+def _colunas(con: sqlite3.Connection, tabela: str) -> List[Tuple[str, str, bool]]:
+    """[(nome, tipo, not_null)] na ordem da tabela; [] se não existe."""
+    return [(r[1], r[2], bool(r[3])) for r in con.execute(f"PRAGMA table_info({tabela})")]
+
+
+def _tem_unico(con: sqlite3.Connection, tabela: str, colunas: Sequence[str]) -> bool:
+    """Já existe índice UNIQUE (inclusive o automático de UNIQUE na coluna) exatamente nessas colunas?"""
+    for idx in con.execute(f"PRAGMA index_list({tabela})").fetchall():
+        if not idx[2]:
+            continue
+        cols = [r[2] for r in con.execute(f"PRAGMA index_info({idx[1]})")]
+        if cols == list(colunas):
+            return True
+    return False
+
+
+def _ajustar_tabela(con: sqlite3.Connection, tabela: str, ddl: str) -> None:
+    """
+    Leva a tabela ao formato de `ddl`:
+      - não existe: cria
+      - tem coluna NOT NULL (schema do banco.iniciar): recria copiando os dados
+        (SQLite não tem ALTER COLUMN; os índices antigos somem junto e a
+        migração cria de novo)
+      - senão: só acrescenta as colunas que faltam
+    """
+    atuais = _colunas(con, tabela)
+    if not atuais:
+        con.execute(ddl.format(nome=tabela))
+        return
+
+    nova = f"{tabela}_migracao"
+    con.execute(f"DROP TABLE IF EXISTS {nova}")
+    con.execute(ddl.format(nome=nova))
+    alvo = _colunas(con, nova)
+    nomes_atuais = [nome for nome, _, _ in atuais]
+
+    if any(nn for nome, _, nn in atuais if nome != "id"):
+        comuns = ", ".join(n for n in nomes_atuais if n in {a[0] for a in alvo})
+        con.execute(f"INSERT INTO {nova} ({comuns}) SELECT {comuns} FROM {tabela}")
+        con.execute(f"DROP TABLE {tabela}")
+        con.execute(f"ALTER TABLE {nova} RENAME TO {tabela}")
+        return
+
+    con.execute(f"DROP TABLE {nova}")
+    for nome, tipo, _ in alvo:
+        if nome not in nomes_atuais:
+            con.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+
+
+# -------------------------
+# migrações
+# -------------------------
+
+def _m1_schema_unificado(con: sqlite3.Connection) -> None:
+    _ajustar_tabela(con, "pendencias_raw", _DDL_PENDENCIAS_RAW)
+    _ajustar_tabela(con, "import_log", _DDL_IMPORT_LOG)
+
+    # UNIQUE continua valendo para quem preenche; NULL não conflita com NULL
+    if not _tem_unico(con, "pendencias_raw", ["hash_registro"]):
+        con.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_raw_hash_registro ON pendencias_raw(hash_registro);")
+    if not _tem_unico(con, "import_log", ["hash_md5"]):
+        con.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_import_log_md5 ON import_log(hash_md5);")
+    if not _tem_unico(con, "import_log", ["arquivo_origem", "hash_arquivo"]):
+        con.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_import_log_arquivo ON import_log(arquivo_origem, hash_arquivo);")
+
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_cnpj ON pendencias_raw(cnpj);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_cgf ON pendencias_raw(cgf);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_tipo ON pendencias_raw(tipo_pendencia);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_periodo ON pendencias_raw(periodo);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_fonte ON pendencias_raw(fonte);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_arquivo ON pendencias_raw(arquivo_origem);")
+
+
+# resumo._SQL_DETALHES: só linhas classificadas, já na ordem do ORDER BY
+# (sem sort em B-tree temporária; com LIMIT para nas primeiras N).
+# Parcial: linhas sem tipo não entram. No ORDER BY arquivo_origem,
+# aba_origem e linha_origem são os apelidos do SELECT, ou seja, os
+# COALESCE(...,'') -- o índice precisa ter as mesmas expressões.
+_SQL_IDX_RAW_DETALHES = """
+CREATE INDEX IF NOT EXISTS idx_raw_detalhes
+ON pendencias_raw(
+  data_coleta DESC,
+  COALESCE(arquivo_origem,''),
+  COALESCE(aba_origem,''),
+  COALESCE(linha_origem,'')
+)
+WHERE COALESCE(tipo_pendencia,'') <> '';
+"""
+
+
+def _m2_indices_relatorios(con: sqlite3.Connection) -> None:
+    con.execute(_SQL_IDX_RAW_DETALHES)
+
+
+def _m3_run_log(con: sqlite3.Connection) -> None:
+    # telemetria.Telemetria.salvar: uma linha por etapa de cada execução
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS run_log (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      execucao TEXT NOT NULL,
+      iniciada_em TEXT NOT NULL,
+      etapa TEXT NOT NULL,
+      chamadas INTEGER NOT NULL,
+      segundos REAL NOT NULL,
+      linhas INTEGER NOT NULL,
+      linhas_por_s REAL,
+      pico_rss_mb REAL
+    );
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_run_log_etapa ON run_log(etapa, id);")
+
+
+# pendencias_raw a partir da migração 4: cnpj/cgf/razao saem da linha e
+# ficam uma vez só em contribuintes (texto vazio no lugar de NULL, como o
+# GROUP BY do resumo sempre tratou)
+_DDL_CONTRIBUINTES = """
+CREATE TABLE IF NOT EXISTS contribuintes (
+  id INTEGER PRIMARY KEY,
+  cnpj TEXT NOT NULL,
+  cgf TEXT NOT NULL,
+  razao TEXT NOT NULL,
+  UNIQUE (cnpj, cgf, razao)
+);
+"""
+
+_DDL_PENDENCIAS_RAW_CONTRIBUINTE = """
+CREATE TABLE {nome} (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  hash_registro TEXT,
+
+  fonte TEXT,
+  arquivo_origem TEXT,
+  aba_origem TEXT,
+  linha_origem INTEGER,
+
+  contribuinte_id INTEGER REFERENCES contribuintes(id),
+
+  tipo_pendencia TEXT,
+  periodo TEXT,
+  detalhe TEXT,
+
+  valor REAL,
+  data_referencia TEXT,
+  data_coleta TEXT,
+
+  raw_json TEXT
+);
+"""
+
+
+def _m4_contribuintes(con: sqlite3.Connection) -> None:
+    # Antes cada linha repetia cnpj/cgf/razao e o resumo agrupava e
+    # indexava pelos três textos. Agora a linha guarda só contribuinte_id
+    # e os relatórios juntam contribuintes no fim (ver resumo.py).
+    con.execute(_DDL_CONTRIBUINTES)
+    con.execute("""
+    INSERT OR IGNORE INTO contribuintes (cnpj, cgf, razao)
+    SELECT DISTINCT COALESCE(cnpj,''), COALESCE(cgf,''), COALESCE(razao,'')
+    FROM pendencias_raw;
+    """)
+
+    # SQLite não tem DROP COLUMN com índice em cima: recria copiando (os
+    # ids ficam os mesmos, o snapshot e o resumo incremental dependem deles)
+    nova = "pendencias_raw_migracao"
+    con.execute(f"DROP TABLE IF EXISTS {nova}")
+    con.execute(_DDL_PENDENCIAS_RAW_CONTRIBUINTE.format(nome=nova))
+    copiadas = [nome for nome, _, _ in _colunas(con, nova) if nome != "contribuinte_id"]
+    con.execute(f"""
+    INSERT INTO {nova} ({", ".join(copiadas)}, contribuinte_id)
+    SELECT {", ".join("r." + c for c in copiadas)}, c.id
+    FROM pendencias_raw r
+    JOIN contribuintes c
+      ON c.cnpj = COALESCE(r.cnpj,'') AND c.cgf = COALESCE(r.cgf,'') AND c.razao = COALESCE(r.razao,'');
+    """)
+    con.execute("DROP TABLE pendencias_raw")
+    con.execute(f"ALTER TABLE {nova} RENAME TO pendencias_raw")
+
+    con.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_raw_hash_registro ON pendencias_raw(hash_registro);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_contribuinte ON pendencias_raw(contribuinte_id);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_tipo ON pendencias_raw(tipo_pendencia);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_periodo ON pendencias_raw(periodo);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_fonte ON pendencias_raw(fonte);")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_arquivo ON pendencias_raw(arquivo_origem);")
+    con.execute(_SQL_IDX_RAW_DETALHES)
+
+    # o resumo materializado era chaveado pelos textos: banco.iniciar_resumo
+    # cria de novo (por contribuinte_id) e recalcula
+    con.execute("DROP TABLE IF EXISTS resumo_pendencias")
+
+
+def _m5_arquivo_coletas(con: sqlite3.Connection) -> None:
+    # particoes.py: meses de coleta antigos saem de pendencias_raw para um
+    # .db comprimido por mês; aqui fica o registro de cada um
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS particoes_arquivadas (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      periodo_coleta TEXT NOT NULL,
+      arquivo TEXT NOT NULL UNIQUE,
+      linhas INTEGER NOT NULL,
+      menor_id INTEGER NOT NULL,
+      maior_id INTEGER NOT NULL,
+      arquivado_em TEXT NOT NULL
+    );
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_particoes_periodo ON particoes_arquivadas(periodo_coleta);")
+
+    # o que foi arquivado continua somado no resumo_pendencias; o
+    # reconstruir_resumo parte daqui em vez de abrir os arquivos
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS resumo_arquivado (
+      contribuinte_id INTEGER NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      periodo TEXT NOT NULL,
+
+      qtd INTEGER NOT NULL,
+      valor_total REAL NOT NULL,
+      ultima_coleta TEXT,
+
+      PRIMARY KEY (contribuinte_id, tipo_pendencia, periodo)
+    );
+    """)
+
+
+def _m6_eventos(con: sqlite3.Connection) -> None:
+    # eventos.py: chave de negócio de cada pendência = tipo + cnpj/cgf +
+    # periodo + item (CHAVE DFE, COD_RECEITA...: regras_abas "item"). Linhas
+    # antigas ficam com item NULL; os eventos começam na próxima coleta
+    if "item" not in {nome for nome, _, _ in _colunas(con, "pendencias_raw")}:
+        con.execute("ALTER TABLE pendencias_raw ADD COLUMN item TEXT")
+
+    # o conjunto de chaves da coleta mais recente de cada contribuinte/tipo
+    # (a data dessa coleta fica em escopos_coletados)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS pendencias_vigentes (
+      cnpj TEXT NOT NULL,
+      cgf TEXT NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      periodo TEXT NOT NULL,
+      item TEXT NOT NULL,
+
+      contribuinte_id INTEGER NOT NULL,
+      qtd INTEGER NOT NULL,
+      valor_total REAL NOT NULL,
+
+      PRIMARY KEY (cnpj, cgf, tipo_pendencia, periodo, item)
+    ) WITHOUT ROWID;
+    """)
+
+    # (contribuinte, tipo) já coletados ao menos uma vez: a primeira coleta
+    # é a base e não gera evento
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS escopos_coletados (
+      cnpj TEXT NOT NULL,
+      cgf TEXT NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      data_coleta TEXT,
+
+      PRIMARY KEY (cnpj, cgf, tipo_pendencia)
+    ) WITHOUT ROWID;
+    """)
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS eventos_pendencias (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      evento TEXT NOT NULL,            -- NOVA | RESOLVIDA | ALTERADA
+      data_coleta TEXT,
+      arquivo_origem TEXT,
+
+      contribuinte_id INTEGER,
+      cnpj TEXT NOT NULL,
+      cgf TEXT NOT NULL,
+      tipo_pendencia TEXT NOT NULL,
+      periodo TEXT NOT NULL,
+      item TEXT NOT NULL,
+
+      qtd_anterior INTEGER,
+      valor_anterior REAL,
+      qtd INTEGER,
+      valor REAL
+    );
+    """)
+
+
+
+def _m7_reconstrucoes_resumo(con: sqlite3.Connection) -> None:
+    # banco.reconstruir_resumo reescreve resumo_pendencias sem importar nada:
+    # o id daqui entra em versao_dados (ETag da API), senão quem guardou a
+    # versão de antes continuaria recebendo 304 com o resumo velho
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS reconstrucoes_resumo (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      reconstruido_em TEXT
+    );
+    """)
+
+
+def _m8_rotulos_eventos(con: sqlite3.Connection) -> None:
+    # Outros limitadores: o item era a lista de rótulos (CADIN=SIM; ...), e
+    # trocar um rótulo virava RESOLVIDA + NOVA. Agora o item é vazio (uma
+    # pendência por contribuinte) e os rótulos são comparados como valor
+    colunas = {nome for nome, _, _ in _colunas(con, "pendencias_vigentes")}
+    if "rotulos" not in colunas:
+        con.execute("ALTER TABLE pendencias_vigentes ADD COLUMN rotulos TEXT NOT NULL DEFAULT ''")
+    colunas = {nome for nome, _, _ in _colunas(con, "eventos_pendencias")}
+    for coluna in ("rotulos_anterior", "rotulos"):
+        if coluna not in colunas:
+            con.execute(f"ALTER TABLE eventos_pendencias ADD COLUMN {coluna} TEXT")
+
+    con.execute("UPDATE pendencias_raw SET item = '' WHERE tipo_pendencia = 'OUTROS_LIMITADORES' AND item <> ''")
+    con.execute("""
+    INSERT INTO pendencias_vigentes
+      (cnpj, cgf, tipo_pendencia, periodo, item, contribuinte_id, qtd, valor_total, rotulos)
+    SELECT cnpj, cgf, tipo_pendencia, periodo, '', MAX(contribuinte_id), SUM(qtd), SUM(valor_total), MAX(item)
+    FROM pendencias_vigentes
+    WHERE tipo_pendencia = 'OUTROS_LIMITADORES' AND item <> ''
+    GROUP BY cnpj, cgf, tipo_pendencia, periodo
+    ON CONFLICT (cnpj, cgf, tipo_pendencia, periodo, item) DO NOTHING
+    """)
+    con.execute("DELETE FROM pendencias_vigentes WHERE tipo_pendencia = 'OUTROS_LIMITADORES' AND item <> ''")
+
+def _m9_indice_contribuintes_cgf(con: sqlite3.Connection) -> None:
+    # a API filtra contribuintes só por cgf; o único índice era o
+    # UNIQUE(cnpj, cgf, razao), que não serve sem o cnpj
+    con.execute("CREATE INDEX IF NOT EXISTS idx_contribuintes_cgf ON contribuintes(cgf);")
+
+
+Migracao = Tuple[str, Callable[[sqlite3.Connection], None]]
+
+# posição na lista + 1 = versão gravada em user_version
+MIGRACOES: List[Migracao] = [
+    ("schema unificado de pendencias_raw/import_log", _m1_schema_unificado),
+    ("índices dos relatórios", _m2_indices_relatorios),
+    ("run_log (telemetria por etapa)", _m3_run_log),
+    ("contribuintes (cnpj/cgf/razao) por id em pendencias_raw", _m4_contribuintes),
+    ("arquivo de coletas antigas (particoes_arquivadas, resumo_arquivado)", _m5_arquivo_coletas),
+    ("eventos entre coletas (item, pendencias_vigentes, eventos_pendencias)", _m6_eventos),
+    ("registro das reconstruções do resumo (reconstrucoes_resumo)", _m7_reconstrucoes_resumo),
+    ("rótulos de Outros limitadores como valor nos eventos", _m8_rotulos_eventos),
+    ("índice de contribuintes por cgf (filtro da API)", _m9_indice_contribuintes_cgf),
+]
+
+
+def versao(con: sqlite3.Connection) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(con: sqlite3.Connection, *, avisar: bool = False) -> int:
+    """
+    Aplica as migrações pendentes, uma transação por migração. Retorna a
+    versão final. Seguro com dois processos ao mesmo tempo (BEGIN IMMEDIATE
+    e confere a versão de novo dentro da transação).
+    """
+    if versao(con) >= len(MIGRACOES):
+        return versao(con)
+
+    if con.in_transaction:
+        con.commit()
+
+    for n, (descricao, aplicar) in enumerate(MIGRACOES, 1):
+        con.execute("BEGIN IMMEDIATE;")
+        try:
+            if versao(con) >= n:
+                con.rollback()
+                continue
+            aplicar(con)
+            con.execute(f"PRAGMA user_version = {n}")
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        if avisar:
+            print(f"🔧 Migração {n}: {descricao}")
+
+    return versao(con)
+
+
+# =========================
+# Conferência dos planos de consulta
+# =========================
+#
+# As consultas dos relatórios não podem cair em varredura da tabela inteira
+# + ordenação em B-tree temporária. python -m app.migracoes verificar
+# roda EXPLAIN QUERY PLAN em cada uma e sai com erro se isso acontecer;
+# tests/test_planos.py faz o mesmo num banco novo, e também nas páginas
+# da API (consultas.py).
+
+def _consultas_relatorio() -> Dict[str, Tuple[str, tuple]]:
+    from .resumo import _SQL_CONTAR_DETALHES, _SQL_DETALHES, _SQL_RESUMO
+    return {
+        "resumo": (_SQL_RESUMO, ()),
+        "detalhes": (_SQL_DETALHES, (-1,)),
+        "detalhes (limite)": (_SQL_DETALHES, (1000,)),
+        "contar_detalhes": (_SQL_CONTAR_DETALHES, ()),
+    }
+
+
+def plano(con: sqlite3.Connection, sql: str, params: tuple = ()) -> List[str]:
+    return [r[3] for r in con.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def problemas_do_plano(passos: List[str]) -> List[str]:
+    out = []
+    for p in passos:
+        if "USE TEMP B-TREE" in p:
+            out.append(p)
+        elif p.startswith("SCAN ") and " USING " not in p:
+            out.append(p)
+    return out
+
+
+def verificar_planos(con: sqlite3.Connection) -> Dict[str, List[str]]:
+    """{consulta: passos problemáticos} só das consultas com problema."""
+    ruins = {}
+    for nome, (sql, params) in _consultas_relatorio().items():
+        p = problemas_do_plano(plano(con, sql, params))
+        if p:
+            ruins[nome] = p
+    return ruins
+
+
+def main() -> None:
+    """
+    python -m app.migracoes            -> aplica as migrações pendentes
+    python -m app.migracoes verificar  -> migra e confere os planos dos relatórios
+    """
+    from .config import DB_PATH
+    from .banco import conectar, iniciar
+
+    acao = sys.argv[1] if len(sys.argv) > 1 else "migrar"
+    if acao not in ("migrar", "verificar"):
+        print("uso: python -m app.migracoes [migrar|verificar]")
+        sys.exit(2)
+
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    con = conectar(str(DB_PATH))
+    try:
+        antes = versao(con)
+        migrar(con, avisar=True)
+        iniciar(con)
+        print(f"✅ Banco na versão {versao(con)} (estava na {antes})")
+
+        if acao == "verificar":
+            ruins = verificar_planos(con)
+            for nome, (sql, params) in _consultas_relatorio().items():
+                print(f"  {'❌' if nome in ruins else '✅'} {nome}: {' | '.join(plano(con, sql, params))}")
+            if ruins:
+                sys.exit(1)
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
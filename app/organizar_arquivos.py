@@ -1,22 +1,21 @@
 from __future__ import annotations
 
+import os
 import time
-import hashlib
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
+from typing import Deque, Dict, Optional, Set, Tuple
 import sqlite3
 
-
-TENTATIVAS = 6
+from .cache_hash import abrir_cache, consultar_hash, guardar_hash, hash_md5
 
 
-def hash_arquivo_md5(path: Path) -> str:
-    h = hashlib.md5()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+TENTATIVAS = 6
+# threads calculando md5 (I/O de disco; o GIL é liberado durante a leitura)
+HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)
 
 
 def nome_destino_unico(dest_dir: Path, nome: str) -> Path:
@@ -32,26 +31,6 @@ def nome_destino_unico(dest_dir: Path, nome: str) -> Path:
     return dest_dir / f"{stem} ({int(time.time())}){suf}"
 
 
-def mover_ou_copiar(arquivo: Path, processados_dir: Path, tentativas: int = TENTATIVAS):
-    processados_dir.mkdir(parents=True, exist_ok=True)
-    destino = nome_destino_unico(processados_dir, arquivo.name)
-
-    last_err = None
-    for t in range(1, tentativas + 1):
-        try:
-            shutil.move(str(arquivo), str(destino))
-            return "MOVIDO", None, destino
-        except Exception as e:
-            last_err = e
-            time.sleep(0.35 * t)
-
-    try:
-        shutil.copy2(str(arquivo), str(destino))
-        return "COPIADO", str(last_err), destino
-    except Exception as e2:
-        return "FALHOU", f"{last_err} | copy_err={e2}", None
-
-
 def _colunas_da_tabela(con: sqlite3.Connection, tabela: str) -> set[str]:
     try:
         rows = con.execute(f"PRAGMA table_info({tabela})").fetchall()
@@ -61,45 +40,61 @@ def _colunas_da_tabela(con: sqlite3.Connection, tabela: str) -> set[str]:
         return set()
 
 
-def ja_importado_no_db(db_path: Path, arquivo_nome: str, hash_md5: str) -> bool:
+def carregar_importados(db_path: Path) -> Tuple[Set[str], Optional[Set[str]]]:
     """
-    Compatível com DB antigo:
-      - Se existir coluna hash_md5: usa ela (melhor)
-      - Se NÃO existir: usa arquivo_origem (suficiente para nosso organizador)
+    Lê o import_log uma vez só: (hashes importados, nomes importados).
+    Arquivo já importado = hash_md5 no import_log; DB antigo sem a coluna
+    hash_md5 compara pelo nome (arquivo_origem), e só então os nomes vêm
+    preenchidos; senão None. Sem import_log: nada importado.
     """
     if not db_path.exists():
-        return False
+        return set(), None
 
     con = sqlite3.connect(str(db_path))
     try:
-        # se não existir import_log, não tem como saber
-        con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='import_log'")
-        exists = con.fetchone() if hasattr(con, "fetchone") else None  # compat
-        rows = con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='import_log'").fetchone()
-        if not rows:
-            return False
+        existe = con.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='import_log'").fetchone()
+        if not existe:
+            return set(), None
 
         cols = _colunas_da_tabela(con, "import_log")
 
         if "hash_md5" in cols:
-            row = con.execute("SELECT 1 FROM import_log WHERE hash_md5=?", (hash_md5,)).fetchone()
-            return row is not None
+            return {r[0] for r in con.execute("SELECT hash_md5 FROM import_log")}, None
 
-        # fallback: DB antigo sem hash -> usa arquivo_origem
         if "arquivo_origem" in cols:
-            row = con.execute("SELECT 1 FROM import_log WHERE arquivo_origem=?", (arquivo_nome,)).fetchone()
-            return row is not None
+            return set(), {r[0] for r in con.execute("SELECT arquivo_origem FROM import_log")}
 
-        return False
+        return set(), None
     finally:
         con.close()
 
 
+def _tentar_mover(arquivo: Path, processados_dir: Path) -> Tuple[bool, Optional[str], Optional[Path]]:
+    """Uma tentativa só, sem dormir: (ok, erro, destino)."""
+    processados_dir.mkdir(parents=True, exist_ok=True)
+    destino = nome_destino_unico(processados_dir, arquivo.name)
+    try:
+        shutil.move(str(arquivo), str(destino))
+        return True, None, destino
+    except Exception as e:
+        return False, str(e), None
+
+
+def _copiar(arquivo: Path, processados_dir: Path, ultimo_erro: Optional[str]):
+    destino = nome_destino_unico(processados_dir, arquivo.name)
+    try:
+        shutil.copy2(str(arquivo), str(destino))
+        return "COPIADO", ultimo_erro, destino
+    except Exception as e2:
+        return "FALHOU", f"{ultimo_erro} | copy_err={e2}", None
+
+
 def main():
     root = Path(__file__).resolve().parents[1]
     entrada = root / "entrada"
     processados = root / "processados"
     db_path = root / "banco" / "pendencias.db"
+    cache_path = root / "banco" / "cache_hash.db"
 
     entrada.mkdir(parents=True, exist_ok=True)
     processados.mkdir(parents=True, exist_ok=True)
@@ -112,40 +107,94 @@ def main():
     print("🗄️ DB:", db_path)
     print("📄 Arquivos encontrados:", len(arquivos))
 
-    movidos = 0
-    copiados = 0
-    pulados = 0
-    falhas = 0
-
-    for arq in arquivos:
-        try:
-            h = hash_arquivo_md5(arq)
-
-            if ja_importado_no_db(db_path, arq.name, h):
-                status, err, dest = mover_ou_copiar(arq, processados)
-                if status == "MOVIDO":
-                    movidos += 1
-                    print(f"✅ MOVIDO: {arq.name}")
-                elif status == "COPIADO":
-                    copiados += 1
-                    print(f"⚠️ COPIADO (em uso): {arq.name}")
-                else:
-                    falhas += 1
-                    print(f"❌ FALHOU: {arq.name} | {err}")
+    cont = {"movidos": 0, "copiados": 0, "pulados": 0, "falhas": 0}
+
+    # import_log lido uma vez (antes: uma conexão + consultas por arquivo)
+    hashes_importados, nomes_importados = carregar_importados(db_path)
+
+    # arquivo em uso não segura o loop: volta para esta fila e é tentado de
+    # novo depois, enquanto os outros andam. (arquivo, tentativas, próxima, erro)
+    repetir: Deque[Tuple[Path, int, float, Optional[str]]] = deque()
+
+    def registrar(arq: Path, status: str, err: Optional[str]) -> None:
+        if status == "MOVIDO":
+            cont["movidos"] += 1
+            print(f"✅ MOVIDO: {arq.name}")
+        elif status == "COPIADO":
+            cont["copiados"] += 1
+            print(f"⚠️ COPIADO (em uso): {arq.name}")
+        else:
+            cont["falhas"] += 1
+            print(f"❌ FALHOU: {arq.name} | {err}")
+
+    def tentar(arq: Path, tentativa: int) -> None:
+        ok, err, _ = _tentar_mover(arq, processados)
+        if ok:
+            registrar(arq, "MOVIDO", None)
+        elif tentativa >= TENTATIVAS:
+            registrar(arq, *_copiar(arq, processados, err)[:2])
+        else:
+            repetir.append((arq, tentativa + 1, time.monotonic() + 0.35 * tentativa, err))
+
+    def repetir_vencidos() -> None:
+        agora = time.monotonic()
+        for _ in range(len(repetir)):
+            arq, tentativa, quando, err = repetir.popleft()
+            if quando <= agora:
+                tentar(arq, tentativa)
             else:
-                pulados += 1
-                print(f"⏭️ PULADO (ainda não importado): {arq.name}")
+                repetir.append((arq, tentativa, quando, err))
+
+    def decidir(arq: Path, h: str) -> None:
+        importado = h in hashes_importados or (nomes_importados is not None and arq.name in nomes_importados)
+        if importado:
+            tentar(arq, 1)
+        else:
+            cont["pulados"] += 1
+            print(f"⏭️ PULADO (ainda não importado): {arq.name}")
+
+    cache = abrir_cache(cache_path)
+    try:
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            calculando: Dict = {}
+
+            for arq in arquivos:
+                try:
+                    h, st = consultar_hash(cache, arq)
+                except Exception as e:
+                    cont["falhas"] += 1
+                    print(f"❌ ERRO: {arq.name} | {e}")
+                    continue
+                if h is not None:
+                    decidir(arq, h)
+                else:
+                    calculando[pool.submit(hash_md5, arq)] = (arq, st)
+
+            for fut in as_completed(calculando):
+                arq, st = calculando[fut]
+                try:
+                    h = fut.result()
+                    guardar_hash(cache, arq, st, h)
+                    decidir(arq, h)
+                except Exception as e:
+                    cont["falhas"] += 1
+                    print(f"❌ ERRO: {arq.name} | {e}")
+                repetir_vencidos()
+    finally:
+        cache.close()
 
-        except Exception as e:
-            falhas += 1
-            print(f"❌ ERRO: {arq.name} | {e}")
+    # só sobrou quem está em uso: espera o próximo vencimento
+    while repetir:
+        proxima = min(q for _, _, q, _ in repetir)
+        time.sleep(max(0.0, proxima - time.monotonic()))
+        repetir_vencidos()
 
     agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print("\nSTATUS:", agora,
-          "| movidos:", movidos,
-          "| copiados:", copiados,
-          "| pulados:", pulados,
-          "| falhas:", falhas)
+          "| movidos:", cont["movidos"],
+          "| copiados:", cont["copiados"],
+          "| pulados:", cont["pulados"],
+          "| falhas:", cont["falhas"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import shutil
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .raw_compacto import _zstd, resolver_codec
+
+
+# =========================
+# Arquivo de coletas antigas
+# =========================
+#
+# pendencias_raw só cresce, mas resumo, DETALHES, API e snapshot só olham
+# as coletas recentes. Os meses de coleta (substr(data_coleta,1,7)) mais
+# antigos que ARQUIVAR_APOS_MESES saem do banco quente, um arquivo por mês:
+#
+#   banco/arquivo/coleta-2025-03-000000196056.db.gz   (.zst com zstandard)
+#
+# Cada arquivo é um SQLite completo e independente: pendencias_raw (mesmos
+# ids), os contribuintes que ele usa e o RAW compacto (raw_cabecalho/
+# raw_bloco) dos arquivos de origem que saíram inteiros.
+#
+# No banco quente ficam:
+#   particoes_arquivadas  um registro por arquivo (mês, linhas, faixa de ids)
+#   resumo_arquivado      os totais do que saiu: resumo_pendencias continua
+#                         contando tudo e reconstruir_resumo não abre arquivo
+#   contribuintes         inteiro (o arquivo também leva a sua cópia)
+#
+# O arquivo é escrito e comprimido antes; o registro, o resumo_arquivado e
+# o DELETE no banco quente vão numa transação só. Se cair no meio, sobra
+# um arquivo sem registro, apagado na próxima vez (_limpar_orfaos).
+#
+# Consulta histórica: abrir_historico descomprime (uma vez, em
+# arquivo/abertos/) e anexa os meses pedidos, com a view temporária
+# pendencias_historico = banco quente UNION ALL arquivos.
+
+PREFIXO = "coleta-"
+EXTENSOES = {"zlib": ".db.gz", "zstd": ".db.zst"}
+PASTA_ABERTOS = "abertos"
+VIEW_HISTORICO = "pendencias_historico"
+
+BLOCO_COPIA = 1 << 20  # bytes por leitura na (des)compressão
+
+# tabelas que vão para o arquivo (com o CREATE do banco quente)
+TABELAS_ARQUIVO = ("contribuintes", "pendencias_raw", "raw_cabecalho", "raw_bloco")
+
+# linhas de um mês de coleta; sempre com a faixa de ids (busca pela rowid)
+_FILTRO_MES = "id BETWEEN ? AND ? AND substr(data_coleta,1,7) = ?"
+
+
+def limite_arquivamento(meses: int, hoje: Optional[date] = None) -> str:
+    """Primeiro mês ("AAAA-MM") que fica no banco quente: o atual e os `meses` anteriores."""
+    hoje = hoje or date.today()
+    ano, mes = hoje.year, hoje.month - meses
+    while mes < 1:
+        mes += 12
+        ano -= 1
+    return f"{ano:04d}-{mes:02d}"
+
+
+def meses_para_arquivar(con: sqlite3.Connection, limite: str) -> List[Tuple[str, int, int, int]]:
+    """(mês de coleta, linhas, menor id, maior id) dos meses anteriores a `limite`, do mais antigo."""
+    return con.execute(
+        """
+        SELECT substr(data_coleta,1,7), COUNT(*), MIN(id), MAX(id)
+        FROM pendencias_raw NOT INDEXED
+        WHERE data_coleta < ?
+        GROUP BY 1
+        ORDER BY 1
+        """,
+        (limite,),
+    ).fetchall()
+
+
+# -------------------------
+# compressão (em fluxo: o .db não passa pela memória)
+# -------------------------
+
+def _comprimir(origem: Path, destino: Path, codec: str) -> None:
+    tmp = destino.with_name(destino.name + ".tmp")
+    try:
+        with open(origem, "rb") as fi, open(tmp, "wb") as fo:
+            if codec == "zstd":
+                _zstd().ZstdCompressor(level=10).copy_stream(fi, fo)
+            else:
+                with gzip.GzipFile(fileobj=fo, mode="wb", compresslevel=6) as gz:
+                    shutil.copyfileobj(fi, gz, BLOCO_COPIA)
+        tmp.replace(destino)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _descomprimir(origem: Path, destino: Path) -> None:
+    tmp = destino.with_name(destino.name + ".tmp")
+    try:
+        with open(origem, "rb") as fi, open(tmp, "wb") as fo:
+            if origem.name.endswith(EXTENSOES["zstd"]):
+                zstd = _zstd()
+                if zstd is None:
+                    raise RuntimeError(f"{origem.name} está em zstd mas o pacote zstandard não está instalado")
+                zstd.ZstdDecompressor().copy_stream(fi, fo)
+            else:
+                with gzip.GzipFile(fileobj=fi, mode="rb") as gz:
+                    shutil.copyfileobj(gz, fo, BLOCO_COPIA)
+        tmp.replace(destino)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# =========================
+# Arquivamento
+# =========================
+
+def _colunas(con: sqlite3.Connection, tabela: str, banco: str = "main") -> str:
+    return ", ".join(r[1] for r in con.execute(f"PRAGMA {banco}.table_info({tabela})"))
+
+
+def _criar_arquivo(con: sqlite3.Connection, caminho: Path) -> None:
+    """SQLite vazio com TABELAS_ARQUIVO como estão no banco quente (acompanha as migrações)."""
+    ddls = [
+        r[0] for r in con.execute(
+            f"SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name IN ({','.join('?' * len(TABELAS_ARQUIVO))})",
+            TABELAS_ARQUIVO,
+        )
+    ]
+    arq = sqlite3.connect(str(caminho))
+    try:
+        for ddl in ddls:
+            arq.execute(ddl)
+        arq.commit()
+    finally:
+        arq.close()
+
+
+def _arquivos_inteiros(con: sqlite3.Connection, faixa: Tuple[int, int, str]) -> List[str]:
+    """Arquivos de origem cujas linhas estão todas nesse mês (o RAW deles pode sair junto)."""
+    origens = [
+        r[0] for r in con.execute(
+            f"SELECT DISTINCT arquivo_origem FROM pendencias_raw WHERE {_FILTRO_MES} AND arquivo_origem IS NOT NULL",
+            faixa,
+        )
+    ]
+    return [
+        origem for origem in origens
+        if con.execute(
+            f"SELECT 1 FROM pendencias_raw WHERE arquivo_origem = ? AND NOT ({_FILTRO_MES}) LIMIT 1",
+            (origem, *faixa),
+        ).fetchone() is None
+    ]
+
+
+def _em(coluna: str, valores: List[Any]) -> str:
+    return f"{coluna} IN ({','.join('?' * len(valores))})"
+
+
+_SQL_SOMAR_ARQUIVADO = f"""
+INSERT INTO resumo_arquivado
+  (contribuinte_id, tipo_pendencia, periodo, qtd, valor_total, ultima_coleta)
+SELECT
+  contribuinte_id,
+  COALESCE(tipo_pendencia,''),
+  COALESCE(periodo,''),
+  COUNT(*),
+  SUM(COALESCE(valor,0)),
+  MAX(data_coleta)
+FROM pendencias_raw
+WHERE {_FILTRO_MES} AND COALESCE(tipo_pendencia,'') <> ''
+GROUP BY 1, 2, 3
+ON CONFLICT (contribuinte_id, tipo_pendencia, periodo) DO UPDATE SET
+  qtd = qtd + excluded.qtd,
+  valor_total = valor_total + excluded.valor_total,
+  ultima_coleta = CASE
+    WHEN ultima_coleta IS NULL OR excluded.ultima_coleta > ultima_coleta
+    THEN excluded.ultima_coleta ELSE ultima_coleta END;
+"""
+
+
+def arquivar_mes(
+    con: sqlite3.Connection,
+    pasta: Path,
+    mes: str,
+    menor_id: int,
+    maior_id: int,
+    *,
+    codec: str = "auto",
+) -> Dict[str, Any]:
+    """
+    Move as linhas do mês de coleta `mes` (ids entre menor_id e maior_id)
+    para um arquivo comprimido em `pasta`. Faz commit.
+    """
+    codec = resolver_codec(codec)
+    pasta.mkdir(parents=True, exist_ok=True)
+    faixa = (menor_id, maior_id, mes)
+    nome = f"{PREFIXO}{mes}-{menor_id:012d}{EXTENSOES[codec]}"
+    db_tmp = pasta / f"{PREFIXO}{mes}-{menor_id:012d}.db.tmp"
+    db_tmp.unlink(missing_ok=True)
+
+    con.commit()
+    try:
+        _criar_arquivo(con, db_tmp)
+        origens = _arquivos_inteiros(con, faixa)
+
+        # ATTACH não roda dentro de transação
+        con.execute("ATTACH DATABASE ? AS arq", (str(db_tmp),))
+        try:
+            con.execute("PRAGMA arq.synchronous=OFF")
+            # pais antes dos filhos (foreign_keys=ON no banco quente)
+            con.execute(f"""
+            INSERT INTO arq.contribuintes
+            SELECT * FROM main.contribuintes
+            WHERE id IN (SELECT DISTINCT contribuinte_id FROM main.pendencias_raw WHERE {_FILTRO_MES})
+            """, faixa)
+            colunas = _colunas(con, "pendencias_raw")
+            linhas = con.execute(f"""
+            INSERT INTO arq.pendencias_raw ({colunas})
+            SELECT {colunas} FROM main.pendencias_raw WHERE {_FILTRO_MES}
+            """, faixa).rowcount
+            if origens:
+                con.execute(
+                    f"INSERT INTO arq.raw_cabecalho SELECT * FROM main.raw_cabecalho WHERE {_em('arquivo_origem', origens)}",
+                    origens,
+                )
+                con.execute("""
+                INSERT INTO arq.raw_bloco
+                SELECT * FROM main.raw_bloco WHERE cabecalho_id IN (SELECT id FROM arq.raw_cabecalho)
+                """)
+            con.execute("CREATE INDEX arq.idx_raw_contribuinte ON pendencias_raw(contribuinte_id);")
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        finally:
+            con.execute("DETACH DATABASE arq")
+
+        _comprimir(db_tmp, pasta / nome, codec)
+    finally:
+        db_tmp.unlink(missing_ok=True)
+
+    try:
+        con.execute(_SQL_SOMAR_ARQUIVADO, faixa)
+        con.execute(
+            """
+            INSERT INTO particoes_arquivadas
+              (periodo_coleta, arquivo, linhas, menor_id, maior_id, arquivado_em)
+            VALUES (?,?,?,?,?,?)
+            """,
+            (mes, nome, linhas, menor_id, maior_id, datetime.now().isoformat(timespec="seconds")),
+        )
+        if origens:
+            cabecalhos = f"SELECT id FROM raw_cabecalho WHERE {_em('arquivo_origem', origens)}"
+            con.execute(f"DELETE FROM raw_bloco WHERE cabecalho_id IN ({cabecalhos})", origens)
+            con.execute(f"DELETE FROM raw_cabecalho WHERE {_em('arquivo_origem', origens)}", origens)
+        con.execute(f"DELETE FROM pendencias_raw WHERE {_FILTRO_MES}", faixa)
+        con.commit()
+    except BaseException:
+        con.rollback()
+        (pasta / nome).unlink(missing_ok=True)
+        raise
+
+    return {"mes": mes, "arquivo": nome, "linhas": linhas, "origens": len(origens)}
+
+
+def _limpar_orfaos(con: sqlite3.Connection, pasta: Path) -> int:
+    """Apaga arquivos de coleta sem registro (arquivamento que caiu no meio) e .tmp esquecidos."""
+    if not pasta.exists():
+        return 0
+    registrados = {r[0] for r in con.execute("SELECT arquivo FROM particoes_arquivadas")}
+    apagados = 0
+    for p in pasta.glob(f"{PREFIXO}*"):
+        if p.is_file() and p.name not in registrados:
+            p.unlink()
+            apagados += 1
+    return apagados
+
+
+def arquivar_antigos(
+    con: sqlite3.Connection,
+    pasta: Path,
+    meses: int,
+    *,
+    codec: str = "auto",
+    hoje: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Arquiva, um mês por vez, as coletas anteriores ao mês atual menos
+    `meses`. meses <= 0 não faz nada. Retorna o que foi arquivado.
+    """
+    if meses <= 0:
+        return []
+    _limpar_orfaos(con, pasta)
+    limite = limite_arquivamento(meses, hoje)
+    return [
+        arquivar_mes(con, pasta, mes, menor_id, maior_id, codec=codec)
+        for mes, _, menor_id, maior_id in meses_para_arquivar(con, limite)
+    ]
+
+
+def listar_particoes(con: sqlite3.Connection) -> List[Dict[str, Any]]:
+    cur = con.execute(
+        "SELECT periodo_coleta, arquivo, linhas, menor_id, maior_id, arquivado_em FROM particoes_arquivadas ORDER BY periodo_coleta, id"
+    )
+    colunas = [d[0] for d in cur.description]
+    return [dict(zip(colunas, r)) for r in cur]
+
+
+# =========================
+# Consulta histórica
+# =========================
+
+def _aberto(pasta: Path, arquivo: str) -> Path:
+    """Caminho do .db descomprimido (arquivo/abertos/); descomprime na primeira vez."""
+    destino = pasta / PASTA_ABERTOS / (arquivo.split(".db")[0] + ".db")
+    if not destino.exists():
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        _descomprimir(pasta / arquivo, destino)
+    return destino
+
+
+def _particoes_no_intervalo(con: sqlite3.Connection, de: Optional[str], ate: Optional[str]) -> List[Tuple[int, str, str]]:
+    return con.execute(
+        """
+        SELECT id, periodo_coleta, arquivo FROM particoes_arquivadas
+        WHERE (? IS NULL OR periodo_coleta >= ?) AND (? IS NULL OR periodo_coleta <= ?)
+        ORDER BY periodo_coleta, id
+        """,
+        (de, de, ate, ate),
+    ).fetchall()
+
+
+def abrir_historico(
+    con: sqlite3.Connection,
+    pasta: Path,
+    *,
+    de: Optional[str] = None,
+    ate: Optional[str] = None,
+) -> List[str]:
+    """
+    Anexa os meses arquivados entre `de` e `ate` ("AAAA-MM", inclusivos) e
+    cria a view temporária pendencias_historico (mesmas colunas de
+    pendencias_raw; cnpj/cgf/razao pelo contribuintes do banco quente).
+    Retorna os nomes dos bancos anexados. Fechar com fechar_historico.
+    """
+    fechar_historico(con)
+    particoes = _particoes_no_intervalo(con, de, ate)
+
+    anexados = sum(1 for r in con.execute("PRAGMA database_list") if r[1] not in ("main", "temp"))
+    livres = con.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - anexados
+    if len(particoes) > livres:
+        raise ValueError(
+            f"{len(particoes)} meses arquivados no intervalo, mas o SQLite anexa no máximo {livres} "
+            "bancos de uma vez: use um intervalo menor (de/ate) ou exportar_historico"
+        )
+
+    con.commit()
+    colunas = _colunas(con, "pendencias_raw")
+    partes = [f"SELECT {colunas} FROM main.pendencias_raw"]
+    nomes: List[str] = []
+    for id_particao, _, arquivo in particoes:
+        nome = f"arq_{id_particao}"
+        con.execute("ATTACH DATABASE ? AS " + nome, (str(_aberto(pasta, arquivo)),))
+        partes.append(f"SELECT {colunas} FROM {nome}.pendencias_raw")
+        nomes.append(nome)
+
+    con.execute(f"CREATE TEMP VIEW {VIEW_HISTORICO} AS\n" + "\nUNION ALL\n".join(partes))
+    return nomes
+
+
+def fechar_historico(con: sqlite3.Connection) -> None:
+    con.execute(f"DROP VIEW IF EXISTS temp.{VIEW_HISTORICO}")
+    for _, nome, _ in con.execute("PRAGMA database_list").fetchall():
+        if nome.startswith("arq_"):
+            con.execute(f"DETACH DATABASE {nome}")
+
+
+COLUNAS_HISTORICO = [
+    "id", "cnpj", "cgf", "razao", "tipo_pendencia", "periodo", "valor",
+    "detalhe", "data_referencia", "arquivo_origem", "aba_origem",
+    "linha_origem", "data_coleta",
+]
+
+
+def exportar_historico(
+    con: sqlite3.Connection,
+    pasta: Path,
+    saida: Path,
+    *,
+    de: Optional[str] = None,
+    ate: Optional[str] = None,
+) -> int:
+    """
+    CSV com as linhas classificadas coletadas entre `de` e `ate`, do banco
+    quente e dos arquivos. Um arquivo anexado por vez (sem o limite de
+    ATTACH de abrir_historico). Retorna o nº de linhas.
+    """
+    do_contribuinte = {"cnpj", "cgf", "razao"}
+    select = ", ".join(("c." if col in do_contribuinte else "r.") + col for col in COLUNAS_HISTORICO)
+    filtro = """
+    COALESCE(r.tipo_pendencia,'') <> ''
+      AND (? IS NULL OR substr(r.data_coleta,1,7) >= ?)
+      AND (? IS NULL OR substr(r.data_coleta,1,7) <= ?)
+    """
+    params = (de, de, ate, ate)
+
+    def linhas(banco: str):
+        return con.execute(
+            f"""
+            SELECT {select}
+            FROM {banco}.pendencias_raw r
+            LEFT JOIN main.contribuintes c ON c.id = r.contribuinte_id
+            WHERE {filtro}
+            ORDER BY r.id
+            """,
+            params,
+        )
+
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    tmp = saida.with_name(saida.name + ".tmp")
+    total = 0
+    con.commit()
+    try:
+        with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(COLUNAS_HISTORICO)
+            for _, _, arquivo in _particoes_no_intervalo(con, de, ate):
+                con.execute("ATTACH DATABASE ? AS arq_exportar", (str(_aberto(pasta, arquivo)),))
+                try:
+                    for linha in linhas("arq_exportar"):
+                        w.writerow(linha)
+                        total += 1
+                finally:
+                    con.execute("DETACH DATABASE arq_exportar")
+            for linha in linhas("main"):
+                w.writerow(linha)
+                total += 1
+        tmp.replace(saida)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return total
+
+
+def main() -> None:
+    """
+    python -m app.particoes listar
+    python -m app.particoes arquivar [--meses N] [--vacuum]
+    python -m app.particoes historico [--de AAAA-MM] [--ate AAAA-MM] --saida historico.csv
+    """
+    from .config import ARQUIVAR_APOS_MESES, CODEC_RAW, DB_PATH, PASTA_ARQUIVO
+    from .banco import conectar, iniciar
+    from .trava import trava_pipeline
+
+    p = argparse.ArgumentParser(prog="python -m app.particoes")
+    sub = p.add_subparsers(dest="acao", required=True)
+    sub.add_parser("listar")
+    p_arq = sub.add_parser("arquivar")
+    p_arq.add_argument("--meses", type=int, default=ARQUIVAR_APOS_MESES,
+                       help="mantém no banco o mês atual e os N anteriores (padrão: ARQUIVAR_APOS_MESES)")
+    p_arq.add_argument("--vacuum", action="store_true", help="devolve ao disco o espaço liberado")
+    p_hist = sub.add_parser("historico")
+    p_hist.add_argument("--de")
+    p_hist.add_argument("--ate")
+    p_hist.add_argument("--saida", type=Path, required=True)
+    args = p.parse_args()
+
+    con = conectar(str(DB_PATH))
+    try:
+        iniciar(con)
+        if args.acao == "listar":
+            for r in listar_particoes(con):
+                print(f"{r['periodo_coleta']}  {r['linhas']:>10} linhas  {r['arquivo']}  ({r['arquivado_em']})")
+        elif args.acao == "arquivar":
+            if args.meses <= 0:
+                print("uso: --meses N (ou ARQUIVAR_APOS_MESES) maior que zero")
+                return
+            with trava_pipeline(ao_esperar=lambda: print("⏳ Outro pipeline está rodando, aguardando...")):
+                feitos = arquivar_antigos(con, PASTA_ARQUIVO, args.meses, codec=CODEC_RAW)
+                for r in feitos:
+                    print(f"🗄️ {r['mes']}: {r['linhas']} linhas -> {r['arquivo']}")
+                print(f"🗄️ Meses arquivados: {len(feitos)}")
+                if args.vacuum and feitos:
+                    con.execute("VACUUM")
+        else:
+            n = exportar_historico(con, PASTA_ARQUIVO, args.saida, de=args.de, ate=args.ate)
+            print(f"📄 Histórico: {n} linhas em {args.saida}")
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
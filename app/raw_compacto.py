@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+# =========================
+# RAW compacto (auditoria)
+# =========================
+#
+# Antes cada linha de pendencias_raw levava o próprio raw_json:
+#   {"aba": ..., "row": {"CNPJ": ..., "Razão Social": ..., ...}}
+# repetindo todos os nomes de coluna em toda linha.
+#
+# Agora:
+#   raw_cabecalho: uma linha por (arquivo, aba, colunas)
+#   raw_bloco:     um lote de linhas da planilha -> [[linha_origem, [valores]], ...]
+#                  em JSON sem espaços, comprimido (zlib; zstd se o pacote
+#                  zstandard estiver instalado e for pedido)
+# e pendencias_raw.raw_json fica NULL nas linhas novas.
+#
+# obter_linha_raw(con, arquivo, aba, linha) devolve o mesmo dict que
+# json.loads(raw_json) devolvia (linhas antigas continuam lendo raw_json).
+
+CODECS = ("auto", "zlib", "zstd")
+
+# (aba, colunas, linha_ini, linha_fim, codec, dados)
+Bloco = Tuple[str, List[str], int, int, str, bytes]
+
+
+def iniciar_raw_compacto(con: sqlite3.Connection) -> None:
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS raw_cabecalho (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      arquivo_origem TEXT NOT NULL,
+      aba_origem TEXT NOT NULL,
+      colunas_json TEXT NOT NULL,
+      UNIQUE(arquivo_origem, aba_origem, colunas_json)
+    );
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS raw_bloco (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      cabecalho_id INTEGER NOT NULL REFERENCES raw_cabecalho(id),
+      linha_ini INTEGER NOT NULL,
+      linha_fim INTEGER NOT NULL,
+      codec TEXT NOT NULL,
+      dados BLOB NOT NULL
+    );
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_bloco_linhas ON raw_bloco(cabecalho_id, linha_ini);")
+    con.commit()
+
+
+# -------------------------
+# compressão
+# -------------------------
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def resolver_codec(codec: str) -> str:
+    if codec not in CODECS:
+        raise ValueError(f"Codec inválido: {codec} (use {', '.join(CODECS)})")
+    if codec == "zlib":
+        return "zlib"
+    if _zstd() is not None:
+        return "zstd"
+    if codec == "zstd":
+        raise RuntimeError("codec zstd pedido mas o pacote zstandard não está instalado")
+    return "zlib"
+
+
+def _comprimir(dados: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=6).compress(dados)
+    return zlib.compress(dados, 6)
+
+
+def _descomprimir(dados: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        z = _zstd()
+        if z is None:
+            raise RuntimeError("bloco gravado com zstd, mas o pacote zstandard não está instalado")
+        return z.ZstdDecompressor().decompress(dados)
+    return zlib.decompress(dados)
+
+
+def montar_bloco(
+    aba: str,
+    colunas: Sequence[Any],
+    linhas: Sequence[Tuple[int, Sequence[Any]]],
+    codec: str,
+) -> Bloco:
+    """
+    linhas: [(linha_origem, valores na ordem de `colunas`)].
+    Roda no leitor (inclusive nos processos do pool), não precisa de banco.
+    """
+    codec = resolver_codec(codec)
+    payload = json.dumps(
+        [[linha, list(valores)] for linha, valores in linhas],
+        ensure_ascii=False, default=str, separators=(",", ":"),
+    ).encode("utf-8")
+    return (
+        aba,
+        [str(c) for c in colunas],
+        min(linha for linha, _ in linhas),
+        max(linha for linha, _ in linhas),
+        codec,
+        _comprimir(payload, codec),
+    )
+
+
+# -------------------------
+# gravação / leitura
+# -------------------------
+
+def _id_cabecalho(con: sqlite3.Connection, arquivo: str, aba: str, colunas: List[str]) -> int:
+    colunas_json = json.dumps(colunas, ensure_ascii=False)
+    con.execute(
+        "INSERT OR IGNORE INTO raw_cabecalho(arquivo_origem, aba_origem, colunas_json) VALUES (?,?,?)",
+        (arquivo, aba, colunas_json),
+    )
+    return con.execute(
+        "SELECT id FROM raw_cabecalho WHERE arquivo_origem=? AND aba_origem=? AND colunas_json=?",
+        (arquivo, aba, colunas_json),
+    ).fetchone()[0]
+
+
+def gravar_bloco(con: sqlite3.Connection, arquivo: str, bloco: Bloco) -> None:
+    """Sem commit (entra na transação de quem chama)."""
+    aba, colunas, linha_ini, linha_fim, codec, dados = bloco
+    con.execute(
+        "INSERT INTO raw_bloco(cabecalho_id, linha_ini, linha_fim, codec, dados) VALUES (?,?,?,?,?)",
+        (_id_cabecalho(con, arquivo, aba, colunas), linha_ini, linha_fim, codec, sqlite3.Binary(dados)),
+    )
+
+
+def obter_linha_raw(
+    con: sqlite3.Connection,
+    arquivo: str,
+    aba: str,
+    linha: int,
+) -> Optional[Dict[str, Any]]:
+    """
+    {"aba": aba, "row": {coluna: valor}} da linha original, ou None.
+    Arquivo com o mesmo nome importado mais de uma vez: vale a importação
+    mais recente.
+    """
+    row = con.execute(
+        """
+        SELECT c.colunas_json, b.codec, b.dados
+        FROM raw_bloco b
+        JOIN raw_cabecalho c ON c.id = b.cabecalho_id
+        WHERE c.arquivo_origem=? AND c.aba_origem=? AND b.linha_ini<=? AND b.linha_fim>=?
+        ORDER BY b.id DESC
+        """,
+        (arquivo, aba, linha, linha),
+    ).fetchone()
+
+    if row is not None:
+        colunas = json.loads(row[0])
+        for n, valores in json.loads(_descomprimir(row[2], row[1])):
+            if n == linha:
+                return {"aba": aba, "row": dict(zip(colunas, valores))}
+
+    # linhas gravadas antes do RAW compacto
+    antigo = con.execute(
+        """
+        SELECT raw_json FROM pendencias_raw
+        WHERE arquivo_origem=? AND aba_origem=? AND linha_origem=? AND raw_json IS NOT NULL
+        ORDER BY id DESC LIMIT 1
+        """,
+        (arquivo, aba, linha),
+    ).fetchone()
+    return json.loads(antigo[0]) if antigo else None
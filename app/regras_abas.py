@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+
+# =========================
+# Regras das abas do download da SEFAZ
+# =========================
+#
+# Uma regra por aba. O normalizar.py compila a regra uma vez por
+# cabeçalho (normalizar.compilar_aba) e o importar.py só lê as abas
+# listadas aqui: aba nova da SEFAZ = regra nova nesta lista.
+#
+#   aba              nome exato da aba no arquivo
+#   reconhece        trechos do nome (em minúsculas) que identificam a aba;
+#                    vale a primeira regra da lista que casar
+#   tipo             tipo_pendencia gravado
+#   campos           nome -> cabeçalhos aceitos, em ordem (vale o primeiro
+#                    não vazio, como row.get(a) or row.get(b))
+#   numeros          campos convertidos com numero(); os demais com texto()
+#   exige            {campo: trecho}: a linha só vale se o texto do campo,
+#                    em maiúsculas, contém o trecho
+#   marcas           {campo: rótulo}: a linha só vale se algum desses campos
+#                    for SIM; o detalhe vira os rótulos marcados, com "; "
+#   periodo          campo convertido com periodo_from_data
+#   data_referencia  campo (texto)
+#   valor            campos numéricos candidatos; vale o primeiro não None
+#   detalhe          modelo str.format com os campos (número como str():
+#                    vazio vira "None")
+#   aparar           caracteres tirados das pontas do detalhe
+#   item             campos que, junto com tipo + cnpj/cgf + periodo,
+#                    identificam a pendência de uma coleta para outra
+#                    (eventos.py); juntados com "|". Sem `item`: vazio (numa
+#                    regra com `marcas`, uma pendência por contribuinte; os
+#                    rótulos são comparados como valor, não entram na chave)
+#
+# Linha que não passa em `exige`/`marcas`, ou de aba sem regra, sai com
+# tipo vazio e não entra no resumo/detalhes.
+
+# comuns a todas as abas
+CAMPOS_CONTRIBUINTE: Dict[str, tuple] = {
+    "cnpj": ("CNPJ RAIZ", "CNPJ"),
+    "cgf": ("CGF",),
+    "razao": ("RAZÃO", "RAZAO"),
+}
+
+_REFERENCIA = ("MÊS ANO REFERÊNCIA", "MES ANO REFERENCIA")
+_DESCRICAO = ("DESCRIÇÃO DO INDICADOR", "DESCRICAO DO INDICADOR")
+_NUM_DOC = ("NÚMERO DO DOCUMENTO FISCAL", "NUMERO DO DOCUMENTO FISCAL")
+_DIFERENCA = ("DIFERENÇA", "DIFERENCA")
+
+# CFe e CTe têm o mesmo layout
+_CAMPOS_DFE = {
+    "referencia": _REFERENCIA,
+    "chave": ("CHAVE DFE", "CHAVE"),
+    "desc": _DESCRICAO,
+    "val_dfe": ("VALOR DO DFE", "VALOR"),
+    "dif": _DIFERENCA,
+}
+
+REGRAS: List[Dict[str, Any]] = [
+    {
+        "aba": "Omissões de EFD",
+        "reconhece": ("omissões de efd", "omissoes de efd"),
+        "tipo": "EFD_OMISSAO",
+        "campos": {
+            "documento": ("DOCUMENTO",),
+            "entrega": ("ENTREGA_EFD",),
+            "ano_mes": ("ANO_MES",),
+        },
+        "exige": {"entrega": "OMISS"},
+        "periodo": "ano_mes",
+        "detalhe": "DOCUMENTO={documento}; ENTREGA_EFD={entrega}; ANO_MES={ano_mes}",
+        "item": ("documento",),
+    },
+    {
+        "aba": "Débitos",
+        "reconhece": ("débitos", "debitos"),
+        "tipo": "DEBITO",
+        "campos": {
+            "referencia": ("PERIODO DE REFERENCIA",),
+            "vencimento": ("DATA VENCIMENTO",),
+            "total": ("VALOR TOTAL",),
+            "cod": ("CÓDIGO DE RECEITA DO DÉBITO", "CODIGO DE RECEITA DO DEBITO"),
+            "dias": ("DIAS DE ATRASO DO DÉBITO NÃO PAGO", "DIAS DE ATRASO DO DEBITO NAO PAGO"),
+        },
+        "numeros": ("total",),
+        "periodo": "referencia",
+        "data_referencia": "vencimento",
+        "valor": ("total",),
+        "detalhe": "COD_RECEITA={cod}; VENC={vencimento}; DIAS_ATRASO={dias}; TOTAL={total}",
+        "item": ("cod",),
+    },
+    {
+        "aba": "Omissões e divergências de NFE",
+        "reconhece": ("omissões e divergências de nfe", "omissoes e divergencias de nfe"),
+        "tipo": "NFE_DIVERGENCIA",
+        "campos": {
+            "referencia": _REFERENCIA,
+            "chave": ("CHAVE DFE",),
+            "num_doc": _NUM_DOC,
+            "origem": ("ORIGEM DO DOCUMENTO",),
+            "desc": _DESCRICAO,
+            "val_escr": ("VALOR ESCRITURADO",),
+            "val_dfe": ("VALOR DO DFE",),
+            "dif": _DIFERENCA,
+        },
+        "numeros": ("val_escr", "val_dfe", "dif"),
+        "periodo": "referencia",
+        "valor": ("dif", "val_dfe"),
+        "detalhe": (
+            "{desc} | CHAVE={chave} | NUM_DOC={num_doc} | ORIGEM={origem}"
+            " | ESCR={val_escr} | DFE={val_dfe} | DIF={dif}"
+        ),
+        "item": ("chave",),
+    },
+    {
+        "aba": "NFe inexistente declarada",
+        "reconhece": ("nfe inexistente declarada",),
+        "tipo": "NFE_INEXISTENTE",
+        "campos": {
+            "chave": ("CHAVE DFE",),
+            "divergente": ("VALOR DIVERGENTE",),
+        },
+        "numeros": ("divergente",),
+        "valor": ("divergente",),
+        "detalhe": "CHAVE={chave}; VALOR_DIVERGENTE={divergente}",
+        "item": ("chave",),
+    },
+    {
+        "aba": "Omissões e Divergências CFe",
+        "reconhece": ("cfe",),
+        "tipo": "CFE_DIVERGENCIA",
+        "campos": _CAMPOS_DFE,
+        "numeros": ("val_dfe", "dif"),
+        "periodo": "referencia",
+        "valor": ("dif", "val_dfe"),
+        "detalhe": "{desc} | CHAVE={chave}",
+        "aparar": " |",
+        "item": ("chave",),
+    },
+    {
+        "aba": "CTE escriturado com divergência",
+        "reconhece": ("cte",),
+        "tipo": "CTE_DIVERGENCIA",
+        "campos": _CAMPOS_DFE,
+        "numeros": ("val_dfe", "dif"),
+        "periodo": "referencia",
+        "valor": ("dif", "val_dfe"),
+        "detalhe": "{desc} | CHAVE={chave}",
+        "aparar": " |",
+        "item": ("chave",),
+    },
+    {
+        "aba": "NFe sem REG_PAS",
+        "reconhece": ("reg_pas", "reg pas"),
+        "tipo": "REGISTRO_PASSAGEM",
+        "campos": {
+            "referencia": _REFERENCIA,
+            "chave": ("CHAVE DFE", "CHAVE"),
+            "num_doc": _NUM_DOC,
+            "origem": ("ORIGEM DO DOCUMENTO",),
+            "val_dfe": ("VALOR DO DFE", "VALOR"),
+        },
+        "numeros": ("val_dfe",),
+        "periodo": "referencia",
+        "valor": ("val_dfe",),
+        "detalhe": "CHAVE={chave} | NUM_DOC={num_doc} | ORIGEM={origem}",
+        "aparar": " |",
+        "item": ("chave",),
+    },
+    {
+        "aba": "Outros limitadores",
+        "reconhece": ("outros limitadores",),
+        "tipo": "OUTROS_LIMITADORES",
+        "campos": {
+            "cadastral": ("PENDENCIA NA SITUAÇÃO CADASTRAL", "PENDENCIA NA SITUACAO CADASTRAL"),
+            "cadin": ("INSCRITO NO CADINE", "INSCRITO NO CADIN"),
+            "devedor": ("DEVEDOR CONTUMAZ",),
+            "inventario": ("INVENTÁRIO OMISSO", "INVENTARIO OMISSO"),
+        },
+        "marcas": {
+            "cadastral": "CADASTRAL=SIM",
+            "cadin": "CADIN=SIM",
+            "devedor": "DEVEDOR_CONTUMAZ=SIM",
+            "inventario": "INVENTARIO_OMISSO=SIM",
+        },
+    },
+]
@@ -1,48 +1,132 @@
+import sys
 import sqlite3
+from typing import Iterator, Optional
+
 import pandas as pd
 
+from .banco import divergencias_resumo, reconstruir_resumo
+
+# o resumo é chaveado por contribuinte_id: os textos entram só aqui, uma
+# busca por chave primária por linha, já na ordem de idx_resumo_ordem
+_SQL_RESUMO = """
+SELECT
+  c.cnpj,
+  c.cgf,
+  c.razao,
+  r.tipo_pendencia,
+  r.periodo,
+  r.qtd,
+  ROUND(r.valor_total, 2) AS valor_total,
+  r.ultima_coleta
+FROM resumo_pendencias r
+JOIN contribuintes c ON c.id = r.contribuinte_id
+ORDER BY r.ultima_coleta DESC, r.qtd DESC;
+"""
+
+
 def df_resumo_pendencias(con: sqlite3.Connection) -> pd.DataFrame:
     """
     cnpj | cgf | razao | tipo_pendencia | periodo | qtd | valor_total | ultima_coleta
+
+    Lê a tabela resumo_pendencias (mantida a cada importação, ver banco.atualizar_resumo).
     """
-    sql = """
-    SELECT
-      COALESCE(cnpj,'') AS cnpj,
-      COALESCE(cgf,'') AS cgf,
-      COALESCE(razao,'') AS razao,
-      COALESCE(tipo_pendencia,'') AS tipo_pendencia,
-      COALESCE(periodo,'') AS periodo,
-      COUNT(*) AS qtd,
-      ROUND(SUM(COALESCE(valor,0)), 2) AS valor_total,
-      MAX(data_coleta) AS ultima_coleta
-    FROM pendencias_raw
-    WHERE COALESCE(tipo_pendencia,'') <> ''
-    GROUP BY cnpj, cgf, razao, tipo_pendencia, periodo
-    ORDER BY ultima_coleta DESC, qtd DESC;
-    """
-    return pd.read_sql_query(sql, con)
+    return pd.read_sql_query(_SQL_RESUMO, con)
+
 
+_SQL_DETALHES = """
+SELECT
+  COALESCE(c.cnpj,'') AS cnpj,
+  COALESCE(c.cgf,'') AS cgf,
+  COALESCE(c.razao,'') AS razao,
+  COALESCE(r.tipo_pendencia,'') AS tipo_pendencia,
+  COALESCE(r.periodo,'') AS periodo,
+  CAST(COALESCE(r.valor,0) AS REAL) AS valor,
+  COALESCE(r.detalhe,'') AS detalhe,
+  COALESCE(r.data_referencia,'') AS data_referencia,
+  COALESCE(r.arquivo_origem,'') AS arquivo_origem,
+  COALESCE(r.aba_origem,'') AS aba_origem,
+  COALESCE(r.linha_origem,'') AS linha_origem,
+  COALESCE(r.data_coleta,'') AS ultima_coleta
+FROM pendencias_raw r
+LEFT JOIN contribuintes c ON c.id = r.contribuinte_id
+WHERE COALESCE(r.tipo_pendencia,'') <> ''
+ORDER BY r.data_coleta DESC, arquivo_origem, aba_origem, linha_origem
+LIMIT ?
+"""
 
-def df_detalhes(con: sqlite3.Connection) -> pd.DataFrame:
+
+def df_detalhes(con: sqlite3.Connection, limite: Optional[int] = None) -> pd.DataFrame:
     """
     Todas as linhas classificadas, linha por linha (para conferência)
     """
-    sql = """
-    SELECT
-      COALESCE(cnpj,'') AS cnpj,
-      COALESCE(cgf,'') AS cgf,
-      COALESCE(razao,'') AS razao,
-      COALESCE(tipo_pendencia,'') AS tipo_pendencia,
-      COALESCE(periodo,'') AS periodo,
-      COALESCE(valor,0) AS valor,
-      COALESCE(detalhe,'') AS detalhe,
-      COALESCE(data_referencia,'') AS data_referencia,
-      COALESCE(arquivo_origem,'') AS arquivo_origem,
-      COALESCE(aba_origem,'') AS aba_origem,
-      COALESCE(linha_origem,'') AS linha_origem,
-      COALESCE(data_coleta,'') AS ultima_coleta
-    FROM pendencias_raw
-    WHERE COALESCE(tipo_pendencia,'') <> ''
-    ORDER BY data_coleta DESC, arquivo_origem, aba_origem, linha_origem;
-    """
-    return pd.read_sql_query(sql, con)
+    return pd.read_sql_query(_SQL_DETALHES, con, params=(-1 if limite is None else limite,))
+
+
+def iterar_detalhes(
+    con: sqlite3.Connection,
+    limite: Optional[int] = None,
+    tamanho_lote: int = 20000,
+) -> Iterator[pd.DataFrame]:
+    """
+    Mesmas linhas de df_detalhes, em lotes de `tamanho_lote`, com o LIMIT
+    aplicado no SQL. Sempre gera pelo menos um lote (vazio, com as colunas).
+    """
+    cur = con.execute(_SQL_DETALHES, (-1 if limite is None else limite,))
+    try:
+        colunas = [d[0] for d in cur.description]
+        primeiro = True
+        while True:
+            linhas = cur.fetchmany(tamanho_lote)
+            if not linhas and not primeiro:
+                break
+            primeiro = False
+            yield pd.DataFrame.from_records(linhas, columns=colunas)
+            if not linhas:
+                break
+    finally:
+        # também quando o exportador para no meio (erro ou gerador fechado)
+        cur.close()
+
+
+_SQL_CONTAR_DETALHES = "SELECT COUNT(*) FROM pendencias_raw WHERE COALESCE(tipo_pendencia,'') <> ''"
+
+
+def contar_detalhes(con: sqlite3.Connection) -> int:
+    return con.execute(_SQL_CONTAR_DETALHES).fetchone()[0]
+
+
+def main() -> None:
+    """
+    python -m app.resumo rebuild
+      confere o resumo materializado contra o GROUP BY completo e recalcula do zero
+    """
+    from .config import DB_PATH
+    from .banco import conectar, iniciar
+    from .trava import trava_pipeline
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("uso: python -m app.resumo rebuild")
+        sys.exit(2)
+
+    # reescreve resumo_pendencias e muda a versao_dados: mesma trava do pipeline
+    with trava_pipeline(ao_esperar=lambda: print("⏳ Outro pipeline está rodando, aguardando...")):
+        con = conectar(str(DB_PATH))
+        try:
+            iniciar(con)
+
+            antes = divergencias_resumo(con)
+            print(f"🔎 Linhas divergentes antes: {antes}")
+
+            reconstruir_resumo(con)
+            con.commit()
+
+            depois = divergencias_resumo(con)
+            total = con.execute("SELECT COUNT(*) FROM resumo_pendencias").fetchone()[0]
+        finally:
+            con.close()
+
+    print(f"✅ resumo_pendencias reconstruído: {total} grupos | divergentes depois: {depois}")
+
+
+if __name__ == "__main__":
+    main()
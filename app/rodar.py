@@ -1,23 +1,105 @@
 from __future__ import annotations
 
+import sqlite3
+import sys
 from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
 
 from .config import (
     PASTA_ENTRADA, PASTA_PROCESSADOS, PASTA_ERROS,
-    DB_PATH,
+    DB_PATH, CACHE_HASH_PATH,
     GESTAO_SPREADSHEET_ID,
     CREDENTIALS_FILE, SCOPES,
-    ABA_RESUMO_PENDENCIAS, ABA_DETALHES, ABA_STATUS,
-    MAX_LINHAS_EXPORT, MAX_LINHAS_DETALHES,
+    ABA_RESUMO_PENDENCIAS, ABA_DETALHES, ABA_EVENTOS, ABA_STATUS,
+    MAX_LINHAS_EXPORT, MAX_LINHAS_DETALHES, MAX_LINHAS_EVENTOS,
+    ESTADO_EXPORT_PATH, SHEETS_REQ_POR_MINUTO, SHEETS_CELULAS_POR_BLOCO,
+    ESTADO_SAIDAS_PATH, FORCAR_SAIDAS,
+    DESTINOS_EXPORT, PASTA_SAIDA, ARQUIVO_XLSX,
+    SNAPSHOT_DIR, SNAPSHOT_ATIVO,
+    ARQUIVAR_APOS_MESES, PASTA_ARQUIVO,
+    MOTOR_EXCEL, TAMANHO_LOTE, IMPORT_WORKERS, CODEC_RAW,
 )
 
-from .importar import importar_pasta
-from .banco import conectar, iniciar
-from .resumo import df_resumo_pendencias, df_detalhes
-from .exportar import exportar_para_sheets
+from .importar import importar_arquivos, importar_pasta
+from .banco import conectar, iniciar, versao_dados
+from .migracoes import migrar
+from .resumo import contar_detalhes, df_resumo_pendencias, iterar_detalhes
+from .destinos import Destino
+from .eventos import iterar_eventos
+from .exportar import DestinoSheets, carregar_estado, salvar_estado
+from .exportar_local import DestinoCsv, DestinoXlsx
+from .particoes import arquivar_antigos
+from .snapshot import atualizar_snapshot, pyarrow_disponivel
+from .telemetria import Telemetria
+from .trava import trava_pipeline
+
+# progresso(etapa, contagens): etapas "aguardando_trava", "importando",
+# "resumindo", "exportando", "concluido"
+Progresso = Callable[[str, Dict[str, Any]], None]
+
+
+def main(progresso: Optional[Progresso] = None, forcar: bool = False) -> Dict[str, Any]:
+    """
+    Importa, resume e exporta. Roda sob a trava do pipeline (um por vez,
+    mesmo entre processos). Retorna as contagens da execução.
+    forcar: exporta mesmo sem dados novos (ver atualizar_saidas).
+    """
+    avisar = progresso or _nao_avisar
+
+    with trava_pipeline(ao_esperar=lambda: avisar("aguardando_trava", {})):
+        tel = Telemetria()
+        try:
+            resumo_import = importar_entrada(avisar, telemetria=tel)
+            return atualizar_saidas(resumo_import, avisar, telemetria=tel, forcar=forcar)
+        finally:
+            _registrar_telemetria(tel)
+
+
+def _nao_avisar(etapa: str, contagens: Dict[str, Any]) -> None:
+    pass
 
 
-def main() -> None:
+def _registrar_telemetria(tel: Telemetria) -> None:
+    """Fecha a telemetria, imprime e grava em run_log (falha aqui não derruba o pipeline)."""
+    tel.encerrar()
+    tel.imprimir()
+    try:
+        con = conectar(str(DB_PATH))
+        try:
+            migrar(con)
+            tel.salvar(con)
+        finally:
+            con.close()
+    except Exception as e:
+        print("⚠️ Não foi possível gravar a telemetria em run_log:", e)
+
+
+# As duas metades abaixo NÃO pegam a trava: quem chama (main, vigiar) pega.
+
+def importar_entrada(
+    avisar: Optional[Progresso] = None,
+    arquivos: Optional[List[Path]] = None,
+    telemetria: Optional[Telemetria] = None,
+) -> Dict[str, Any]:
+    """
+    Etapa 1: importa a pasta de entrada inteira ou só `arquivos`.
+    Retorna o dict de importar_pasta.
+    Sem `telemetria`, mede e grava em run_log como uma execução à parte.
+    """
+    avisar = avisar or _nao_avisar
+    tel = telemetria or Telemetria()
+    try:
+        return _importar_entrada(avisar, arquivos, tel)
+    finally:
+        if telemetria is None:
+            _registrar_telemetria(tel)
+
+
+def _importar_entrada(avisar: Progresso, arquivos: Optional[List[Path]], tel: Telemetria) -> Dict[str, Any]:
     PASTA_ENTRADA.mkdir(parents=True, exist_ok=True)
     PASTA_PROCESSADOS.mkdir(parents=True, exist_ok=True)
     PASTA_ERROS.mkdir(parents=True, exist_ok=True)
@@ -27,14 +109,177 @@ def main() -> None:
     print(f"📥 Entrada: {PASTA_ENTRADA}")
     print(f"🗄️ Banco:  {DB_PATH}")
 
-    resumo_import = importar_pasta(PASTA_ENTRADA, PASTA_PROCESSADOS, PASTA_ERROS, DB_PATH)
+    avisar("importando", {})
+    opcoes: Dict[str, Any] = dict(
+        motor_excel=MOTOR_EXCEL,
+        tamanho_lote=TAMANHO_LOTE,
+        workers=IMPORT_WORKERS,
+        progresso=lambda c: avisar("importando", c),
+        cache_hash_path=CACHE_HASH_PATH,
+        codec_raw=CODEC_RAW,
+        telemetria=tel,
+    )
+    if arquivos is None:
+        resumo_import = importar_pasta(PASTA_ENTRADA, PASTA_PROCESSADOS, PASTA_ERROS, DB_PATH, **opcoes)
+    else:
+        resumo_import = importar_arquivos(arquivos, PASTA_PROCESSADOS, PASTA_ERROS, DB_PATH, **opcoes)
     print("✅ Importação concluída:", resumo_import)
+    return resumo_import
+
+
+def _fonte_detalhes(limite: Optional[int] = MAX_LINHAS_DETALHES) -> Iterator[pd.DataFrame]:
+    """Detalhes em lotes, direto do banco (LIMIT no SQL); o Sheets lê duas vezes."""
+    con = conectar(str(DB_PATH))
+    try:
+        yield from iterar_detalhes(con, limite=limite)
+    finally:
+        con.close()
+
+
+def _fonte_eventos(limite: Optional[int] = MAX_LINHAS_EVENTOS) -> Iterator[pd.DataFrame]:
+    """Eventos entre coletas em lotes, mais recentes primeiro (LIMIT no SQL)."""
+    con = conectar(str(DB_PATH))
+    try:
+        yield from iterar_eventos(con, limite=limite)
+    finally:
+        con.close()
+
+
+def _criar_destinos() -> List[Destino]:
+    """Destinos de DESTINOS_EXPORT, na ordem (o Sheets é pulado sem ID configurado)."""
+    abas = dict(
+        aba_resumo_pendencias=ABA_RESUMO_PENDENCIAS,
+        aba_detalhes=ABA_DETALHES,
+        aba_eventos=ABA_EVENTOS,
+        aba_status=ABA_STATUS,
+    )
+    destinos: List[Destino] = []
+    for nome in DESTINOS_EXPORT:
+        if nome == "sheets":
+            if not GESTAO_SPREADSHEET_ID or "COLE_AQUI" in GESTAO_SPREADSHEET_ID:
+                print("⚠️ Configure o GESTAO_SPREADSHEET_ID em app/config.py")
+                continue
+            destinos.append(DestinoSheets(
+                GESTAO_SPREADSHEET_ID,
+                CREDENTIALS_FILE,
+                SCOPES,
+                **abas,
+                max_linhas_resumo=MAX_LINHAS_EXPORT,
+                max_linhas_detalhes=MAX_LINHAS_DETALHES,
+                max_linhas_eventos=MAX_LINHAS_EVENTOS,
+                estado_path=ESTADO_EXPORT_PATH,
+                req_por_minuto=SHEETS_REQ_POR_MINUTO,
+                celulas_por_bloco=SHEETS_CELULAS_POR_BLOCO,
+            ))
+        elif nome == "xlsx":
+            destinos.append(DestinoXlsx(ARQUIVO_XLSX, **abas))
+        elif nome == "csv":
+            destinos.append(DestinoCsv(PASTA_SAIDA, **abas))
+        else:
+            print(f"⚠️ Destino de exportação desconhecido em DESTINOS_EXPORT: {nome!r}")
+    return destinos
+
+
+def atualizar_saidas(
+    resumo_import: Dict[str, Any],
+    avisar: Optional[Progresso] = None,
+    telemetria: Optional[Telemetria] = None,
+    forcar: bool = False,
+) -> Dict[str, Any]:
+    """
+    Etapa 2: lê resumo/detalhes do banco e exporta para cada destino de
+    DESTINOS_EXPORT (Sheets, XLSX, CSV).
+    Destino que já tem a versão atual dos dados (nada importado desde a
+    última exportação) só recebe o STATUS; `forcar` (ou FORCAR_SAIDAS)
+    exporta tudo de novo.
+    Retorna as contagens da execução.
+    Sem `telemetria`, mede e grava em run_log como uma execução à parte.
+    """
+    avisar = avisar or _nao_avisar
+    tel = telemetria or Telemetria()
+    try:
+        return _atualizar_saidas(resumo_import, avisar, tel, forcar or FORCAR_SAIDAS)
+    finally:
+        if telemetria is None:
+            _registrar_telemetria(tel)
+
+
+# =========================
+# Execução sem dados novos
+# =========================
+#
+# A maioria das execuções agendadas não encontra arquivo novo. A versão
+# dos dados (banco.versao_dados: schema + último import_log + arquivo +
+# reconstrução do resumo) diz se algo mudou desde a última vez;
+# ESTADO_SAIDAS_PATH guarda
+#   {"resumo":   {"versao", "linhas_resumo", "linhas_detalhes"},
+#    "destinos": {destino.alvo(): versão exportada}}
+# Versão igual: nem o resumo é lido (o STATUS usa as contagens guardadas)
+# e cada destino em dia só reescreve o STATUS. Destino que falhou, é novo,
+# mudou de alvo ou perdeu o arquivo exporta normalmente.
+
+SEM_MUDANCA = "sem_mudanca"
+
+
+def _arquivar_coletas(con: sqlite3.Connection, tel: Telemetria) -> None:
+    # meses antigos saem de pendencias_raw (o resumo não muda; a versão dos
+    # dados sim, então os destinos exportam de novo sem essas linhas)
+    try:
+        with tel.etapa("arquivamento") as m:
+            feitos = arquivar_antigos(con, PASTA_ARQUIVO, ARQUIVAR_APOS_MESES, codec=CODEC_RAW)
+            m.linhas = sum(r["linhas"] for r in feitos)
+        for r in feitos:
+            print(f"🗄️ Coleta {r['mes']} arquivada: {r['linhas']} linhas -> {r['arquivo']}")
+    except Exception as e:
+        print("⚠️ Arquivamento de coletas antigas falhou (pipeline continua).")
+        print("ERRO:", e)
+
+
+def _destino_em_dia(destino: Destino, estado: Dict[str, Any], versao: str) -> bool:
+    return estado.get("destinos", {}).get(destino.alvo()) == versao and destino.saida_existe()
+
+
+def _atualizar_saidas(resumo_import: Dict[str, Any], avisar: Progresso, tel: Telemetria, forcar: bool) -> Dict[str, Any]:
+    contagens: Dict[str, Any] = {
+        k: resumo_import[k]
+        for k in ("arquivos_total", "arquivos_importados", "linhas_lidas", "linhas_inseridas")
+    }
+    avisar("resumindo", contagens)
 
     con = conectar(str(DB_PATH))
     iniciar(con)
+    if ARQUIVAR_APOS_MESES > 0:
+        _arquivar_coletas(con, tel)
+    versao = versao_dados(con)
+
+    estado = carregar_estado(ESTADO_SAIDAS_PATH)
+    destinos = _criar_destinos()
+    a_exportar = [d for d in destinos if forcar or not _destino_em_dia(d, estado, versao)]
+    resumo_guardado = estado.get("resumo", {})
+    dados_novos = forcar or resumo_guardado.get("versao") != versao or "linhas_detalhes" not in resumo_guardado
+
+    df_res: Optional[pd.DataFrame] = None
+    if dados_novos or a_exportar:
+        with tel.etapa("resumo") as m:
+            df_res = df_resumo_pendencias(con)
+            n_detalhes = contar_detalhes(con)
+            m.linhas = len(df_res)
+        n_resumo = len(df_res)
+        estado["resumo"] = {"versao": versao, "linhas_resumo": n_resumo, "linhas_detalhes": n_detalhes}
+    else:
+        n_resumo = resumo_guardado["linhas_resumo"]
+        n_detalhes = resumo_guardado["linhas_detalhes"]
+        print(f"💤 Nada novo desde a última execução (dados na versão {versao}): só o STATUS é atualizado.")
 
-    df_res = df_resumo_pendencias(con)
-    df_det = df_detalhes(con)
+    if dados_novos and SNAPSHOT_ATIVO and pyarrow_disponivel():
+        try:
+            with tel.etapa("snapshot") as m:
+                snap = atualizar_snapshot(con, SNAPSHOT_DIR)
+                m.linhas = snap["linhas"]
+            print(f"📦 Snapshot Parquet: +{snap['linhas']} linhas em {len(snap['particoes'])} partições")
+        except Exception as e:
+            print("⚠️ Snapshot Parquet falhou (pipeline continua).")
+            print("ERRO:", e)
 
     con.close()
 
@@ -44,35 +289,53 @@ def main() -> None:
         f"Importados: {resumo_import['arquivos_importados']} | "
         f"Linhas lidas: {resumo_import['linhas_lidas']} | "
         f"Inseridas: {resumo_import['linhas_inseridas']} | "
-        f"Resumo: {len(df_res)} linhas | Detalhes: {len(df_det)} linhas"
+        f"Resumo: {n_resumo} linhas | Detalhes: {n_detalhes} linhas"
     )
+    if not a_exportar and destinos:
+        status += f" | Sem dados novos (versão {versao})"
 
-    if not GESTAO_SPREADSHEET_ID or "COLE_AQUI" in GESTAO_SPREADSHEET_ID:
-        print("⚠️ Configure o GESTAO_SPREADSHEET_ID em app/config.py")
-        print("STATUS:", status)
-        return
+    contagens.update({"linhas_resumo": n_resumo, "linhas_detalhes": n_detalhes, "exportado": False})
 
-    try:
-        exportar_para_sheets(
-            GESTAO_SPREADSHEET_ID,
-            CREDENTIALS_FILE,
-            SCOPES,
-            aba_resumo_pendencias=ABA_RESUMO_PENDENCIAS,
-            aba_detalhes=ABA_DETALHES,
-            aba_status=ABA_STATUS,
-            df_resumo=df_res,
-            df_detalhes=df_det,
-            texto_status=status,
-            max_linhas_resumo=MAX_LINHAS_EXPORT,
-            max_linhas_detalhes=MAX_LINHAS_DETALHES,
-        )
-        print("📤 Exportação concluída.")
-    except Exception as e:
-        print("⚠️ Exportação para Sheets falhou (pipeline continua).")
-        print("ERRO:", e)
+    if destinos:
+        avisar("exportando", contagens)
+
+    exportacoes: Dict[str, str] = {}
+    for destino in destinos:
+        try:
+            if destino in a_exportar:
+                destino.exportar(
+                    df_resumo=df_res,
+                    # cada destino com o seu corte (None = todas as linhas)
+                    df_detalhes=partial(_fonte_detalhes, destino.max_linhas_detalhes),
+                    df_eventos=partial(_fonte_eventos, destino.max_linhas_eventos),
+                    texto_status=status,
+                    telemetria=tel,
+                )
+                print(f"📤 Exportação para {destino.nome} concluída.")
+                exportacoes[destino.nome] = "ok"
+                estado.setdefault("destinos", {})[destino.alvo()] = versao
+            else:
+                destino.exportar_status(status, telemetria=tel)
+                exportacoes[destino.nome] = SEM_MUDANCA
+        except Exception as e:
+            print(f"⚠️ Exportação para {destino.nome} falhou (pipeline continua).")
+            print("ERRO:", e)
+            exportacoes[destino.nome] = str(e)
+            # exporta inteiro na próxima, mesmo sem dados novos
+            estado.get("destinos", {}).pop(destino.alvo(), None)
+
+    salvar_estado(ESTADO_SAIDAS_PATH, estado)
+
+    erros = {nome: r for nome, r in exportacoes.items() if r not in ("ok", SEM_MUDANCA)}
+    contagens["exportacoes"] = exportacoes
+    contagens["exportado"] = bool(exportacoes) and not erros
+    if erros:
+        contagens["erro_exportacao"] = "; ".join(f"{nome}: {e}" for nome, e in erros.items())
 
     print("STATUS:", status)
+    avisar("concluido", contagens)
+    return contagens
 
 
 if __name__ == "__main__":
-    main()
+    main(forcar="--forcar" in sys.argv[1:])
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import json
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+
+# =========================
+# Snapshot colunar (Parquet) de pendencias_raw
+# =========================
+#
+# Para análise fora do pipeline: em vez de puxar df_detalhes inteiro para o
+# pandas, lê-se só as colunas e partições necessárias.
+#
+#   banco/snapshot/periodo=2025-08/tipo_pendencia=DEBITO/lote-000000015189-0.parquet
+#
+# - incremental: cada execução grava só as linhas com id > último id
+#   exportado, em arquivos novos dentro das partições que essas linhas tocam
+# - periodo/tipo vazios viram a partição nula (__HIVE_DEFAULT_PARTITION__)
+#   e voltam como "" no carregar_snapshot
+# - o último id fica em _estado.json (arquivos com "_" não entram no dataset)
+# - se o pipeline cair entre gravar e salvar o estado, a próxima execução
+#   regrava os mesmos arquivos (mesmo nome) em vez de duplicar
+#
+# pyarrow é opcional: sem ele o pipeline só pula esta etapa.
+
+COLUNAS = [
+    "id", "cnpj", "cgf", "razao", "tipo_pendencia", "periodo", "valor",
+    "detalhe", "data_referencia", "arquivo_origem", "aba_origem",
+    "linha_origem", "data_coleta",
+]
+PARTICOES = ["periodo", "tipo_pendencia"]
+
+LINHAS_POR_LOTE = 200_000
+
+
+def pyarrow_disponivel() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _schema():
+    import pyarrow as pa
+    texto = pa.string()
+    return pa.schema([
+        ("id", pa.int64()),
+        ("cnpj", texto), ("cgf", texto), ("razao", texto),
+        ("tipo_pendencia", texto), ("periodo", texto),
+        ("valor", pa.float64()),
+        ("detalhe", texto), ("data_referencia", texto),
+        ("arquivo_origem", texto), ("aba_origem", texto),
+        ("linha_origem", pa.int64()),
+        ("data_coleta", texto),
+    ])
+
+
+def _particionamento():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([(c, pa.string()) for c in PARTICOES]), flavor="hive")
+
+
+def _ler_estado(pasta: Path) -> Dict[str, Any]:
+    try:
+        return json.loads((pasta / "_estado.json").read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _salvar_estado(pasta: Path, estado: Dict[str, Any]) -> None:
+    tmp = pasta / "_estado.json.tmp"
+    tmp.write_text(json.dumps(estado), encoding="utf-8")
+    tmp.replace(pasta / "_estado.json")
+
+
+# =========================
+# Exportação incremental
+# =========================
+
+def atualizar_snapshot(con: sqlite3.Connection, pasta: Path, *, linhas_por_lote: int = LINHAS_POR_LOTE) -> Dict[str, Any]:
+    """
+    Acrescenta ao dataset as linhas classificadas com id > último exportado.
+    Retorna {"linhas": n, "particoes": [...], "ultimo_id": id}.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    pasta.mkdir(parents=True, exist_ok=True)
+    estado = _ler_estado(pasta)
+    ultimo_id = int(estado.get("ultimo_id", 0))
+
+    # pelo sqlite_sequence: coleta arquivada (particoes.py) sai da tabela, mas o id não volta
+    max_id = con.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'pendencias_raw'").fetchone()[0]
+    if max_id < ultimo_id:
+        # banco recriado: o snapshot não corresponde mais, refaz do zero
+        _apagar_dataset(pasta)
+        ultimo_id = 0
+
+    # cnpj/cgf/razao vêm de contribuintes (pendencias_raw só tem o id)
+    do_contribuinte = {"cnpj", "cgf", "razao"}
+    sql = f"""
+    SELECT {", ".join(("c." if col in do_contribuinte else "r.") + col for col in COLUNAS)}
+    FROM pendencias_raw r
+    LEFT JOIN contribuintes c ON c.id = r.contribuinte_id
+    WHERE r.id > ? AND COALESCE(r.tipo_pendencia,'') <> ''
+    ORDER BY r.id
+    """
+
+    schema = _schema()
+    particoes = set()
+    total = 0
+    novo_ultimo = ultimo_id
+
+    for n, df in enumerate(pd.read_sql_query(sql, con, params=(ultimo_id,), chunksize=linhas_por_lote)):
+        if df.empty:
+            continue
+        for c in PARTICOES:
+            df[c] = df[c].where(df[c].fillna("") != "", None)
+
+        tabela = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        ds.write_dataset(
+            tabela,
+            pasta,
+            format="parquet",
+            partitioning=_particionamento(),
+            # nome fixo por (início, lote): reexecução sobrescreve, não duplica
+            basename_template=f"lote-{ultimo_id + 1:012d}-{n}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+        particoes.update(zip(df["periodo"].fillna(""), df["tipo_pendencia"].fillna("")))
+        total += len(df)
+        novo_ultimo = int(df["id"].iloc[-1])
+
+    _salvar_estado(pasta, {"ultimo_id": novo_ultimo})
+    return {"linhas": total, "particoes": sorted(particoes), "ultimo_id": novo_ultimo}
+
+
+def _apagar_dataset(pasta: Path) -> None:
+    for p in pasta.iterdir():
+        if p.is_dir():
+            shutil.rmtree(p)
+        elif p.suffix == ".parquet" or p.name.startswith("_estado"):
+            p.unlink()
+
+
+def reconstruir_snapshot(con: sqlite3.Connection, pasta: Path) -> Dict[str, Any]:
+    if pasta.exists():
+        _apagar_dataset(pasta)
+    return atualizar_snapshot(con, pasta)
+
+
+def compactar_snapshot(pasta: Path, *, max_arquivos: int = 8) -> int:
+    """
+    Junta os arquivos de cada partição que acumulou mais de `max_arquivos`
+    (cada importação acrescenta um). Retorna quantas partições foram compactadas.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    compactadas = 0
+    for dir_part in sorted({p.parent for p in pasta.rglob("*.parquet")}):
+        arquivos = sorted(dir_part.glob("*.parquet"))
+        if len(arquivos) <= max_arquivos:
+            continue
+        tabela = pa.concat_tables([pq.read_table(a, partitioning=None) for a in arquivos])
+        tmp = dir_part / "_compactado.tmp"
+        pq.write_table(tabela.sort_by("id"), tmp)
+        for a in arquivos:
+            a.unlink()
+        # nome do mais recente; esse lote já está confirmado no _estado.json e não é regravado
+        tmp.replace(dir_part / arquivos[-1].name)
+        compactadas += 1
+    return compactadas
+
+
+# =========================
+# Leitura
+# =========================
+
+def carregar_snapshot(
+    pasta: Path,
+    *,
+    colunas: Optional[List[str]] = None,
+    periodos: Optional[Iterable[str]] = None,
+    tipos: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    Lê só as colunas e partições pedidas (as outras pastas nem são abertas).
+      carregar_snapshot(SNAPSHOT_DIR, colunas=["cnpj", "valor"], periodos=["2025-08"])
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(pasta, format="parquet", partitioning=_particionamento())
+
+    filtro = None
+    for campo, valores in (("periodo", periodos), ("tipo_pendencia", tipos)):
+        if valores is None:
+            continue
+        valores = list(valores)
+        preenchidos = [v for v in valores if v != ""]
+        f = ds.field(campo).isin(preenchidos) if preenchidos else None
+        if "" in valores:
+            nulo = ds.field(campo).is_null()
+            f = nulo if f is None else f | nulo
+        if f is None:
+            # lista vazia: nenhuma partição
+            f = ds.scalar(False)
+        filtro = f if filtro is None else filtro & f
+
+    tabela = dataset.to_table(columns=colunas or COLUNAS, filter=filtro)
+    df = tabela.to_pandas()
+    for c in PARTICOES:
+        if c in df.columns:
+            df[c] = df[c].fillna("")
+    return df
+
+
+def main() -> None:
+    """
+    python -m app.snapshot [atualizar|rebuild|compactar]
+    """
+    from .config import DB_PATH, SNAPSHOT_DIR
+    from .banco import conectar
+    from .trava import trava_pipeline
+
+    acao = sys.argv[1] if len(sys.argv) > 1 else "atualizar"
+    if acao not in ("atualizar", "rebuild", "compactar"):
+        print("uso: python -m app.snapshot [atualizar|rebuild|compactar]")
+        sys.exit(2)
+
+    # o pipeline grava o mesmo dataset (e o _estado.json) com a trava
+    with trava_pipeline(ao_esperar=lambda: print("⏳ Outro pipeline está rodando, aguardando...")):
+        if acao == "compactar":
+            print(f"🗜️ Partições compactadas: {compactar_snapshot(SNAPSHOT_DIR)}")
+            return
+
+        con = conectar(str(DB_PATH))
+        try:
+            r = (reconstruir_snapshot if acao == "rebuild" else atualizar_snapshot)(con, SNAPSHOT_DIR)
+        finally:
+            con.close()
+    print(f"📦 Snapshot: +{r['linhas']} linhas em {len(r['particoes'])} partições (último id {r['ultimo_id']})")
+
+
+if __name__ == "__main__":
+    main()
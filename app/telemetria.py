@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+
+# =========================
+# Telemetria por etapa
+# =========================
+#
+# Uma Telemetria por execução do pipeline. Cada etapa (hash, leitura,
+# normalizacao, insercao, resumo, snapshot, exportacao_*, xlsx_*, csv_*) é
+# medida com
+#
+#   with tel.etapa("leitura") as m:
+#       ...
+#       m.linhas += len(df)
+#
+# e pode ser medida várias vezes (uma por lote/arquivo): tempo e linhas
+# somam, o pico de memória é o maior. O pico é o RSS do processo enquanto
+# a etapa estava ativa, amostrado numa thread (precisa de /proc ou do
+# pacote psutil; sem eles fica None).
+#
+# somar_cache() acumula acertos/faltas dos caches dos parsers do
+# normalizar (vão para o terminal e para a aba STATUS, não para run_log).
+#
+# No fim: salvar(con) grava uma linha por etapa em run_log (tabela criada
+# pelas migrações), tabela_status() vai para a aba STATUS e
+# metricas_prometheus(con) alimenta o GET /metrics.
+
+INTERVALO_MEMORIA = 0.1  # segundos entre amostras de RSS
+
+# ordem em que as etapas aparecem (as que não estão aqui entram antes do total)
+ORDEM_ETAPAS = [
+    "hash", "leitura", "normalizacao", "insercao", "eventos",
+    "arquivamento", "resumo", "snapshot",
+    "exportacao_resumo", "exportacao_detalhes", "exportacao_eventos", "exportacao_status",
+    "xlsx_resumo", "xlsx_detalhes", "xlsx_eventos", "xlsx_status",
+    "csv_resumo", "csv_detalhes", "csv_eventos", "csv_status",
+    "total",
+]
+
+
+def rss_atual() -> Optional[int]:
+    """RSS do processo em bytes, ou None se não houver como medir."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Medida:
+    """O que o bloco `with tel.etapa(...)` pode preencher."""
+
+    __slots__ = ("linhas",)
+
+    def __init__(self) -> None:
+        self.linhas = 0
+
+
+class Telemetria:
+    def __init__(self, *, memoria: bool = True):
+        self.execucao = uuid.uuid4().hex
+        self.iniciada_em = datetime.now().isoformat(timespec="seconds")
+        self.etapas: Dict[str, Dict[str, Any]] = {}
+        # acertos/faltas dos caches dos parsers (normalizar.estatisticas_memo)
+        self.caches: Dict[str, Dict[str, int]] = {}
+
+        self._inicio = time.perf_counter()
+        self._guarda = threading.Lock()
+        self._ativas: Dict[str, int] = {}
+        self._memoria = memoria and rss_atual() is not None
+        self._parar = threading.Event()
+        self._amostrador: Optional[threading.Thread] = None
+
+    # -------------------------
+    # coleta
+    # -------------------------
+
+    def _registro(self, nome: str) -> Dict[str, Any]:
+        r = self.etapas.get(nome)
+        if r is None:
+            r = self.etapas[nome] = {"chamadas": 0, "segundos": 0.0, "linhas": 0, "pico_rss": None}
+        return r
+
+    def _marcar_pico(self, rss: Optional[int], nomes) -> None:
+        if rss is None:
+            return
+        for nome in nomes:
+            r = self._registro(nome)
+            if r["pico_rss"] is None or rss > r["pico_rss"]:
+                r["pico_rss"] = rss
+
+    def _amostrar(self) -> None:
+        while not self._parar.wait(INTERVALO_MEMORIA):
+            rss = rss_atual()
+            with self._guarda:
+                self._marcar_pico(rss, [n for n, c in self._ativas.items() if c])
+
+    def _iniciar_amostrador(self) -> None:
+        if self._memoria and self._amostrador is None:
+            self._amostrador = threading.Thread(target=self._amostrar, name="telemetria-rss", daemon=True)
+            self._amostrador.start()
+
+    @contextmanager
+    def etapa(self, nome: str) -> Iterator[Medida]:
+        m = Medida()
+        rss = rss_atual() if self._memoria else None
+        with self._guarda:
+            self._iniciar_amostrador()
+            self._ativas[nome] = self._ativas.get(nome, 0) + 1
+            self._marcar_pico(rss, [nome])
+        t0 = time.perf_counter()
+        try:
+            yield m
+        finally:
+            dt = time.perf_counter() - t0
+            rss = rss_atual() if self._memoria else None
+            with self._guarda:
+                self._ativas[nome] -= 1
+                r = self._registro(nome)
+                r["chamadas"] += 1
+                r["segundos"] += dt
+                r["linhas"] += m.linhas
+                self._marcar_pico(rss, [nome])
+
+    def somar(self, nome: str, *, linhas: int) -> None:
+        """Linhas contadas fora do bloco `with` (ex.: só sabidas no fim)."""
+        with self._guarda:
+            self._registro(nome)["linhas"] += linhas
+
+    def somar_cache(self, nome: str, *, acertos: int, faltas: int) -> None:
+        with self._guarda:
+            c = self.caches.setdefault(nome, {"acertos": 0, "faltas": 0})
+            c["acertos"] += acertos
+            c["faltas"] += faltas
+
+    def dados(self) -> Dict[str, Dict[str, Any]]:
+        """Cópia das etapas (picklable: volta dos processos do pool)."""
+        with self._guarda:
+            return {k: dict(v) for k, v in self.etapas.items()}
+
+    def dados_caches(self) -> Dict[str, Dict[str, int]]:
+        with self._guarda:
+            return {k: dict(v) for k, v in self.caches.items()}
+
+    def juntar(self, etapas: Dict[str, Dict[str, Any]], caches: Optional[Dict[str, Dict[str, int]]] = None) -> None:
+        """Soma as etapas (e os caches) medidos em outro processo (leitores do pool)."""
+        for nome, c in (caches or {}).items():
+            self.somar_cache(nome, acertos=c["acertos"], faltas=c["faltas"])
+        with self._guarda:
+            for nome, o in etapas.items():
+                r = self._registro(nome)
+                r["chamadas"] += o["chamadas"]
+                r["segundos"] += o["segundos"]
+                r["linhas"] += o["linhas"]
+                if o["pico_rss"] is not None and (r["pico_rss"] is None or o["pico_rss"] > r["pico_rss"]):
+                    r["pico_rss"] = o["pico_rss"]
+
+    def parar(self) -> None:
+        """Para a thread de amostragem de memória."""
+        self._parar.set()
+        if self._amostrador is not None:
+            self._amostrador.join()
+            self._amostrador = None
+
+    def encerrar(self) -> None:
+        """Para o amostrador e registra a etapa "total" (tempo de parede da execução)."""
+        self.parar()
+        with self._guarda:
+            if "total" in self.etapas:
+                return
+            total = self._registro("total")
+            total["chamadas"] = 1
+            total["segundos"] = time.perf_counter() - self._inicio
+            picos = [r["pico_rss"] for r in self.etapas.values() if r["pico_rss"] is not None]
+            total["pico_rss"] = max(picos) if picos else None
+
+    # -------------------------
+    # saída
+    # -------------------------
+
+    def linhas_tabela(self) -> List[Dict[str, Any]]:
+        """Uma linha por etapa, na ordem de ORDEM_ETAPAS."""
+        ordem = {n: i for i, n in enumerate(ORDEM_ETAPAS)}
+        etapas = self.dados()
+        if "total" not in etapas:
+            # ainda rodando (ex.: aba STATUS escrita antes do fim): total até agora
+            etapas["total"] = {"chamadas": 1, "segundos": time.perf_counter() - self._inicio, "linhas": 0, "pico_rss": None}
+        out = []
+        for nome, r in sorted(etapas.items(), key=lambda kv: ordem.get(kv[0], ordem["total"] - 0.5)):
+            out.append({
+                "etapa": nome,
+                "chamadas": r["chamadas"],
+                "segundos": round(r["segundos"], 3),
+                "linhas": r["linhas"],
+                "linhas_por_s": round(r["linhas"] / r["segundos"], 1) if r["segundos"] and r["linhas"] else None,
+                "pico_rss_mb": None if r["pico_rss"] is None else round(r["pico_rss"] / 1024 / 1024, 1),
+            })
+        return out
+
+    def linhas_caches(self) -> List[Dict[str, Any]]:
+        out = []
+        for nome, c in sorted(self.dados_caches().items()):
+            total = c["acertos"] + c["faltas"]
+            out.append({
+                "cache": nome,
+                "acertos": c["acertos"],
+                "faltas": c["faltas"],
+                "taxa_acerto": round(c["acertos"] / total, 4) if total else None,
+            })
+        return out
+
+    def tabela_status(self) -> List[List[Any]]:
+        """Cabeçalho + linhas para a aba STATUS (e, se houver, a tabela dos caches)."""
+        valores: List[List[Any]] = [["ETAPA", "SEGUNDOS", "LINHAS", "LINHAS/S", "PICO RSS (MB)"]]
+        for r in self.linhas_tabela():
+            valores.append([
+                r["etapa"], r["segundos"], r["linhas"],
+                "" if r["linhas_por_s"] is None else r["linhas_por_s"],
+                "" if r["pico_rss_mb"] is None else r["pico_rss_mb"],
+            ])
+        caches = self.linhas_caches()
+        if caches:
+            valores += [[""], ["CACHE", "ACERTOS", "FALTAS", "TAXA DE ACERTO"]]
+            for c in caches:
+                valores.append([c["cache"], c["acertos"], c["faltas"], "" if c["taxa_acerto"] is None else c["taxa_acerto"]])
+        return valores
+
+    def imprimir(self) -> None:
+        print("⏱️ Etapas:")
+        for r in self.linhas_tabela():
+            vel = "" if r["linhas_por_s"] is None else f"{r['linhas_por_s']:>12,.0f} linhas/s"
+            pico = "" if r["pico_rss_mb"] is None else f"  pico {r['pico_rss_mb']:.0f} MB"
+            print(f"   {r['etapa']:<20} {r['segundos']:>9.2f} s {r['linhas']:>10} linhas {vel}{pico}")
+        caches = self.linhas_caches()
+        if caches:
+            print("🧠 Caches dos parsers:")
+            for c in caches:
+                taxa = "-" if c["taxa_acerto"] is None else f"{c['taxa_acerto']:.1%}"
+                print(f"   {c['cache']:<20} {taxa:>7} de acerto ({c['acertos']} acertos, {c['faltas']} faltas)")
+
+    def salvar(self, con: sqlite3.Connection) -> None:
+        """Grava as etapas em run_log (uma linha por etapa)."""
+        con.executemany(
+            """
+            INSERT INTO run_log
+              (execucao, iniciada_em, etapa, chamadas, segundos, linhas, linhas_por_s, pico_rss_mb)
+            VALUES (?,?,?,?,?,?,?,?)
+            """,
+            [
+                (self.execucao, self.iniciada_em, r["etapa"], r["chamadas"], r["segundos"],
+                 r["linhas"], r["linhas_por_s"], r["pico_rss_mb"])
+                for r in self.linhas_tabela()
+            ],
+        )
+        con.commit()
+
+
+# =========================
+# GET /metrics (formato texto do Prometheus)
+# =========================
+
+def _rotulo(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metricas_prometheus(con: sqlite3.Connection) -> str:
+    """
+    Por etapa: a medição mais recente (gauges) e os acumulados de todas as
+    execuções em run_log (counters, para rate()/increase()).
+    """
+    linhas: List[str] = []
+
+    def metrica(nome: str, tipo: str, ajuda: str, valores: List[tuple]) -> None:
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for etapa, v in valores:
+            if v is None:
+                continue
+            rotulo = "" if etapa is None else f'{{etapa="{_rotulo(etapa)}"}}'
+            linhas.append(f"{nome}{rotulo} {v}")
+
+    ultimas = con.execute(
+        """
+        SELECT etapa, segundos, linhas, linhas_por_s, pico_rss_mb, iniciada_em
+        FROM run_log
+        WHERE id IN (SELECT MAX(id) FROM run_log GROUP BY etapa)
+        ORDER BY etapa
+        """
+    ).fetchall()
+    acumulado = con.execute(
+        "SELECT etapa, SUM(segundos), SUM(linhas) FROM run_log GROUP BY etapa ORDER BY etapa"
+    ).fetchall()
+    execucoes, ultima = con.execute("SELECT COUNT(DISTINCT execucao), MAX(iniciada_em) FROM run_log").fetchone()
+
+    metrica("pendencias_etapa_segundos", "gauge", "Tempo de parede da etapa na execução mais recente.",
+            [(r[0], r[1]) for r in ultimas])
+    metrica("pendencias_etapa_linhas", "gauge", "Linhas processadas pela etapa na execução mais recente.",
+            [(r[0], r[2]) for r in ultimas])
+    metrica("pendencias_etapa_linhas_por_segundo", "gauge", "Vazão da etapa na execução mais recente.",
+            [(r[0], r[3]) for r in ultimas])
+    metrica("pendencias_etapa_pico_rss_bytes", "gauge", "Pico de RSS do processo durante a etapa (execução mais recente).",
+            [(r[0], None if r[4] is None else int(r[4] * 1024 * 1024)) for r in ultimas])
+    metrica("pendencias_etapa_segundos_total", "counter", "Tempo acumulado da etapa em todas as execuções registradas.",
+            [(r[0], r[1]) for r in acumulado])
+    metrica("pendencias_etapa_linhas_total", "counter", "Linhas acumuladas da etapa em todas as execuções registradas.",
+            [(r[0], r[2]) for r in acumulado])
+    metrica("pendencias_execucoes_total", "counter", "Execuções registradas em run_log.", [(None, execucoes)])
+    if ultima:
+        ts = datetime.fromisoformat(ultima).timestamp()
+        metrica("pendencias_ultima_execucao_timestamp_seconds", "gauge", "Início da execução mais recente.",
+                [(None, ts)])
+
+    return "\n".join(linhas) + "\n"
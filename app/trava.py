@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from .config import TRAVA_PATH
+
+
+# =========================
+# Trava do pipeline (entre processos)
+# =========================
+#
+# Só um pipeline escreve no banco por vez: API (/run), rodar, base_completa.
+# Lock de arquivo do sistema operacional (fcntl no Linux, msvcrt no Windows):
+# se o processo morrer, o SO libera a trava sozinho.
+#
+# Reentrante na mesma thread: base_completa pega a trava e chama
+# rodar.main, que pega de novo sem travar a si mesma.
+
+class TravaOcupada(RuntimeError):
+    pass
+
+
+_guarda = threading.Lock()
+_dono: Optional[int] = None
+_nivel = 0
+
+
+def _tentar_travar(f) -> bool:
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _destravar(f) -> None:
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def trava_pipeline(
+    path: Path = TRAVA_PATH,
+    *,
+    timeout: Optional[float] = None,
+    ao_esperar: Optional[Callable[[], None]] = None,
+    intervalo: float = 0.5,
+) -> Iterator[None]:
+    """
+    Segura a trava do pipeline enquanto o bloco roda.
+
+    timeout: None espera para sempre; 0 falha na hora (TravaOcupada).
+    ao_esperar: chamado uma vez se a trava estiver com outro processo.
+    """
+    global _dono, _nivel
+
+    eu = threading.get_ident()
+    with _guarda:
+        if _dono == eu:
+            _nivel += 1
+            reentrada = True
+        else:
+            reentrada = False
+
+    if reentrada:
+        try:
+            yield
+        finally:
+            with _guarda:
+                _nivel -= 1
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, "a+")
+    inicio = time.monotonic()
+    avisou = False
+
+    try:
+        while True:
+            # _guarda também serializa threads do mesmo processo
+            with _guarda:
+                if _dono is None and _tentar_travar(f):
+                    _dono, _nivel = eu, 1
+                    break
+
+            if timeout is not None and time.monotonic() - inicio >= timeout:
+                raise TravaOcupada(f"Pipeline já está rodando (trava em {path})")
+            if not avisou and ao_esperar is not None:
+                ao_esperar()
+                avisou = True
+            time.sleep(intervalo)
+    except BaseException:
+        f.close()
+        raise
+
+    try:
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()}\n")
+        f.flush()
+    except OSError:
+        pass
+
+    try:
+        yield
+    finally:
+        with _guarda:
+            _dono, _nivel = None, 0
+            try:
+                _destravar(f)
+            finally:
+                f.close()
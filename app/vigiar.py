@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import (
+    PASTA_ENTRADA,
+    VIGIAR_ESTABILIDADE, VIGIAR_INTERVALO_SAIDAS, VIGIAR_VARREDURA,
+)
+from .trava import trava_pipeline
+
+
+# =========================
+# Vigia da pasta de entrada
+# =========================
+#
+# Processo que fica rodando (python -m app.vigiar):
+#   - percebe planilhas novas em entrada/ (inotify se o pacote inotify_simple
+#     estiver instalado, senão varredura a cada VIGIAR_VARREDURA segundos)
+#   - só importa um arquivo depois que tamanho e mtime ficam parados por
+#     VIGIAR_ESTABILIDADE segundos e ele abre para leitura (ainda copiando
+#     ou aberto no Excel = espera)
+#   - importa cada arquivo assim que fica estável
+#   - resumo + exportação para o Sheets no máximo uma vez a cada
+#     VIGIAR_INTERVALO_SAIDAS segundos, juntando o que chegou nesse meio tempo
+
+Assinatura = Tuple[int, int]  # (tamanho, mtime_ns)
+
+_CONTAGENS = ("arquivos_total", "arquivos_importados", "linhas_lidas", "linhas_inseridas")
+
+
+def _listar(pasta: Path) -> Dict[Path, Assinatura]:
+    out: Dict[Path, Assinatura] = {}
+    for p in pasta.glob("*.xlsx"):
+        # ~$arquivo.xlsx = arquivo de trava do Excel
+        if p.name.startswith("~$"):
+            continue
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        if p.is_file():
+            out[p] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def _pode_abrir(path: Path) -> bool:
+    try:
+        with open(path, "rb") as f:
+            f.read(1)
+        return True
+    except OSError:
+        return False
+
+
+def _abrir_inotify(pasta: Path):
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        return None
+    try:
+        ino = INotify()
+        ino.add_watch(str(pasta), flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY)
+        return ino
+    except OSError:
+        return None
+
+
+def _zerar() -> Dict[str, int]:
+    return {k: 0 for k in _CONTAGENS}
+
+
+def vigiar(
+    pasta_entrada: Path = PASTA_ENTRADA,
+    *,
+    intervalo_saidas: float = VIGIAR_INTERVALO_SAIDAS,
+    estabilidade: float = VIGIAR_ESTABILIDADE,
+    varredura: float = VIGIAR_VARREDURA,
+    parar: Optional[threading.Event] = None,
+    importar: Optional[Callable[[List[Path]], Dict[str, Any]]] = None,
+    saidas: Optional[Callable[[Dict[str, Any]], Any]] = None,
+) -> None:
+    """
+    Loop do vigia. Roda até `parar` ser setado (ou Ctrl+C).
+    importar/saidas: por padrão rodar.importar_entrada / rodar.atualizar_saidas.
+    """
+    if importar is None or saidas is None:
+        from .rodar import atualizar_saidas, importar_entrada
+        importar = importar or (lambda arquivos: importar_entrada(arquivos=arquivos))
+        saidas = saidas or atualizar_saidas
+
+    parar = parar or threading.Event()
+    pasta_entrada.mkdir(parents=True, exist_ok=True)
+
+    ino = _abrir_inotify(pasta_entrada)
+    print(f"👀 Vigiando {pasta_entrada} ({'inotify' if ino is not None else f'varredura a cada {varredura:g}s'})")
+
+    # já importados mas que ficaram na pasta (cópia em vez de mover)
+    vistos: Dict[Path, Assinatura] = {}
+    # arquivo -> (assinatura, desde quando está com essa assinatura)
+    candidatos: Dict[Path, Tuple[Assinatura, float]] = {}
+
+    acumulado = _zerar()
+    pendente = False
+    ultima_saida = float("-inf")
+
+    try:
+        while not parar.is_set():
+            agora = time.monotonic()
+            atuais = _listar(pasta_entrada)
+
+            for p in list(candidatos):
+                if p not in atuais:
+                    del candidatos[p]
+            for p in list(vistos):
+                if p not in atuais:
+                    del vistos[p]
+
+            prontos: List[Path] = []
+            for p, ass in atuais.items():
+                if vistos.get(p) == ass:
+                    continue
+                c = candidatos.get(p)
+                if c is None or c[0] != ass:
+                    candidatos[p] = (ass, agora)
+                elif agora - c[1] >= estabilidade and _pode_abrir(p):
+                    prontos.append(p)
+
+            if prontos:
+                prontos.sort()
+                try:
+                    with trava_pipeline():
+                        r = importar(prontos)
+                except Exception as e:
+                    # falha passageira (banco ocupado, disco cheio...): os
+                    # arquivos voltam a ser candidatos e são tentados de novo
+                    # depois de mais `estabilidade` segundos
+                    print("❌ Vigia: erro importando", [p.name for p in prontos], e)
+                    traceback.print_exc()
+                    for p in prontos:
+                        candidatos[p] = (atuais[p], time.monotonic())
+                else:
+                    for k in _CONTAGENS:
+                        acumulado[k] += r.get(k, 0)
+                    if r.get("arquivos_importados"):
+                        pendente = True
+                    for p in prontos:
+                        vistos[p] = atuais[p]
+                        candidatos.pop(p, None)
+
+            if pendente and time.monotonic() - ultima_saida >= intervalo_saidas:
+                try:
+                    with trava_pipeline():
+                        r = saidas(dict(acumulado))
+                    # destino que falhou (atualizar_saidas segura o erro e
+                    # devolve erro_exportacao): tenta de novo no próximo intervalo
+                    pendente = bool(isinstance(r, dict) and r.get("erro_exportacao"))
+                except Exception as e:
+                    print("❌ Vigia: erro no resumo/exportação", e)
+                    traceback.print_exc()
+                if pendente:
+                    print(f"🔁 Vigia: saídas pendentes, nova tentativa em {intervalo_saidas:g}s")
+                else:
+                    acumulado = _zerar()
+                ultima_saida = time.monotonic()
+
+            espera = varredura
+            if candidatos:
+                espera = min(espera, max(0.1, estabilidade / 2))
+            if pendente:
+                espera = min(espera, max(0.1, intervalo_saidas - (time.monotonic() - ultima_saida)))
+
+            if ino is not None:
+                # acorda no primeiro evento; o conteúdo não importa, a varredura decide
+                ino.read(timeout=int(espera * 1000))
+            else:
+                parar.wait(espera)
+    except KeyboardInterrupt:
+        print("👋 Vigia encerrado.")
+    finally:
+        if ino is not None:
+            ino.close()
+
+
+def main() -> None:
+    vigiar()
+
+
+if __name__ == "__main__":
+    main()
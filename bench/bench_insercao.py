@@ -0,0 +1,104 @@
+"""
+Benchmark do caminho de inserção em pendencias_raw: linha a linha
+(um con.execute por linha, como era antes) x executemany em lotes.
+
+Lê e normaliza a planilha uma vez, e depois mede só a gravação no SQLite
+(banco novo para cada medição).
+
+Uso:
+  python -m bench.bench_insercao --linhas-por-aba 15000
+  python -m bench.bench_insercao --planilha minha.xlsx --lote 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from app.banco import inserir_lote, trocar_contribuintes
+from app.importar import (
+    _SQL_INSERIR, _conectar_db, _iniciar_schema, _ler_excel, _tupla_linha,
+)
+from app.normalizar import compilar_aba
+
+from .gerar_planilha import gerar_planilha
+
+
+def _to_row_dicts(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # normaliza colunas (mantém nomes originais)
+    return [
+        {k: (None if (isinstance(v, float) and pd.isna(v)) else v) for k, v in row.items()}
+        for row in df.to_dict("records")
+    ]
+
+
+def _preparar(path: Path) -> List[Tuple[Any, ...]]:
+    data_coleta = datetime.now().isoformat(timespec="seconds")
+    linhas = []
+    for aba, df in _ler_excel(path):
+        normalizar_linha = compilar_aba(aba, tuple(df.columns))
+        for linha_origem, rowdict in zip(df.index, _to_row_dicts(df)):
+            base = normalizar_linha(tuple(rowdict.values()))
+            raw_json = json.dumps({"aba": aba, "row": rowdict}, ensure_ascii=False, default=str)
+            linhas.append(_tupla_linha(base, path.name, aba, int(linha_origem), data_coleta, raw_json))
+    return linhas
+
+
+def _linha_a_linha(con, linhas: List[Tuple[Any, ...]], tamanho_lote: int) -> int:
+    sql = _SQL_INSERIR.replace("INSERT OR IGNORE", "INSERT")
+    for t in trocar_contribuintes(con, linhas):
+        con.execute(sql, t)
+    return len(linhas)
+
+
+def _em_lotes(con, linhas: List[Tuple[Any, ...]], tamanho_lote: int) -> int:
+    return inserir_lote(con, _SQL_INSERIR, trocar_contribuintes(con, linhas), tamanho_lote)
+
+
+def _medir(nome: str, fn: Callable, linhas: List[Tuple[Any, ...]], tamanho_lote: int, pasta: Path) -> float:
+    db = pasta / f"{nome}.db"
+    con = _conectar_db(db)
+    _iniciar_schema(con)
+
+    t0 = time.perf_counter()
+    con.execute("BEGIN;")
+    inseridas = fn(con, linhas, tamanho_lote)
+    con.commit()
+    dt = time.perf_counter() - t0
+    con.close()
+
+    print(f"{nome:<14} {inseridas:>9} linhas  {dt:8.3f} s  {inseridas / dt:>12,.0f} linhas/s")
+    return inseridas / dt
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark da inserção em pendencias_raw")
+    ap.add_argument("--planilha", type=Path, default=None, help="usa uma planilha existente")
+    ap.add_argument("--linhas-por-aba", type=int, default=15000, help="tamanho da planilha gerada (8 abas)")
+    ap.add_argument("--lote", type=int, default=5000, help="tamanho do lote do executemany")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta = Path(tmp)
+        path = args.planilha
+        if path is None:
+            path = pasta / "sintetica.xlsx"
+            gerar_planilha(path, args.linhas_por_aba)
+
+        linhas = _preparar(path)
+        print(f"Planilha: {path.name} | {len(linhas)} linhas | lote={args.lote}")
+
+        antes = _medir("linha_a_linha", _linha_a_linha, linhas, args.lote, pasta)
+        depois = _medir("executemany", _em_lotes, linhas, args.lote, pasta)
+        print(f"ganho: {depois / antes:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Planilha do Google em memória, para medir/testar a exportação sem rede.
+
+Imita o pedaço da API do gspread que o app usa (worksheet, add_worksheet,
+batch_update estrutural, update, batch_update de valores, clear) e pode
+simular cota estourada: a cada `falhar_a_cada` chamadas levanta um
+gspread.exceptions.APIError com status 429, igual ao que a API devolve.
+
+Uso:
+    from bench.fake_gspread import PlanilhaFake
+    ss = PlanilhaFake(falhar_a_cada=7)
+    escrever_df(ss, "DETALHES", df, 200000, estado={}, envio=EnvioSheets(dormir=lambda s: None))
+    ss.aba("DETALHES").dados()
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range
+
+
+def erro_api(status: int = 429, mensagem: str = "Quota exceeded") -> APIError:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(
+        {"error": {"code": status, "message": mensagem, "status": "RESOURCE_EXHAUSTED"}}
+    ).encode("utf-8")
+    return APIError(resp)
+
+
+class AbaFake:
+    def __init__(self, planilha: "PlanilhaFake", title: str, rows: int, cols: int, sheet_id: int):
+        self._planilha = planilha
+        self.title = title
+        self.id = sheet_id
+        self.grid: List[List[Any]] = [[""] * cols for _ in range(rows)]
+
+    @property
+    def row_count(self) -> int:
+        return len(self.grid)
+
+    def _escrever(self, a1: str, values: List[List[Any]]) -> None:
+        g = a1_range_to_grid_range(a1)
+        r0 = g.get("startRowIndex", 0)
+        c0 = g.get("startColumnIndex", 0)
+        for i, linha in enumerate(values):
+            while r0 + i >= len(self.grid):
+                self.grid.append([""] * len(self.grid[0]))
+            destino = self.grid[r0 + i]
+            for j, v in enumerate(linha):
+                while c0 + j >= len(destino):
+                    destino.append("")
+                destino[c0 + j] = v
+
+    def clear(self) -> None:
+        self._planilha._chamada("clear", self.title)
+        self.grid = [[""] * len(r) for r in self.grid]
+
+    def update(self, values: List[List[Any]], range_name: str = "A1", **kwargs: Any) -> None:
+        self._planilha._chamada("update", self.title, len(values))
+        self._escrever(range_name, values)
+
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs: Any) -> None:
+        self._planilha._chamada("batch_update", self.title, sum(len(d["values"]) for d in data))
+        for d in data:
+            self._escrever(d["range"], d["values"])
+
+    def dados(self, ncols: Optional[int] = None) -> List[List[Any]]:
+        """Linhas até a última não vazia (cortadas em ncols, se informado)."""
+        fim = len(self.grid)
+        while fim and all(v == "" for v in self.grid[fim - 1]):
+            fim -= 1
+        return [r[:ncols] if ncols else list(r) for r in self.grid[:fim]]
+
+
+class PlanilhaFake:
+    id = "PLANILHA_FAKE"
+
+    def __init__(self, *, falhar_a_cada: int = 0):
+        self.abas: Dict[str, AbaFake] = {}
+        self.falhar_a_cada = falhar_a_cada
+        self.chamadas: List[tuple] = []
+        self.falhas = 0
+        self._n = 0
+
+    def _chamada(self, *registro: Any) -> None:
+        self._n += 1
+        if self.falhar_a_cada and self._n % self.falhar_a_cada == 0:
+            self.falhas += 1
+            raise erro_api(429)
+        self.chamadas.append(registro)
+
+    def aba(self, title: str) -> AbaFake:
+        return self.abas[title]
+
+    def worksheet(self, title: str) -> AbaFake:
+        if title not in self.abas:
+            raise WorksheetNotFound(title)
+        return self.abas[title]
+
+    def add_worksheet(self, title: str, rows: int, cols: int, **kwargs: Any) -> AbaFake:
+        self._chamada("add_worksheet", title)
+        self.abas[title] = AbaFake(self, title, rows, cols, len(self.abas) + 1)
+        return self.abas[title]
+
+    def batch_update(self, body: Dict[str, Any]) -> None:
+        self._chamada("estrutura", len(body["requests"]))
+        for pedido in body["requests"]:
+            (tipo, corpo), = pedido.items()
+            faixa = corpo["range"]
+            ws = next(w for w in self.abas.values() if w.id == faixa["sheetId"])
+            inicio, fim = faixa["startIndex"], faixa["endIndex"]
+            if tipo == "insertDimension":
+                ws.grid[inicio:inicio] = [[""] * len(ws.grid[0]) for _ in range(fim - inicio)]
+            else:
+                del ws.grid[inicio:fim]
+
+
+class ClienteFake:
+    """No lugar do gspread.Client: open_by_key devolve sempre a mesma PlanilhaFake."""
+
+    def __init__(self, planilha: Optional[PlanilhaFake] = None):
+        self.planilha = planilha or PlanilhaFake()
+
+    def open_by_key(self, key: str) -> PlanilhaFake:
+        return self.planilha
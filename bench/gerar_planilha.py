@@ -0,0 +1,196 @@
+"""
+Gera planilhas sintéticas no formato do download da SEFAZ (as 8 abas de
+ABAS_ACEITAS + uma aba que deve ser ignorada), com cabeçalhos com e sem
+acento e valores "sujos" (CNPJ formatado, número em texto com vírgula,
+período em vários formatos, células vazias, linhas em branco).
+
+Uso:
+  python -m bench.gerar_planilha saida.xlsx --linhas 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from openpyxl import Workbook
+
+
+# cabeçalho com acento / sem acento (o normalizador aceita os dois)
+ABAS: Dict[str, List[List[str]]] = {
+    "Omissões de EFD": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "DOCUMENTO", "ENTREGA_EFD", "ANO_MES"],
+        ["CNPJ RAIZ", "CGF", "RAZAO", "DOCUMENTO", "ENTREGA_EFD", "ANO_MES"],
+    ],
+    "Débitos": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "PERIODO DE REFERENCIA", "DATA VENCIMENTO", "VALOR TOTAL",
+         "CÓDIGO DE RECEITA DO DÉBITO", "DIAS DE ATRASO DO DÉBITO NÃO PAGO"],
+        ["CNPJ RAIZ", "CGF", "RAZAO", "PERIODO DE REFERENCIA", "DATA VENCIMENTO", "VALOR TOTAL",
+         "CODIGO DE RECEITA DO DEBITO", "DIAS DE ATRASO DO DEBITO NAO PAGO"],
+    ],
+    "Omissões e divergências de NFE": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "MÊS ANO REFERÊNCIA", "CHAVE DFE", "NÚMERO DO DOCUMENTO FISCAL",
+         "ORIGEM DO DOCUMENTO", "DESCRIÇÃO DO INDICADOR", "VALOR ESCRITURADO", "VALOR DO DFE", "DIFERENÇA"],
+        ["CNPJ", "CGF", "RAZAO", "MES ANO REFERENCIA", "CHAVE DFE", "NUMERO DO DOCUMENTO FISCAL",
+         "ORIGEM DO DOCUMENTO", "DESCRICAO DO INDICADOR", "VALOR ESCRITURADO", "VALOR DO DFE", "DIFERENCA"],
+    ],
+    "NFe inexistente declarada": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "CHAVE DFE", "VALOR DIVERGENTE"],
+    ],
+    "Omissões e Divergências CFe": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "MÊS ANO REFERÊNCIA", "CHAVE DFE", "DESCRIÇÃO DO INDICADOR", "VALOR DO DFE", "DIFERENÇA"],
+        ["CNPJ RAIZ", "CGF", "RAZAO", "MES ANO REFERENCIA", "CHAVE", "DESCRICAO DO INDICADOR", "VALOR", "DIFERENCA"],
+    ],
+    "CTE escriturado com divergência": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "MÊS ANO REFERÊNCIA", "CHAVE DFE", "DESCRIÇÃO DO INDICADOR", "VALOR DO DFE", "DIFERENÇA"],
+    ],
+    "NFe sem REG_PAS": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "MÊS ANO REFERÊNCIA", "CHAVE DFE", "NÚMERO DO DOCUMENTO FISCAL",
+         "ORIGEM DO DOCUMENTO", "VALOR DO DFE"],
+    ],
+    "Outros limitadores": [
+        ["CNPJ RAIZ", "CGF", "RAZÃO", "PENDENCIA NA SITUAÇÃO CADASTRAL", "INSCRITO NO CADIN",
+         "DEVEDOR CONTUMAZ", "INVENTÁRIO OMISSO"],
+        ["CNPJ RAIZ", "CGF", "RAZAO", "PENDENCIA NA SITUACAO CADASTRAL", "INSCRITO NO CADINE",
+         "DEVEDOR CONTUMAZ", "INVENTARIO OMISSO"],
+    ],
+    # aba que não está em ABAS_ACEITAS (o leitor tem que pular)
+    "Resumo geral": [
+        ["INDICADOR", "QUANTIDADE", "OBSERVACAO"],
+    ],
+}
+
+INDICADORES = [
+    "NFe de entrada não escriturada",
+    "Valor escriturado diverge do DFe",
+    "Documento cancelado escriturado",
+    "CFe não escriturado",
+]
+
+
+def _empresas(rnd: random.Random, n: int) -> List[Dict[str, Any]]:
+    out = []
+    for i in range(n):
+        raiz = f"{rnd.randint(10_000_000, 99_999_999)}"
+        cgf = f"{rnd.randint(10_000_000, 99_999_999)}{rnd.randint(0, 9)}"
+        out.append({
+            "cnpj": rnd.choice([raiz, f"{raiz[:2]}.{raiz[2:5]}.{raiz[5:]}", int(raiz)]),
+            "cgf": rnd.choice([cgf, f"{cgf[:2]}.{cgf[2:5]}.{cgf[5:8]}-{cgf[8:]}"]),
+            "razao": rnd.choice([f"EMPRESA {i} LTDA", f"Comércio Ômega {i} ME ", f"INDÚSTRIA {i} S/A"]),
+        })
+    return out
+
+
+def _periodo(rnd: random.Random) -> Any:
+    ano = rnd.choice([2023, 2024, 2025])
+    mes = rnd.randint(1, 12)
+    return rnd.choice([
+        datetime(ano, mes, 1),
+        f"{mes}/{ano}",
+        f"{ano}-{mes:02d}",
+        f"{mes:02d}/{ano}",
+        None,
+    ])
+
+
+def _valor(rnd: random.Random) -> Any:
+    v = round(rnd.uniform(-500, 250_000), 2)
+    return rnd.choice([v, v, f"{v:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."), int(v), None, ""])
+
+
+def _sim(rnd: random.Random) -> Any:
+    return rnd.choice(["SIM", "NÃO", "NAO", "S", "N", None, "sim"])
+
+
+def _celula(col: str, emp: Dict[str, Any], rnd: random.Random) -> Any:
+    c = col.upper()
+    if c in ("CNPJ RAIZ", "CNPJ"):
+        return emp["cnpj"]
+    if c == "CGF":
+        return emp["cgf"]
+    if c in ("RAZÃO", "RAZAO"):
+        return emp["razao"]
+    if c == "ENTREGA_EFD":
+        return rnd.choice(["Omisso", "Entregue", "Entregue", "OMISSA"])
+    if c == "DOCUMENTO":
+        return rnd.choice(["EFD ICMS/IPI", "EFD Contribuições"])
+    if c in ("ANO_MES", "PERIODO DE REFERENCIA", "MÊS ANO REFERÊNCIA", "MES ANO REFERENCIA"):
+        return _periodo(rnd)
+    if c == "DATA VENCIMENTO":
+        return rnd.choice([datetime(2025, rnd.randint(1, 12), rnd.randint(1, 28)), "10/03/2025", None])
+    if c.startswith("CÓDIGO DE RECEITA") or c.startswith("CODIGO DE RECEITA"):
+        return rnd.choice([1015, 1023, "1031", None])
+    if c.startswith("DIAS DE ATRASO"):
+        return rnd.randint(0, 900)
+    if c in ("CHAVE DFE", "CHAVE"):
+        return "".join(rnd.choice("0123456789") for _ in range(44))
+    if c.startswith("NÚMERO DO DOC") or c.startswith("NUMERO DO DOC"):
+        return rnd.randint(1, 999_999)
+    if c == "ORIGEM DO DOCUMENTO":
+        return rnd.choice(["EMITENTE", "DESTINATARIO", None])
+    if c.startswith("DESCRIÇÃO DO IND") or c.startswith("DESCRICAO DO IND"):
+        return rnd.choice(INDICADORES)
+    if c.startswith("VALOR") or c.startswith("DIFEREN"):
+        return _valor(rnd)
+    if c in ("PENDENCIA NA SITUAÇÃO CADASTRAL", "PENDENCIA NA SITUACAO CADASTRAL", "INSCRITO NO CADIN",
+             "INSCRITO NO CADINE", "DEVEDOR CONTUMAZ", "INVENTÁRIO OMISSO", "INVENTARIO OMISSO"):
+        return _sim(rnd)
+    if c == "QUANTIDADE":
+        return rnd.randint(0, 100)
+    return rnd.choice(["texto livre", "  com espaços  ", None])
+
+
+def gerar_planilha(
+    path: Path,
+    linhas_por_aba: int = 1000,
+    *,
+    empresas: int = 200,
+    semente: int = 42,
+    prop_vazias: float = 0.02,
+) -> int:
+    """
+    Grava o .xlsx (openpyxl write_only) e retorna o total de linhas de
+    dados escritas nas abas aceitas (sem contar cabeçalho/linhas vazias).
+    """
+    rnd = random.Random(semente)
+    emps = _empresas(rnd, empresas)
+
+    wb = Workbook(write_only=True)
+    total = 0
+
+    for aba, variantes in ABAS.items():
+        ws = wb.create_sheet(aba)
+        cols = rnd.choice(variantes)
+        ws.append(cols)
+        n = linhas_por_aba if aba != "Resumo geral" else min(linhas_por_aba, 50)
+        for _ in range(n):
+            if rnd.random() < prop_vazias:
+                ws.append([None] * len(cols))
+                continue
+            emp = rnd.choice(emps)
+            ws.append([_celula(c, emp, rnd) for c in cols])
+            if aba != "Resumo geral":
+                total += 1
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(str(path))
+    return total
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Gera planilha sintética da SEFAZ")
+    ap.add_argument("saida", type=Path)
+    ap.add_argument("--linhas", type=int, default=1000, help="linhas por aba")
+    ap.add_argument("--empresas", type=int, default=200)
+    ap.add_argument("--semente", type=int, default=42)
+    args = ap.parse_args()
+
+    total = gerar_planilha(args.saida, args.linhas, empresas=args.empresas, semente=args.semente)
+    print(f"{args.saida}: {total} linhas de dados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Suíte de benchmark do pipeline, etapa por etapa, sobre uma planilha
+sintética (bench.gerar_planilha: as 8 abas de ABAS_ACEITAS, cabeçalhos com
+e sem acento, valores sujos).
+
+Etapas:
+  ler_excel           _ler_excel (leitor em streaming)
+  normalizar_df       normalizar_aba_df (vetorizado, aba inteira)
+  normalizar_por_aba  normalizar_por_aba linha a linha (regra compilada por
+                      cabeçalho, como a importação)
+  inserir             executemany + RAW compacto + resumo, numa transação
+  resumo              df_resumo_pendencias
+  detalhes            df_detalhes (DataFrame inteiro)
+  detalhes_lotes      iterar_detalhes (como o rodar.py exporta)
+  exportar            exportar_para_sheets, reescrita completa (gspread fake)
+  exportar_delta      exportar_para_sheets de novo, sem mudanças (só hashes)
+  exportar_xlsx       DestinoXlsx, detalhes inteiros (sem corte) em streaming
+  exportar_csv        DestinoCsv, idem
+
+Cada etapa roda num processo novo (spawn): o pico de RSS é só dela
+(amostrado durante a parte medida; a preparação fica de fora do tempo,
+mas o que ela deixou em memória conta no RSS). Precisa de /proc (Linux)
+ou do pacote psutil para o RSS; sem nenhum dos dois o campo fica null.
+
+O resultado vai para bench/resultados/*.json; com --comparar, mostra a
+diferença para um resultado anterior e sai com código 1 se alguma etapa
+ficou mais lenta que a tolerância.
+
+Uso:
+  python -m bench.suite --linhas-por-aba 20000
+  python -m bench.suite --etapas ler_excel,inserir --repeticoes 3
+  python -m bench.suite --comparar bench/resultados/suite-20250801-101500-abc1234.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.telemetria import rss_atual
+
+RAIZ = Path(__file__).resolve().parents[1]
+PASTA_RESULTADOS = RAIZ / "bench" / "resultados"
+
+# Ctx: parâmetros e caminhos que as etapas recebem (precisa ser picklable)
+Ctx = Dict[str, Any]
+
+
+# =========================
+# Memória
+# =========================
+
+class _PicoRss:
+    """Amostra o RSS numa thread enquanto a etapa roda."""
+
+    def __init__(self, intervalo: float = 0.005):
+        self.intervalo = intervalo
+        self.inicial = rss_atual()
+        self.pico = self.inicial
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            self._registrar()
+
+    def _registrar(self) -> None:
+        rss = rss_atual()
+        if rss is not None and (self.pico is None or rss > self.pico):
+            self.pico = rss
+
+    def __enter__(self) -> "_PicoRss":
+        if self.inicial is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.inicial is not None:
+            self._parar.set()
+            self._thread.join()
+            self._registrar()
+
+
+def _mb(n: Optional[int]) -> Optional[float]:
+    return None if n is None else round(n / 1024 / 1024, 1)
+
+
+# =========================
+# Etapas
+# =========================
+#
+# Cada etapa prepara o que precisa (fora do tempo) e devolve a função
+# medida, que retorna quantas linhas processou.
+
+def _etapa_ler_excel(ctx: Ctx) -> Callable[[], int]:
+    from app.importar import _ler_excel
+
+    def rodar() -> int:
+        return sum(len(df) for _, df in _ler_excel(Path(ctx["planilha"]), motor=ctx["motor"], tamanho_lote=ctx["lote"]))
+    return rodar
+
+
+def _etapa_normalizar_df(ctx: Ctx) -> Callable[[], int]:
+    from app.importar import _ler_excel
+    from app.normalizar import normalizar_aba_df
+
+    lotes = list(_ler_excel(Path(ctx["planilha"]), motor=ctx["motor"], tamanho_lote=ctx["lote"]))
+
+    def rodar() -> int:
+        return sum(len(normalizar_aba_df(aba, df)) for aba, df in lotes)
+    return rodar
+
+
+def _etapa_normalizar_por_aba(ctx: Ctx) -> Callable[[], int]:
+    from app.importar import _ler_excel
+    from app.normalizar import normalizar_por_aba
+
+    from .bench_insercao import _to_row_dicts
+
+    linhas = [
+        (aba, r)
+        for aba, df in _ler_excel(Path(ctx["planilha"]), motor=ctx["motor"], tamanho_lote=ctx["lote"])
+        for r in _to_row_dicts(df)
+    ]
+
+    def rodar() -> int:
+        for aba, r in linhas:
+            normalizar_por_aba(aba, r)
+        return len(linhas)
+    return rodar
+
+
+def _etapa_inserir(ctx: Ctx) -> Callable[[], int]:
+    from app.banco import atualizar_resumo, inserir_lote, trocar_contribuintes, ultimo_id_raw
+    from app.importar import _SQL_INSERIR, _conectar_db, _iniciar_schema, _lotes_do_arquivo
+    from app.raw_compacto import gravar_bloco
+
+    planilha = Path(ctx["planilha"])
+    data_coleta = datetime.now().isoformat(timespec="seconds")
+    lotes = list(_lotes_do_arquivo(planilha, data_coleta, ctx["motor"], ctx["lote"], ctx["codec_raw"]))
+
+    con = _conectar_db(Path(ctx["pasta"]) / f"inserir-{os.getpid()}.db")
+    _iniciar_schema(con)
+
+    def rodar() -> int:
+        # mesmo caminho do importar._gravar_arquivo, sem mover o arquivo
+        lidas = 0
+        con.execute("BEGIN;")
+        id_antes = ultimo_id_raw(con)
+        for linhas, bloco in lotes:
+            lidas += len(linhas)
+            inserir_lote(con, _SQL_INSERIR, trocar_contribuintes(con, linhas), ctx["lote"])
+            gravar_bloco(con, planilha.name, bloco)
+        atualizar_resumo(con, id_antes)
+        con.commit()
+        return lidas
+    return rodar
+
+
+def _conectar_base(ctx: Ctx):
+    from app.banco import conectar
+    return conectar(ctx["base"])
+
+
+def _etapa_resumo(ctx: Ctx) -> Callable[[], int]:
+    from app.resumo import df_resumo_pendencias
+    con = _conectar_base(ctx)
+    return lambda: len(df_resumo_pendencias(con))
+
+
+def _etapa_detalhes(ctx: Ctx) -> Callable[[], int]:
+    from app.resumo import df_detalhes
+    con = _conectar_base(ctx)
+    return lambda: len(df_detalhes(con, limite=ctx["max_detalhes"]))
+
+
+def _etapa_detalhes_lotes(ctx: Ctx) -> Callable[[], int]:
+    from app.resumo import iterar_detalhes
+    con = _conectar_base(ctx)
+    return lambda: sum(len(df) for df in iterar_detalhes(con, limite=ctx["max_detalhes"]))
+
+
+def _preparar_exportacao(ctx: Ctx, estado_path: Optional[Path]) -> Callable[[], int]:
+    from app import exportar
+    from app.resumo import contar_detalhes, df_resumo_pendencias, iterar_detalhes
+
+    from .fake_gspread import ClienteFake
+
+    cliente = ClienteFake()
+    exportar._cliente_gspread = lambda *a, **k: cliente
+
+    con = _conectar_base(ctx)
+    df_resumo = df_resumo_pendencias(con)
+    linhas = min(len(df_resumo), ctx["max_resumo"]) + min(contar_detalhes(con), ctx["max_detalhes"])
+    con.close()
+
+    def fonte_detalhes():
+        c = _conectar_base(ctx)
+        try:
+            yield from iterar_detalhes(c, limite=ctx["max_detalhes"])
+        finally:
+            c.close()
+
+    def rodar() -> int:
+        exportar.exportar_para_sheets(
+            cliente.planilha.id,
+            "",
+            [],
+            aba_resumo_pendencias="RESUMO_PENDENCIAS",
+            aba_detalhes="DETALHES",
+            aba_status="STATUS",
+            df_resumo=df_resumo,
+            df_detalhes=fonte_detalhes,
+            texto_status="bench",
+            max_linhas_resumo=ctx["max_resumo"],
+            max_linhas_detalhes=ctx["max_detalhes"],
+            estado_path=estado_path,
+            # mede o custo local; a cota real é simulada só no fake com falhas
+            req_por_minuto=10 ** 9,
+        )
+        return linhas
+    return rodar
+
+
+def _etapa_exportar(ctx: Ctx) -> Callable[[], int]:
+    return _preparar_exportacao(ctx, None)
+
+
+def _etapa_exportar_delta(ctx: Ctx) -> Callable[[], int]:
+    estado = Path(ctx["pasta"]) / f"estado-{os.getpid()}.json"
+    rodar = _preparar_exportacao(ctx, estado)
+    rodar()  # primeira escrita (fora do tempo): a medida é a segunda, sem mudanças
+    return rodar
+
+
+def _preparar_exportacao_local(ctx: Ctx, criar: Callable[[Path], Any]) -> Callable[[], int]:
+    from app.resumo import contar_detalhes, df_resumo_pendencias, iterar_detalhes
+
+    con = _conectar_base(ctx)
+    df_resumo = df_resumo_pendencias(con)
+    linhas = len(df_resumo) + contar_detalhes(con)
+    con.close()
+
+    destino = criar(Path(ctx["pasta"]) / f"saida-{os.getpid()}")
+
+    def fonte_detalhes():
+        c = _conectar_base(ctx)
+        try:
+            yield from iterar_detalhes(c)
+        finally:
+            c.close()
+
+    def rodar() -> int:
+        destino.exportar(df_resumo=df_resumo, df_detalhes=fonte_detalhes, texto_status="bench")
+        return linhas
+    return rodar
+
+
+_ABAS = dict(aba_resumo_pendencias="RESUMO_PENDENCIAS", aba_detalhes="DETALHES", aba_status="STATUS")
+
+
+def _etapa_exportar_xlsx(ctx: Ctx) -> Callable[[], int]:
+    from app.exportar_local import DestinoXlsx
+    return _preparar_exportacao_local(ctx, lambda pasta: DestinoXlsx(pasta / "pendencias.xlsx", **_ABAS))
+
+
+def _etapa_exportar_csv(ctx: Ctx) -> Callable[[], int]:
+    from app.exportar_local import DestinoCsv
+    return _preparar_exportacao_local(ctx, lambda pasta: DestinoCsv(pasta, **_ABAS))
+
+
+ETAPAS: Dict[str, Callable[[Ctx], Callable[[], int]]] = {
+    "ler_excel": _etapa_ler_excel,
+    "normalizar_df": _etapa_normalizar_df,
+    "normalizar_por_aba": _etapa_normalizar_por_aba,
+    "inserir": _etapa_inserir,
+    "resumo": _etapa_resumo,
+    "detalhes": _etapa_detalhes,
+    "detalhes_lotes": _etapa_detalhes_lotes,
+    "exportar": _etapa_exportar,
+    "exportar_delta": _etapa_exportar_delta,
+    "exportar_xlsx": _etapa_exportar_xlsx,
+    "exportar_csv": _etapa_exportar_csv,
+}
+
+
+def _rodar_etapa(nome: str, ctx: Ctx) -> Dict[str, Any]:
+    """Roda no processo filho."""
+    rodar = ETAPAS[nome](ctx)
+    with _PicoRss() as mem:
+        t0 = time.perf_counter()
+        linhas = rodar()
+        segundos = time.perf_counter() - t0
+    r = {
+        "linhas": linhas,
+        "segundos": round(segundos, 4),
+        "rss_inicial_mb": _mb(mem.inicial),
+        "pico_rss_mb": _mb(mem.pico),
+    }
+    normalizar = sys.modules.get("app.normalizar")
+    if normalizar is not None:
+        # taxa de acerto dos caches dos parsers (processo novo: começa frio)
+        memo = {k: v for k, v in normalizar.estatisticas_memo().items() if v["acertos"] or v["faltas"]}
+        if memo:
+            r["memo"] = memo
+    return r
+
+
+def medir(nome: str, ctx: Ctx, repeticoes: int = 1) -> Dict[str, Any]:
+    """Melhor tempo de `repeticoes` execuções, cada uma num processo novo; pico = o maior."""
+    melhor: Optional[Dict[str, Any]] = None
+    picos = []
+    for _ in range(max(1, repeticoes)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            r = pool.submit(_rodar_etapa, nome, ctx).result()
+        picos.append(r["pico_rss_mb"])
+        if melhor is None or r["segundos"] < melhor["segundos"]:
+            melhor = r
+
+    melhor["pico_rss_mb"] = max((p for p in picos if p is not None), default=None)
+    melhor["linhas_por_s"] = round(melhor["linhas"] / melhor["segundos"]) if melhor["segundos"] else None
+    return melhor
+
+
+# =========================
+# Preparação / resultados
+# =========================
+
+def _montar_base(planilha: Path, pasta: Path, motor: str, lote: int, codec_raw: str) -> Path:
+    """Banco importado uma vez, para as etapas de leitura/exportação."""
+    from app.importar import importar_arquivos
+
+    entrada = pasta / "entrada"
+    entrada.mkdir(exist_ok=True)
+    copia = entrada / planilha.name
+    shutil.copy2(planilha, copia)
+
+    db = pasta / "base.db"
+    importar_arquivos(
+        [copia], pasta / "processados", pasta / "erros", db,
+        motor_excel=motor, tamanho_lote=lote, codec_raw=codec_raw,
+    )
+    return db
+
+
+def _versao_git() -> str:
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        sujo = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=RAIZ,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        return rev + ("+mod" if sujo else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecida"
+
+
+def comparar(atual: Dict[str, Any], anterior: Dict[str, Any], tolerancia: float) -> List[str]:
+    """Imprime a diferença por etapa e retorna as etapas que ficaram mais lentas que a tolerância."""
+    print(f"\nComparando com {anterior.get('versao')} ({anterior.get('quando')}):")
+    regressoes = []
+    for nome, r in atual["etapas"].items():
+        a = anterior.get("etapas", {}).get(nome)
+        if not a or not a.get("linhas_por_s") or not r.get("linhas_por_s"):
+            print(f"  {nome:<20} (sem referência)")
+            continue
+        dv = r["linhas_por_s"] / a["linhas_por_s"] - 1
+        dm = ""
+        if r.get("pico_rss_mb") is not None and a.get("pico_rss_mb") is not None:
+            dm = f"  pico {a['pico_rss_mb']:.0f} -> {r['pico_rss_mb']:.0f} MB"
+        marca = ""
+        if dv < -tolerancia:
+            regressoes.append(nome)
+            marca = "  ⚠️ REGRESSÃO"
+        print(f"  {nome:<20} {a['linhas_por_s']:>12,} -> {r['linhas_por_s']:>12,} linhas/s ({dv:+.1%}){dm}{marca}")
+    return regressoes
+
+
+def main() -> None:
+    from app.config import MAX_LINHAS_DETALHES, MAX_LINHAS_EXPORT, MOTOR_EXCEL, TAMANHO_LOTE
+
+    from .gerar_planilha import gerar_planilha
+
+    ap = argparse.ArgumentParser(description="Benchmark do pipeline por etapa")
+    ap.add_argument("--planilha", type=Path, default=None, help="usa uma planilha existente")
+    ap.add_argument("--linhas-por-aba", type=int, default=10000, help="tamanho da planilha gerada (8 abas)")
+    ap.add_argument("--semente", type=int, default=42)
+    ap.add_argument("--etapas", default=",".join(ETAPAS), help="lista separada por vírgula")
+    ap.add_argument("--repeticoes", type=int, default=1, help="fica com o melhor tempo")
+    ap.add_argument("--motor", default=MOTOR_EXCEL)
+    ap.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    ap.add_argument("--codec-raw", default="auto")
+    ap.add_argument("--saida", type=Path, default=None, help="arquivo JSON (padrão: bench/resultados/)")
+    ap.add_argument("--comparar", type=Path, default=None, help="JSON de uma execução anterior")
+    ap.add_argument("--tolerancia", type=float, default=0.10, help="queda de linhas/s aceita no --comparar")
+    args = ap.parse_args()
+
+    etapas = [e.strip() for e in args.etapas.split(",") if e.strip()]
+    desconhecidas = [e for e in etapas if e not in ETAPAS]
+    if desconhecidas:
+        ap.error(f"etapas desconhecidas: {', '.join(desconhecidas)} (use {', '.join(ETAPAS)})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta = Path(tmp)
+        planilha = args.planilha
+        if planilha is None:
+            planilha = pasta / "sintetica.xlsx"
+            gerar_planilha(planilha, args.linhas_por_aba, semente=args.semente)
+
+        ctx: Ctx = {
+            "planilha": str(planilha),
+            "pasta": str(pasta),
+            "motor": args.motor,
+            "lote": args.lote,
+            "codec_raw": args.codec_raw,
+            "max_resumo": MAX_LINHAS_EXPORT,
+            "max_detalhes": MAX_LINHAS_DETALHES,
+        }
+        if any(e in ("resumo", "detalhes", "detalhes_lotes", "exportar", "exportar_delta", "exportar_xlsx", "exportar_csv") for e in etapas):
+            ctx["base"] = str(_montar_base(planilha, pasta, args.motor, args.lote, args.codec_raw))
+
+        print(f"Planilha: {planilha.name} ({planilha.stat().st_size / 1024 / 1024:.1f} MB) | motor={args.motor} lote={args.lote}")
+        print(f"  {'etapa':<20} {'linhas':>9} {'segundos':>9} {'linhas/s':>12} {'pico RSS':>10}")
+
+        resultados: Dict[str, Any] = {}
+        for nome in etapas:
+            r = medir(nome, ctx, args.repeticoes)
+            resultados[nome] = r
+            pico = "-" if r["pico_rss_mb"] is None else f"{r['pico_rss_mb']:.0f} MB"
+            print(f"  {nome:<20} {r['linhas']:>9} {r['segundos']:>9.3f} {r['linhas_por_s'] or 0:>12,} {pico:>10}")
+
+    agora = datetime.now()
+    saida = {
+        "quando": agora.isoformat(timespec="seconds"),
+        "versao": _versao_git(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "planilha": str(args.planilha) if args.planilha else None,
+            "linhas_por_aba": None if args.planilha else args.linhas_por_aba,
+            "semente": args.semente,
+            "motor": args.motor,
+            "lote": args.lote,
+            "codec_raw": args.codec_raw,
+            "repeticoes": args.repeticoes,
+        },
+        "etapas": resultados,
+    }
+
+    destino = args.saida or PASTA_RESULTADOS / f"suite-{agora:%Y%m%d-%H%M%S}-{saida['versao']}.json"
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_text(json.dumps(saida, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 {destino}")
+
+    if args.comparar is not None:
+        anterior = json.loads(args.comparar.read_text(encoding="utf-8"))
+        if comparar(saida, anterior, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,342 @@
 import os
+import queue
+import threading
 import traceback
-from fastapi import FastAPI, Header, HTTPException
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
 
-app = FastAPI()
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+
+@asynccontextmanager
+async def _ciclo_de_vida(app: FastAPI):
+    # startup: confere o schema uma vez (ver _preparar_banco). Não derruba o
+    # uvicorn no boot nem espera um pipeline terminar: se não der, a
+    # primeira leitura tenta de novo
+    try:
+        from app.trava import TravaOcupada
+        try:
+            _preparar_banco(espera=0)
+        except TravaOcupada:
+            print("⏳ Pipeline rodando: o banco é preparado na primeira leitura.")
+    except Exception:
+        traceback.print_exc()
+    yield
+
+
+app = FastAPI(lifespan=_ciclo_de_vida)
 
 API_TOKEN = os.getenv("API_TOKEN", "")
 CREDS_PATH = os.getenv("CREDS_PATH", "/etc/secrets/credenciais.json")
 
+# quantos jobs terminados ficam guardados para consulta em /jobs/{id}
+MAX_JOBS_GUARDADOS = 50
+
+# respostas de /pendencias e /resumo guardadas por versão dos dados
+MAX_CONSULTAS_GUARDADAS = 512
+
+# segundos que uma leitura espera a trava do pipeline para preparar o banco
+# (só na primeira vez do processo); passou disso, 503
+ESPERA_TRAVA_LEITURA = 30.0
+
+
+# =========================
+# Fila de jobs
+# =========================
+#
+# /run só enfileira e devolve o id; uma thread executa os jobs um de cada
+# vez (e a trava do pipeline impede que um CLI rode junto).
+# Pedidos repetidos não empilham: se já existe um job na fila, /run devolve
+# esse mesmo job. Com um job rodando, no máximo mais UM fica na fila
+# (arquivos que chegaram depois do início ainda são importados).
+
+_jobs: Dict[str, Dict[str, Any]] = {}
+_fila: "queue.Queue[str]" = queue.Queue()
+_guarda = threading.Lock()
+_executor: Optional[threading.Thread] = None
+
+# app.consultas.CacheConsultas, criado na primeira consulta
+_cache_consultas = None
+
+# schema conferido (migrar + iniciar) uma vez por processo; depois disso
+# as leituras abrem o banco só para leitura
+_banco_pronto = False
+_trava_banco = threading.Lock()
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _autorizar(x_api_key: Optional[str]) -> None:
+    if not API_TOKEN or x_api_key != API_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+def _descartar_antigos() -> None:
+    terminados = [j for j in _jobs.values() if j["estado"] in ("concluido", "erro")]
+    for j in terminados[:max(0, len(terminados) - MAX_JOBS_GUARDADOS)]:
+        _jobs.pop(j["id"], None)
+
+
+def _executar_jobs() -> None:
+    while True:
+        job_id = _fila.get()
+        job = _jobs[job_id]
+
+        def progresso(etapa: str, contagens: Dict[str, Any]) -> None:
+            with _guarda:
+                job["etapa"] = etapa
+                job["contagens"].update(contagens)
+
+        with _guarda:
+            job["estado"] = "rodando"
+            job["iniciado_em"] = _agora()
+
+        try:
+            # Importa o pipeline só na hora de rodar (não derruba o uvicorn no boot)
+            from app.rodar import main as rodar_pipeline
+            contagens = rodar_pipeline(progresso=progresso, forcar=job["forcar"])
+            with _guarda:
+                job["estado"] = "concluido"
+                job["contagens"].update(contagens or {})
+        except Exception as e:
+            with _guarda:
+                job["estado"] = "erro"
+                job["erro"] = f"{e}\n{traceback.format_exc()}"
+        finally:
+            with _guarda:
+                job["terminado_em"] = _agora()
+                _descartar_antigos()
+
+
+def _enfileirar(forcar: bool = False) -> Dict[str, Any]:
+    global _executor
+
+    with _guarda:
+        na_fila = [j for j in _jobs.values() if j["estado"] == "na_fila"]
+        if na_fila:
+            # pedido com forcar vale para o job que já está na fila
+            na_fila[0]["forcar"] = na_fila[0]["forcar"] or forcar
+            return {**na_fila[0], "duplicado": True}
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "estado": "na_fila",
+            "etapa": None,
+            "contagens": {},
+            "criado_em": _agora(),
+            "iniciado_em": None,
+            "terminado_em": None,
+            "erro": None,
+            "forcar": forcar,
+        }
+        _jobs[job["id"]] = job
+
+        if _executor is None or not _executor.is_alive():
+            _executor = threading.Thread(target=_executar_jobs, name="pipeline-jobs", daemon=True)
+            _executor.start()
+
+        _fila.put(job["id"])
+        return {**job, "duplicado": False}
+
+
+def _preparar_banco(espera: Optional[float]) -> bool:
+    """
+    migrar + iniciar uma vez por processo (no startup; se o banco ainda não
+    existia, na primeira leitura depois que a importação criar). Retorna
+    se o banco existe.
+
+    Migrar e iniciar escrevem no banco: rodam com a trava do pipeline, para
+    não correr junto com um job de /run ou um CLI (primeiro start, ou logo
+    depois de uma atualização com migração nova). Levanta TravaOcupada se
+    a trava não vier em `espera` segundos.
+    """
+    global _banco_pronto
+    from app.config import DB_PATH
+
+    with _trava_banco:
+        if _banco_pronto:
+            return True
+        if not DB_PATH.exists():
+            return False
+
+        from app.banco import conectar, iniciar
+        from app.trava import trava_pipeline
+
+        with trava_pipeline(timeout=espera):
+            con = conectar(str(DB_PATH))
+            try:
+                iniciar(con)
+            finally:
+                con.close()
+        _banco_pronto = True
+        return True
+
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
-@app.post("/run")
-def run(x_api_key: str | None = Header(default=None)):
-    if not API_TOKEN or x_api_key != API_TOKEN:
-        raise HTTPException(status_code=401, detail="Unauthorized")
+@app.post("/run", status_code=202)
+def run(forcar: bool = False, x_api_key: str | None = Header(default=None)):
+    """forcar=true: resume e exporta mesmo sem arquivo novo (senão só o STATUS é atualizado)."""
+    _autorizar(x_api_key)
 
     if not os.path.exists(CREDS_PATH):
         raise HTTPException(status_code=500, detail=f"Credenciais não encontradas em {CREDS_PATH}")
 
+    job = _enfileirar(forcar)
+    return {
+        "ok": True,
+        "job_id": job["id"],
+        "estado": job["estado"],
+        "duplicado": job["duplicado"],
+        "message": "Pipeline já estava na fila" if job["duplicado"] else "Pipeline enfileirada",
+    }
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str, x_api_key: str | None = Header(default=None)):
+    _autorizar(x_api_key)
+
+    with _guarda:
+        job = _jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job não encontrado")
+        return {**job, "contagens": dict(job["contagens"])}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(x_api_key: str | None = Header(default=None)):
+    """
+    Formato texto do Prometheus: tempo, linhas, linhas/s e pico de memória
+    de cada etapa (run_log) + jobs por estado + cache das consultas.
+    """
+    _autorizar(x_api_key)
+
+    with _guarda:
+        por_estado = {e: 0 for e in ("na_fila", "rodando", "concluido", "erro")}
+        for j in _jobs.values():
+            por_estado[j["estado"]] = por_estado.get(j["estado"], 0) + 1
+
+    linhas = [
+        "# HELP pendencias_jobs Jobs guardados na API, por estado.",
+        "# TYPE pendencias_jobs gauge",
+    ] + [f'pendencias_jobs{{estado="{e}"}} {n}' for e, n in por_estado.items()]
+    if _cache_consultas is not None:
+        linhas += [
+            "# HELP pendencias_consultas_cache_total Consultas de /pendencias e /resumo, por resultado no cache.",
+            "# TYPE pendencias_consultas_cache_total counter",
+            f'pendencias_consultas_cache_total{{resultado="acerto"}} {_cache_consultas.acertos}',
+            f'pendencias_consultas_cache_total{{resultado="falta"}} {_cache_consultas.faltas}',
+        ]
+    texto = "\n".join(linhas) + "\n"
+
+    # Importa só na hora (não derruba o uvicorn no boot)
+    from app.trava import TravaOcupada
+
     try:
-        # Importa o pipeline só na hora de rodar (não derruba o uvicorn no boot)
-        from app.rodar import main as rodar_pipeline
-        rodar_pipeline()
-        return {"ok": True, "message": "Pipeline executada"}
-    except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"{e}\n{tb}")
+        banco_pronto = _preparar_banco(ESPERA_TRAVA_LEITURA)
+    except TravaOcupada:
+        # pipeline rodando antes do banco ser preparado: só as métricas da API
+        banco_pronto = False
+
+    if banco_pronto:
+        from app.config import DB_PATH
+        from app.banco import conectar_leitura
+        from app.telemetria import metricas_prometheus
+
+        con = conectar_leitura(str(DB_PATH))
+        try:
+            texto += metricas_prometheus(con)
+        finally:
+            con.close()
+
+    return PlainTextResponse(texto, media_type="text/plain; version=0.0.4")
+
+
+# =========================
+# Consultas (GET /pendencias, GET /resumo)
+# =========================
+#
+# Leitura direta do banco, por índice e paginada por cursor (ver
+# app/consultas.py), numa conexão só de leitura. O ETag é a versão dos
+# dados (muda a cada arquivo importado e a cada rebuild do resumo):
+# If-None-Match igual devolve 304 sem consultar nada, e entre importações
+# a mesma pergunta sai do cache do processo.
+
+def _responder_consulta(nome: str, if_none_match: Optional[str], x_api_key: Optional[str], **parametros: Any) -> Response:
+    global _cache_consultas
+    _autorizar(x_api_key)
+
+    # Importa só na hora (não derruba o uvicorn no boot)
+    from app.config import DB_PATH
+    from app.banco import conectar_leitura, versao_dados
+    from app.consultas import CacheConsultas, CursorInvalido, consultar
+    from app.trava import TravaOcupada
+
+    try:
+        banco_pronto = _preparar_banco(ESPERA_TRAVA_LEITURA)
+    except TravaOcupada:
+        raise HTTPException(status_code=503, detail="Pipeline rodando e o banco ainda não foi preparado; tente de novo")
+    if not banco_pronto:
+        raise HTTPException(status_code=503, detail="Banco ainda não existe (nenhuma importação)")
+    if _cache_consultas is None:
+        _cache_consultas = CacheConsultas(MAX_CONSULTAS_GUARDADAS)
+
+    con = conectar_leitura(str(DB_PATH))
+    try:
+        versao = versao_dados(con)
+        etag = f'"{versao}"'
+        cabecalhos = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=cabecalhos)
+
+        try:
+            corpo = consultar(con, _cache_consultas, versao, nome, **parametros)
+        except CursorInvalido as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        con.close()
+
+    return JSONResponse(corpo, headers=cabecalhos)
+
+@app.get("/pendencias")
+def pendencias(
+    cnpj: str | None = None,
+    cgf: str | None = None,
+    tipo: str | None = None,
+    periodo: str | None = None,
+    limite: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+    x_api_key: str | None = Header(default=None),
+):
+    """
+    Pendências classificadas (mesmas colunas da aba DETALHES + id), mais
+    recentes primeiro. Próxima página: ?cursor=<proximo da resposta>.
+    """
+    return _responder_consulta(
+        "pendencias", if_none_match, x_api_key,
+        cnpj=cnpj, cgf=cgf, tipo=tipo, periodo=periodo, limite=limite, cursor=cursor,
+    )
+
+@app.get("/resumo")
+def resumo(
+    cnpj: str | None = None,
+    cgf: str | None = None,
+    tipo: str | None = None,
+    periodo: str | None = None,
+    limite: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+    x_api_key: str | None = Header(default=None),
+):
+    """Resumo por contribuinte/tipo/período (mesmas colunas da aba RESUMO_PENDENCIAS), paginado por cursor."""
+    return _responder_consulta(
+        "resumo", if_none_match, x_api_key,
+        cnpj=cnpj, cgf=cgf, tipo=tipo, periodo=periodo, limite=limite, cursor=cursor,
+    )
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import pytest
+
+from app.banco import conectar, iniciar, inserir_lote, trocar_contribuintes, ultimo_id_raw
+from app.eventos import ALTERADA, NOVA, RESOLVIDA, iterar_eventos, registrar_eventos, tipos_das_abas
+from app.importar import _SQL_INSERIR, _tupla_linha
+from app.normalizar import normalizar_por_aba
+
+
+# =========================
+# Eventos entre coletas
+# =========================
+#
+# Cada coleta passa pelo mesmo caminho da importação (normalizar_por_aba,
+# _tupla_linha, inserir_lote, registrar_eventos), sem planilha.
+
+DEBITOS = "Débitos"
+LIMITADORES = "Outros limitadores"
+
+A = {"CNPJ RAIZ": "11.111.111", "CGF": "1", "RAZÃO": "EMPRESA A"}
+B = {"CNPJ RAIZ": "22.222.222", "CGF": "2", "RAZÃO": "EMPRESA B"}
+
+
+def _debito(contribuinte: Dict[str, Any], cod: str, total: float) -> Dict[str, Any]:
+    return {
+        **contribuinte, "PERIODO DE REFERENCIA": "2025-08", "DATA VENCIMENTO": "2025-09-10",
+        "VALOR TOTAL": total, "CÓDIGO DE RECEITA DO DÉBITO": cod, "DIAS DE ATRASO DO DÉBITO NÃO PAGO": 3,
+    }
+
+
+def _limitador(contribuinte: Dict[str, Any], cadin: str = "NAO", devedor: str = "NAO") -> Dict[str, Any]:
+    return {
+        **contribuinte, "PENDENCIA NA SITUAÇÃO CADASTRAL": "NAO", "INSCRITO NO CADIN": cadin,
+        "DEVEDOR CONTUMAZ": devedor, "INVENTÁRIO OMISSO": "NAO",
+    }
+
+
+@pytest.fixture()
+def con(tmp_path):
+    con = conectar(str(tmp_path / "pendencias.db"))
+    iniciar(con)
+    yield con
+    con.close()
+
+
+def _coletar(con, arquivo: str, abas: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+    """Importa as linhas de cada aba como um arquivo e registra os eventos."""
+    id_antes = ultimo_id_raw(con)
+    data_coleta = f"2025-09-{arquivo[-1]}T10:00:00"
+    for aba, linhas in abas.items():
+        tuplas = [
+            _tupla_linha(normalizar_por_aba(aba, linha), arquivo, aba, i + 2, data_coleta, None)
+            for i, linha in enumerate(linhas)
+        ]
+        inserir_lote(con, _SQL_INSERIR, trocar_contribuintes(con, tuplas))
+    eventos = registrar_eventos(con, id_antes, tipos_das_abas(abas))
+    con.commit()
+    return eventos
+
+
+def _eventos(con) -> List[Dict[str, Any]]:
+    return [
+        linha for lote in iterar_eventos(con) for linha in lote.to_dict("records")
+    ]
+
+
+def test_primeira_coleta_e_a_base(con):
+    eventos = _coletar(con, "coleta1", {DEBITOS: [_debito(A, "1015", 100.0)], LIMITADORES: [_limitador(A, cadin="SIM")]})
+
+    assert eventos == {NOVA: 0, RESOLVIDA: 0, ALTERADA: 0}
+    assert _eventos(con) == []
+    assert con.execute("SELECT COUNT(*) FROM pendencias_vigentes").fetchone()[0] == 2
+
+
+def test_nova_alterada_resolvida(con):
+    _coletar(con, "coleta1", {DEBITOS: [_debito(A, "1015", 100.0), _debito(A, "1023", 50.0), _debito(A, "1031", 7.0)]})
+    eventos = _coletar(con, "coleta2", {DEBITOS: [_debito(A, "1015", 100.0), _debito(A, "1023", 80.0), _debito(A, "1040", 9.0)]})
+
+    assert eventos == {NOVA: 1, RESOLVIDA: 1, ALTERADA: 1}
+    por_item = {e["item"]: e for e in _eventos(con)}
+    assert set(por_item) == {"1023", "1031", "1040"}  # 1015 não mudou
+
+    assert por_item["1040"]["evento"] == NOVA
+    assert (por_item["1040"]["qtd_anterior"], por_item["1040"]["qtd"], por_item["1040"]["valor"]) == (None, 1, 9.0)
+    assert por_item["1023"]["evento"] == ALTERADA
+    assert (por_item["1023"]["valor_anterior"], por_item["1023"]["valor"]) == (50.0, 80.0)
+    assert por_item["1031"]["evento"] == RESOLVIDA
+    assert (por_item["1031"]["qtd_anterior"], por_item["1031"]["qtd"]) == (1, None)
+    assert {e["arquivo_origem"] for e in por_item.values()} == {"coleta2"}
+
+    # vigentes passa a ser o conjunto da coleta 2
+    itens = [r[0] for r in con.execute("SELECT item FROM pendencias_vigentes ORDER BY item")]
+    assert itens == ["1015", "1023", "1040"]
+
+
+def test_fora_do_escopo_nao_resolve(con):
+    _coletar(con, "coleta1", {
+        DEBITOS: [_debito(A, "1015", 100.0), _debito(B, "1015", 30.0)],
+        LIMITADORES: [_limitador(A, cadin="SIM")],
+    })
+
+    # arquivo só com A, e sem a aba de limitadores: nem o débito de B nem o
+    # limitador de A são dados como resolvidos
+    eventos = _coletar(con, "coleta2", {DEBITOS: [_debito(A, "1015", 100.0)]})
+    assert eventos == {NOVA: 0, RESOLVIDA: 0, ALTERADA: 0}
+
+    # contribuinte novo: a primeira coleta dele também é base
+    C = {"CNPJ RAIZ": "33.333.333", "CGF": "3", "RAZÃO": "EMPRESA C"}
+    eventos = _coletar(con, "coleta3", {DEBITOS: [_debito(A, "1015", 100.0), _debito(C, "1015", 5.0)]})
+    assert eventos == {NOVA: 0, RESOLVIDA: 0, ALTERADA: 0}
+
+    # aba lida e B presente: o 1015 de B resolve, o de C (fora do arquivo) não
+    eventos = _coletar(con, "coleta4", {DEBITOS: [_debito(A, "1015", 100.0), _debito(B, "1040", 1.0)]})
+    assert eventos == {NOVA: 1, RESOLVIDA: 1, ALTERADA: 0}
+    assert sorted((e["evento"], e["cnpj"], e["item"]) for e in _eventos(con)) == [
+        (NOVA, "22222222", "1040"), (RESOLVIDA, "22222222", "1015"),
+    ]
+
+
+def test_rotulo_trocado_e_uma_alterada(con):
+    _coletar(con, "coleta1", {LIMITADORES: [_limitador(A, cadin="SIM"), _limitador(B, devedor="SIM")]})
+    eventos = _coletar(con, "coleta2", {LIMITADORES: [_limitador(A, devedor="SIM"), _limitador(B)]})
+
+    assert eventos == {NOVA: 0, RESOLVIDA: 1, ALTERADA: 1}
+    por_cnpj = {e["cnpj"]: e for e in _eventos(con)}
+    assert por_cnpj["11111111"]["evento"] == ALTERADA
+    assert (por_cnpj["11111111"]["rotulos_anterior"], por_cnpj["11111111"]["rotulos"]) == ("CADIN=SIM", "DEVEDOR_CONTUMAZ=SIM")
+    assert por_cnpj["11111111"]["item"] == ""
+    # B sem nenhum SIM: a linha vem sem tipo, mas B está no arquivo e a aba foi lida
+    assert por_cnpj["22222222"]["evento"] == RESOLVIDA
+    assert por_cnpj["22222222"]["rotulos_anterior"] == "DEVEDOR_CONTUMAZ=SIM"
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Any, List, Optional
+
+import pandas as pd
+import pytest
+
+from app import exportar
+from bench.fake_gspread import ClienteFake
+
+
+# =========================
+# _plano_delta
+# =========================
+
+def _aplicar(antigos: List[str], novos: List[str], plano) -> List[Optional[str]]:
+    """Aplica o plano numa cópia de `antigos`, como a planilha faria."""
+    estrutura, trechos = plano
+    grade: List[Optional[str]] = list(antigos)
+    for op, a, b in estrutura:
+        if op == "inserir":
+            grade[a:a] = [None] * (b - a)
+        else:
+            del grade[a:b]
+    for a, b in trechos:
+        grade[a:b] = novos[a:b]
+    return grade
+
+
+def test_plano_delta_reproduz_a_lista_nova():
+    rnd = random.Random(7)
+    for _ in range(2000):
+        alfabeto = rnd.choice([3, 10, 1000])  # poucos valores = muitas linhas repetidas
+        antigos = [str(rnd.randrange(alfabeto)) for _ in range(rnd.randint(0, 30))]
+        novos = list(antigos)
+        for _ in range(rnd.randint(0, 6)):
+            sorteio = rnd.random()
+            if sorteio < 0.33 and novos:
+                del novos[rnd.randrange(len(novos))]
+            elif sorteio < 0.66:
+                novos.insert(rnd.randint(0, len(novos)), str(rnd.randrange(alfabeto)))
+            elif novos:
+                novos[rnd.randrange(len(novos))] = str(rnd.randrange(alfabeto))
+
+        plano = exportar._plano_delta(antigos, novos, limite=10 ** 9)
+        assert _aplicar(antigos, novos, plano) == novos
+
+
+def test_plano_delta_poucas_mudancas_em_lista_grande():
+    antigos = [f"h{i}" for i in range(200_000)]
+    novos = antigos[:100] + ["novo1", "novo2"] + antigos[100:5000] + antigos[5100:]
+    novos[150_000] = "trocado"
+
+    estrutura, trechos = exportar._plano_delta(antigos, novos)
+    assert estrutura == [("apagar", 5000, 5100), ("inserir", 100, 102)]
+    assert trechos == [(100, 102), (150_000, 150_001)]
+
+
+def test_plano_delta_acima_do_limite_reescreve():
+    # uma linha sim, outra não: 100k apagamentos espalhados
+    antigos = [f"h{i}" for i in range(200_000)]
+    assert exportar._plano_delta(antigos, antigos[::2]) is None
+
+
+# =========================
+# exportar_para_sheets (planilha fake)
+# =========================
+
+def _df(n: int, trocar: int = -1) -> pd.DataFrame:
+    return pd.DataFrame({
+        "cnpj": [f"{i:08d}" for i in range(n)],
+        "valor": [f"{i * (2 if i == trocar else 1)}.0" for i in range(n)],
+    })
+
+
+@pytest.fixture()
+def cliente(monkeypatch):
+    cliente = ClienteFake()
+    monkeypatch.setattr(exportar, "_cliente_gspread", lambda *a, **k: cliente)
+    return cliente
+
+
+def _exportar(estado_path: Path, detalhes: Any) -> None:
+    exportar.exportar_para_sheets(
+        "PLANILHA_FAKE", "", [],
+        aba_resumo_pendencias="RESUMO_PENDENCIAS", aba_detalhes="DETALHES", aba_status="STATUS",
+        df_resumo=_df(3), df_detalhes=detalhes, texto_status="teste",
+        max_linhas_resumo=1000, max_linhas_detalhes=100_000,
+        estado_path=estado_path, req_por_minuto=10 ** 9, celulas_por_bloco=100,
+    )
+
+
+def test_delta_escreve_so_o_que_mudou_e_grava_hashes_uma_vez(cliente, tmp_path, monkeypatch):
+    estado_path = tmp_path / "estado_export.json"
+    _exportar(estado_path, _df(500))
+
+    gravados: List[Path] = []
+    salvar = exportar.salvar_estado
+    monkeypatch.setattr(exportar, "salvar_estado", lambda p, e: (gravados.append(p), salvar(p, e)))
+    cliente.planilha.chamadas.clear()
+
+    novo = _df(500, trocar=42).drop(index=range(200, 210))
+    _exportar(estado_path, novo)
+
+    esperado = [novo.columns.tolist()] + novo.astype(str).values.tolist()
+    assert cliente.planilha.aba("DETALHES").dados(ncols=2) == esperado
+    assert ("clear", "DETALHES") not in cliente.planilha.chamadas
+    assert ("batch_update", "DETALHES", 1) in cliente.planilha.chamadas  # só a linha 42
+
+    # hashes: o arquivo principal uma vez só, no fim
+    assert gravados.count(estado_path) == 1
+    assert set(exportar.carregar_estado(estado_path)) == {"PLANILHA_FAKE/RESUMO_PENDENCIAS", "PLANILHA_FAKE/DETALHES"}
+
+
+def test_escrita_interrompida_invalida_os_hashes_da_aba(cliente, tmp_path, monkeypatch):
+    estado_path = tmp_path / "estado_export.json"
+    _exportar(estado_path, _df(500))
+
+    def quebra_no_envio():
+        # 1ª passada (hashes) inteira, 2ª cai no meio
+        quebra_no_envio.passadas += 1
+        yield _df(300)
+        if quebra_no_envio.passadas > 1:
+            raise RuntimeError("caiu")
+        yield _df(300).assign(cnpj="x")
+    quebra_no_envio.passadas = 0
+
+    # o processo "morre": o estado final não chega a ser gravado
+    monkeypatch.setattr(exportar, "_salvar_estado_export", lambda p, e: None)
+    with pytest.raises(RuntimeError):
+        _exportar(estado_path, quebra_no_envio)
+
+    # as duas abas foram escritas nessa execução (o RESUMO por delta) e os
+    # hashes novos não chegaram ao disco: os antigos não valem mais
+    assert "PLANILHA_FAKE/DETALHES" in exportar.carregar_estado(estado_path)
+    estado = exportar._carregar_estado_export(estado_path)
+    assert "PLANILHA_FAKE/DETALHES" not in estado
+    assert "PLANILHA_FAKE/RESUMO_PENDENCIAS" not in estado
+
+    # e a próxima exportação reescreve tudo e volta a ter estado
+    monkeypatch.undo()
+    monkeypatch.setattr(exportar, "_cliente_gspread", lambda *a, **k: cliente)
+    _exportar(estado_path, _df(400))
+    assert cliente.planilha.aba("DETALHES").dados(ncols=2) == [["cnpj", "valor"]] + _df(400).values.tolist()
+    assert "PLANILHA_FAKE/DETALHES" in exportar._carregar_estado_export(estado_path)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from app.importar import importar_pasta
+from bench.gerar_planilha import gerar_planilha
+
+
+# =========================
+# Importação paralela: falha na gravadora
+# =========================
+
+def test_erro_no_progresso_sobe_no_modo_paralelo(tmp_path: Path):
+    """Com a gravadora morta o laço para de enviar e o erro chega a quem chamou."""
+    entrada = tmp_path / "entrada"
+    entrada.mkdir()
+    for semente in range(8):
+        gerar_planilha(entrada / f"sintetica-{semente}.xlsx", linhas_por_aba=5, empresas=3, semente=semente)
+
+    avisos: List[Dict[str, Any]] = []
+
+    def progresso(info: Dict[str, Any]) -> None:
+        avisos.append(info)
+        raise RuntimeError("progresso quebrado")
+
+    with pytest.raises(RuntimeError, match="progresso quebrado"):
+        importar_pasta(
+            entrada, tmp_path / "processados", tmp_path / "erros", tmp_path / "pendencias.db",
+            workers=2, progresso=progresso,
+        )
+
+    assert len(avisos) == 1
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from app import leitor
+from app.importar import ABAS_ACEITAS, _ler_excel
+from app.regras_abas import REGRAS
+from bench.gerar_planilha import gerar_planilha
+
+
+ABAS = {r["aba"] for r in REGRAS}
+
+
+@pytest.fixture(scope="module")
+def planilha(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("leitor") / "sintetica.xlsx"
+    gerar_planilha(path, linhas_por_aba=60, empresas=10, semente=3)
+    return path
+
+
+class _WorkbookVigiado:
+    """CalamineWorkbook que registra o close() e pode quebrar depois de N abas."""
+
+    def __init__(self, wb: Any, quebrar_apos: int = -1):
+        self._wb = wb
+        self.sheet_names = wb.sheet_names
+        self.quebrar_apos = quebrar_apos
+        self.fechado = False
+        self.abertas = 0
+
+    def get_sheet_by_name(self, aba: str) -> Any:
+        if self.abertas == self.quebrar_apos:
+            raise RuntimeError("calamine quebrou")
+        self.abertas += 1
+        return self._wb.get_sheet_by_name(aba)
+
+    def close(self) -> None:
+        self.fechado = True
+        self._wb.close()
+
+
+@pytest.fixture()
+def vigiar(monkeypatch):
+    # só os testes do calamine usam: sem o pacote, o "auto" fica no openpyxl
+    pytest.importorskip("python_calamine")
+    abertos: List[_WorkbookVigiado] = []
+    abrir = leitor._abrir_calamine
+
+    def instalar(quebrar_apos: int = -1) -> List[_WorkbookVigiado]:
+        def abrir_vigiado(path: Path) -> _WorkbookVigiado:
+            abertos.append(_WorkbookVigiado(abrir(path), quebrar_apos))
+            return abertos[-1]
+        monkeypatch.setattr(leitor, "_abrir_calamine", abrir_vigiado)
+        return abertos
+    return instalar
+
+
+def _lotes(planilha: Path, motor: str) -> List[Any]:
+    return list(leitor.iterar_lotes(planilha, ABAS, motor=motor, tamanho_lote=25))
+
+
+def test_calamine_igual_openpyxl_e_fecha_o_arquivo(planilha, vigiar):
+    abertos = vigiar()
+    assert _lotes(planilha, "calamine") == _lotes(planilha, "openpyxl")
+    assert [wb.fechado for wb in abertos] == [True]
+
+
+def test_leitura_abandonada_fecha_o_arquivo(planilha, vigiar):
+    abertos = vigiar()
+    lotes = leitor.iterar_lotes(planilha, ABAS, motor="calamine", tamanho_lote=25)
+    next(lotes)
+    lotes.close()
+    assert abertos[0].fechado
+
+
+def test_auto_continua_com_openpyxl_se_o_calamine_falha_no_meio(planilha, vigiar):
+    esperado = _lotes(planilha, "openpyxl")
+    abertos = vigiar(quebrar_apos=3)
+
+    assert _lotes(planilha, "auto") == esperado
+    assert abertos[0].abertas == 3 and abertos[0].fechado
+
+
+def test_motor_calamine_nao_cai_para_openpyxl(planilha, vigiar):
+    abertos = vigiar(quebrar_apos=3)
+    with pytest.raises(RuntimeError, match="calamine quebrou"):
+        _lotes(planilha, "calamine")
+    assert abertos[0].fechado
+
+
+# =========================
+# Mesmos valores do pd.read_excel (tipos inferidos por coluna)
+# =========================
+
+def _registros(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    return [
+        {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in r.items()}
+        for r in df.to_dict("records")
+    ]
+
+
+def _como_read_excel(path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    abas = pd.read_excel(path, sheet_name=None, engine="openpyxl")
+    return {aba: _registros(df.dropna(how="all")) for aba, df in abas.items() if aba in ABAS_ACEITAS}
+
+
+def _como_ler_excel(path: Path, motor: str) -> Dict[str, List[Dict[str, Any]]]:
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for aba, df in _ler_excel(path, motor=motor, tamanho_lote=100_000):
+        out.setdefault(aba, []).extend(_registros(df))
+    return out
+
+
+@pytest.fixture(scope="module")
+def planilha_tipos(tmp_path_factory) -> Path:
+    """CGF em texto com zero à esquerda, inteiros com vazios, linha vazia e coluna sem cabeçalho."""
+    path = tmp_path_factory.mktemp("tipos") / "tipos.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Débitos"
+    ws.append(["CNPJ RAIZ", "CGF", "PERIODO DE REFERENCIA", "CODIGO DE RECEITA DO DEBITO", "VALOR TOTAL", None])
+    ws.append(["12345678", "060001234", datetime(2025, 2, 1), 1015, "1.234,56"])
+    ws.append(["12345678", "060001235", datetime(2025, 3, 1), None, 10.5, "obs extra"])
+    ws.append([None] * 6)
+    ws.append(["02345678", "060001236", datetime(2025, 4, 1), 1015, 7])
+    wb.save(str(path))
+    return path
+
+
+@pytest.mark.parametrize("motor", ["openpyxl", "calamine"])
+def test_ler_excel_igual_read_excel(planilha, planilha_tipos, motor):
+    if motor == "calamine":
+        pytest.importorskip("python_calamine")
+    for path in (planilha, planilha_tipos):
+        assert _como_ler_excel(path, motor) == _como_read_excel(path)
+
+
+def test_coluna_sem_cabecalho_com_dados_e_mantida(planilha_tipos):
+    (_, df), = _ler_excel(planilha_tipos, motor="openpyxl")
+    assert list(df.columns)[-1] == "Unnamed: 5"
+    assert df.loc[3, "Unnamed: 5"] == "obs extra"
+    assert df.loc[2, "CGF"] == 60001234
+    assert df.loc[2, "CODIGO DE RECEITA DO DEBITO"] == 1015.0
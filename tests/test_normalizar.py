@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+import pytest
+
+from app.importar import _ler_excel, _sem_nan
+from app.normalizar import (
+    _is_sim, compilar_aba, limpar_cgf, limpar_cnpj_raiz, limpar_razao, normalizar_aba_df,
+    normalizar_por_aba, numero, periodo_from_data, texto,
+)
+from app.regras_abas import REGRAS
+from bench.gerar_planilha import ABAS, gerar_planilha
+
+
+# =========================
+# Referência: o normalizar_por_aba antigo (if/elif por aba)
+# =========================
+#
+# As regras de regras_abas.REGRAS têm que dar, aba por aba, o mesmo que a
+# lógica escrita à mão de antes delas (mais o `item` de cada aba).
+
+def _referencia(aba: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    aba_lower = (aba or "").lower().strip()
+
+    cnpj = limpar_cnpj_raiz(row.get("CNPJ RAIZ") or row.get("CNPJ"))
+    cgf = limpar_cgf(row.get("CGF"))
+    razao = limpar_razao(row.get("RAZÃO") or row.get("RAZAO") or "")
+
+    tipo = periodo = detalhe = data_ref = item = ""
+    valor = None
+    referencia = row.get("MÊS ANO REFERÊNCIA") or row.get("MES ANO REFERENCIA")
+    desc = texto(row.get("DESCRIÇÃO DO INDICADOR") or row.get("DESCRICAO DO INDICADOR"))
+    num_doc = texto(row.get("NÚMERO DO DOCUMENTO FISCAL") or row.get("NUMERO DO DOCUMENTO FISCAL"))
+    dif = numero(row.get("DIFERENÇA") or row.get("DIFERENCA"))
+
+    if "omissões de efd" in aba_lower or "omissoes de efd" in aba_lower:
+        entrega = texto(row.get("ENTREGA_EFD"))
+        if "OMISS" in entrega.upper():
+            tipo = "EFD_OMISSAO"
+            periodo = periodo_from_data(row.get("ANO_MES"))
+            item = texto(row.get("DOCUMENTO"))
+            detalhe = f"DOCUMENTO={item}; ENTREGA_EFD={entrega}; ANO_MES={texto(row.get('ANO_MES'))}"
+
+    elif "débitos" in aba_lower or "debitos" in aba_lower:
+        tipo = "DEBITO"
+        periodo = periodo_from_data(row.get("PERIODO DE REFERENCIA"))
+        data_ref = texto(row.get("DATA VENCIMENTO"))
+        valor = numero(row.get("VALOR TOTAL"))
+        item = texto(row.get("CÓDIGO DE RECEITA DO DÉBITO") or row.get("CODIGO DE RECEITA DO DEBITO"))
+        dias = texto(row.get("DIAS DE ATRASO DO DÉBITO NÃO PAGO") or row.get("DIAS DE ATRASO DO DEBITO NAO PAGO"))
+        detalhe = f"COD_RECEITA={item}; VENC={data_ref}; DIAS_ATRASO={dias}; TOTAL={valor}"
+
+    elif "omissões e divergências de nfe" in aba_lower or "omissoes e divergencias de nfe" in aba_lower:
+        tipo = "NFE_DIVERGENCIA"
+        periodo = periodo_from_data(referencia)
+        item = texto(row.get("CHAVE DFE"))
+        val_escr = numero(row.get("VALOR ESCRITURADO"))
+        val_dfe = numero(row.get("VALOR DO DFE"))
+        valor = dif if dif is not None else val_dfe
+        detalhe = (
+            f"{desc} | CHAVE={item} | NUM_DOC={num_doc} | ORIGEM={texto(row.get('ORIGEM DO DOCUMENTO'))}"
+            f" | ESCR={val_escr} | DFE={val_dfe} | DIF={dif}"
+        )
+
+    elif "nfe inexistente declarada" in aba_lower:
+        tipo = "NFE_INEXISTENTE"
+        item = texto(row.get("CHAVE DFE"))
+        valor = numero(row.get("VALOR DIVERGENTE"))
+        detalhe = f"CHAVE={item}; VALOR_DIVERGENTE={valor}"
+
+    elif "cfe" in aba_lower or "cte" in aba_lower:
+        tipo = "CFE_DIVERGENCIA" if "cfe" in aba_lower else "CTE_DIVERGENCIA"
+        periodo = periodo_from_data(referencia)
+        item = texto(row.get("CHAVE DFE") or row.get("CHAVE"))
+        val_dfe = numero(row.get("VALOR DO DFE") or row.get("VALOR"))
+        valor = dif if dif is not None else val_dfe
+        detalhe = f"{desc} | CHAVE={item}".strip(" |")
+
+    elif "reg_pas" in aba_lower or "reg pas" in aba_lower:
+        tipo = "REGISTRO_PASSAGEM"
+        periodo = periodo_from_data(referencia)
+        item = texto(row.get("CHAVE DFE") or row.get("CHAVE"))
+        valor = numero(row.get("VALOR DO DFE") or row.get("VALOR"))
+        detalhe = f"CHAVE={item} | NUM_DOC={num_doc} | ORIGEM={texto(row.get('ORIGEM DO DOCUMENTO'))}".strip(" |")
+
+    elif "outros limitadores" in aba_lower:
+        marcas = [
+            (row.get("PENDENCIA NA SITUAÇÃO CADASTRAL") or row.get("PENDENCIA NA SITUACAO CADASTRAL"), "CADASTRAL=SIM"),
+            (row.get("INSCRITO NO CADINE") or row.get("INSCRITO NO CADIN"), "CADIN=SIM"),
+            (row.get("DEVEDOR CONTUMAZ"), "DEVEDOR_CONTUMAZ=SIM"),
+            (row.get("INVENTÁRIO OMISSO") or row.get("INVENTARIO OMISSO"), "INVENTARIO_OMISSO=SIM"),
+        ]
+        partes = [rotulo for v, rotulo in marcas if _is_sim(v)]
+        if partes:
+            tipo = "OUTROS_LIMITADORES"
+            detalhe = "; ".join(partes)
+
+    return {
+        "cnpj": cnpj, "cgf": cgf, "razao": razao, "tipo_pendencia": tipo, "periodo": periodo,
+        "detalhe": detalhe, "valor": valor, "data_referencia": data_ref, "item": item,
+    }
+
+
+def _iguais(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """Dicts iguais, com NaN == NaN."""
+    if a.keys() != b.keys():
+        return False
+    for k in a:
+        x, y = a[k], b[k]
+        if isinstance(x, float) and isinstance(y, float) and math.isnan(x) and math.isnan(y):
+            continue
+        if x != y:
+            return False
+    return True
+
+
+# =========================
+# Planilhas sintéticas (as 8 abas, cabeçalhos com e sem acento)
+# =========================
+
+SEMENTES = range(6)
+
+
+@pytest.fixture(scope="module")
+def lotes(tmp_path_factory) -> List[Tuple[str, pd.DataFrame]]:
+    """(aba, df) de cada planilha, lidos como a importação lê."""
+    pasta = tmp_path_factory.mktemp("planilhas")
+    out: List[Tuple[str, pd.DataFrame]] = []
+    for semente in SEMENTES:
+        path = pasta / f"sintetica-{semente}.xlsx"
+        gerar_planilha(path, linhas_por_aba=150, empresas=30, semente=semente)
+        out += list(_ler_excel(Path(path)))
+    return out
+
+
+@pytest.fixture(scope="module")
+def linhas_por_aba(lotes) -> Dict[str, List[Tuple[Tuple[str, ...], List[Any]]]]:
+    """aba -> [(cabeçalho, valores)]."""
+    linhas: Dict[str, List[Tuple[Tuple[str, ...], List[Any]]]] = {}
+    for aba, df in lotes:
+        colunas = tuple(df.columns)
+        for valores in df.itertuples(index=False, name=None):
+            linhas.setdefault(aba, []).append((colunas, [_sem_nan(v) for v in valores]))
+    return linhas
+
+
+def test_planilhas_cobrem_as_8_abas_e_as_variantes_de_cabecalho(linhas_por_aba):
+    assert sorted(linhas_por_aba) == sorted(r["aba"] for r in REGRAS)
+    for aba, linhas in linhas_por_aba.items():
+        assert len({colunas for colunas, _ in linhas}) == len(ABAS[aba]), aba
+
+
+@pytest.mark.parametrize("aba", [r["aba"] for r in REGRAS])
+def test_regra_compilada_igual_a_referencia(linhas_por_aba, aba):
+    diferentes = []
+    com_tipo = 0
+    for colunas, valores in linhas_por_aba[aba]:
+        esperado = _referencia(aba, dict(zip(colunas, valores)))
+        # o caminho da importação (tupla) e o por dict
+        obtido = compilar_aba(aba, colunas)(valores)
+        por_dict = normalizar_por_aba(aba, dict(zip(colunas, valores)))
+        if not (_iguais(obtido, esperado) and _iguais(por_dict, esperado)):
+            diferentes.append((valores, esperado, obtido))
+        com_tipo += bool(esperado["tipo_pendencia"])
+
+    assert not diferentes, diferentes[:3]
+    assert com_tipo > 0
+
+
+@pytest.mark.parametrize("aba", [r["aba"] for r in REGRAS])
+def test_vetorizado_igual_a_referencia(lotes, aba):
+    diferentes = []
+    total = 0
+    for aba_lote, df in lotes:
+        if aba_lote != aba:
+            continue
+        obtidos = normalizar_aba_df(aba, df).to_dict("records")
+        assert len(obtidos) == len(df)
+        for valores, obtido in zip(df.itertuples(index=False, name=None), obtidos):
+            esperado = _referencia(aba, dict(zip(df.columns, [_sem_nan(v) for v in valores])))
+            if not _iguais(obtido, esperado):
+                diferentes.append((valores, esperado, obtido))
+            total += 1
+
+    assert not diferentes, diferentes[:3]
+    assert total > 0
+
+
+def test_aba_sem_regra_sai_sem_tipo():
+    linha = normalizar_por_aba("Resumo geral", {"CNPJ": "12.345.678", "CGF": "06.123-4", "RAZÃO": " X "})
+    assert linha == {
+        "cnpj": "12345678", "cgf": "061234", "razao": "X", "tipo_pendencia": "", "periodo": "",
+        "detalhe": "", "valor": None, "data_referencia": "", "item": "",
+    }
+    df = pd.DataFrame([{"CNPJ": "12.345.678", "CGF": "06.123-4", "RAZÃO": " X "}])
+    assert normalizar_aba_df("Resumo geral", df).to_dict("records") == [linha]
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import itertools
+import sqlite3
+from typing import List
+
+import pytest
+
+from app import consultas
+from app.banco import conectar, iniciar
+from app.migracoes import migrar, plano, problemas_do_plano, verificar_planos
+from app.resumo import _SQL_DETALHES, _SQL_RESUMO
+
+
+# =========================
+# Planos das consultas (relatórios e API)
+# =========================
+#
+# Nenhuma consulta de relatório ou da API pode varrer pendencias_raw
+# inteira (SCAN sem índice) nem ordenar numa B-tree temporária: é o que
+# python -m app.migracoes verificar confere, aqui num banco migrado do zero.
+
+@pytest.fixture()
+def con(tmp_path):
+    con = conectar(str(tmp_path / "pendencias.db"))
+    migrar(con)
+    iniciar(con)
+
+    # um cnpj com dois cgf (a API consulta por contribuinte_id) e um outro
+    con.executemany(
+        "INSERT INTO contribuintes (cnpj, cgf, razao) VALUES (?,?,?)",
+        [("11111111", "1", "A"), ("11111111", "2", "A FILIAL"), ("22222222", "3", "B")],
+    )
+    linhas = [
+        (1 + i % 3, tipo, f"2025-0{1 + i % 2}", float(i), f"2025-08-0{1 + i % 3}")
+        for i, tipo in zip(range(60), itertools.cycle(["DEBITO", "EFD_OMISSAO", ""]))
+    ]
+    con.executemany(
+        "INSERT INTO pendencias_raw (contribuinte_id, tipo_pendencia, periodo, valor, data_coleta) VALUES (?,?,?,?,?)",
+        linhas,
+    )
+    con.execute("""
+    INSERT INTO resumo_pendencias (contribuinte_id, tipo_pendencia, periodo, qtd, valor_total, ultima_coleta)
+    SELECT contribuinte_id, tipo_pendencia, periodo, COUNT(*), SUM(valor), MAX(data_coleta)
+    FROM pendencias_raw WHERE tipo_pendencia <> '' GROUP BY 1, 2, 3
+    """)
+    con.commit()
+    yield con
+    con.close()
+
+
+@pytest.mark.parametrize("sql, params", [(_SQL_RESUMO, ()), (_SQL_DETALHES, (-1,)), (_SQL_DETALHES, (1000,))])
+def test_relatorios_sem_scan_nem_btree_temporaria(con, sql, params):
+    assert problemas_do_plano(plano(con, sql, params)) == []
+
+
+def test_verificar_planos_ok(con):
+    assert verificar_planos(con) == {}
+
+
+def _consultas_da_api(con: sqlite3.Connection) -> List[str]:
+    """
+    SQL (com os valores já no texto) de cada página lida por /pendencias e
+    /resumo, e da busca dos contribuintes do filtro (_ids_contribuintes).
+    """
+    sqls: List[str] = []
+    con.set_trace_callback(sqls.append)
+    try:
+        for nome in consultas.CONSULTAS:
+            filtros = itertools.product([None, "11111111", "22222222"], [None, "1"], [None, "DEBITO"], [None, "2025-01"])
+            for cnpj, cgf, tipo, periodo in filtros:
+                cursor = None
+                for _ in range(2):  # primeira página e a seguinte (keyset)
+                    r = consultas.consultar(
+                        con, consultas.CacheConsultas(), "v", nome,
+                        cnpj=cnpj, cgf=cgf, tipo=tipo, periodo=periodo, limite=2, cursor=cursor,
+                    )
+                    cursor = r["proximo"]
+                    if cursor is None:
+                        break
+    finally:
+        con.set_trace_callback(None)
+    return [s for s in sqls if any(f"FROM {t}" in s for t in ("pendencias_raw", "resumo_pendencias", "contribuintes"))]
+
+
+def test_api_keyset_sem_scan_nem_btree_temporaria(con):
+    sqls = _consultas_da_api(con)
+    assert any("r.id < " in s for s in sqls) and any(") > (" in s for s in sqls)
+    # filtro só por cgf, só por cnpj e pelos dois
+    assert {"cgf = '1'", "cnpj = '11111111'"} <= {
+        c for s in sqls if "FROM contribuintes" in s for c in s.split("WHERE ")[1].split(" AND ")
+    }
+
+    ruins = {s: problemas_do_plano(plano(con, s)) for s in sqls}
+    assert {s: p for s, p in ruins.items() if p} == {}
+
+
+@pytest.mark.parametrize("nome", list(consultas.CONSULTAS))
+def test_api_paginas_de_varios_contribuintes(con, nome):
+    """Um cnpj com vários cgf: páginas na ordem certa, sem repetir nem pular linha."""
+    filtro = "c.cnpj = '11111111'"
+    if nome == "pendencias":
+        sql = f"""SELECT r.id FROM pendencias_raw r JOIN contribuintes c ON c.id = r.contribuinte_id
+        WHERE {filtro} AND r.tipo_pendencia <> '' ORDER BY r.id DESC"""
+        chave = lambda item: item["id"]
+    else:
+        sql = f"""SELECT c.cgf, r.tipo_pendencia, r.periodo FROM resumo_pendencias r
+        JOIN contribuintes c ON c.id = r.contribuinte_id WHERE {filtro}
+        ORDER BY r.contribuinte_id, r.tipo_pendencia, r.periodo"""
+        chave = lambda item: (item["cgf"], item["tipo_pendencia"], item["periodo"])
+    esperado = [r[0] if nome == "pendencias" else tuple(r) for r in con.execute(sql)]
+
+    lidos, cursor = [], None
+    while True:
+        r = consultas.CONSULTAS[nome](con, cnpj="11.111.111", limite=3, cursor=cursor)
+        lidos += [chave(item) for item in r["itens"]]
+        cursor = r["proximo"]
+        if cursor is None:
+            break
+
+    assert len(esperado) > 3
+    assert lidos == esperado
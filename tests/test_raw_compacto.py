@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from openpyxl import Workbook
+
+from app.importar import importar_pasta
+from app.raw_compacto import obter_linha_raw
+
+
+ABA = "Débitos"
+COLUNAS = ["CNPJ RAIZ", "CGF", "RAZÃO", "PERIODO DE REFERENCIA", "DATA VENCIMENTO", "VALOR TOTAL"]
+
+
+def _planilha(path: Path, linhas: List[List[Any]]) -> None:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = ABA
+    ws.append(COLUNAS)
+    for linha in linhas:
+        ws.append(linha)
+    wb.save(str(path))
+
+
+def _importar(tmp_path: Path, linhas: List[List[Any]]) -> sqlite3.Connection:
+    entrada = tmp_path / "entrada"
+    entrada.mkdir(exist_ok=True)
+    _planilha(entrada / "coleta.xlsx", linhas)
+    db = tmp_path / "pendencias.db"
+    r = importar_pasta(entrada, tmp_path / "processados", tmp_path / "erros", db)
+    assert r["arquivos_importados"] == 1
+    return sqlite3.connect(str(db))
+
+
+LINHAS = [
+    ["12345678", "060001234", "ACME LTDA", "02/2025", datetime(2025, 3, 10), 1500.5],
+    ["23456789", "060005678", "BETA ME", "03/2025", datetime(2025, 4, 10), None],
+    ["34567890", "060009012", "GAMA SA", "04/2025", datetime(2025, 5, 10), 42],
+]
+
+
+def _esperado(cnpj: int, cgf: int, razao: str, periodo: str, venc: str, valor: Any) -> dict:
+    return {"aba": ABA, "row": dict(zip(COLUNAS, [cnpj, cgf, razao, periodo, venc, valor]))}
+
+
+@pytest.fixture()
+def con(tmp_path):
+    con = _importar(tmp_path, LINHAS)
+    yield con
+    con.close()
+
+
+def test_obter_linha_raw_devolve_a_linha_original(con):
+    # valores como o pd.read_excel entregava (CGF numérico, data em texto no JSON)
+    assert obter_linha_raw(con, "coleta.xlsx", ABA, 2) == _esperado(
+        12345678, 60001234, "ACME LTDA", "02/2025", "2025-03-10 00:00:00", 1500.5)
+    assert obter_linha_raw(con, "coleta.xlsx", ABA, 3) == _esperado(
+        23456789, 60005678, "BETA ME", "03/2025", "2025-04-10 00:00:00", None)
+    assert obter_linha_raw(con, "coleta.xlsx", ABA, 4) == _esperado(
+        34567890, 60009012, "GAMA SA", "04/2025", "2025-05-10 00:00:00", 42.0)
+    assert obter_linha_raw(con, "coleta.xlsx", ABA, 5) is None
+    assert obter_linha_raw(con, "outra.xlsx", ABA, 2) is None
+    # RAW compacto: nada em raw_json
+    assert con.execute("SELECT COUNT(*) FROM pendencias_raw WHERE raw_json IS NOT NULL").fetchone()[0] == 0
+
+
+def test_linha_antiga_le_raw_json(con):
+    """Linha gravada antes do RAW compacto: sem bloco, com raw_json."""
+    antigo = {"aba": ABA, "row": {"CNPJ RAIZ": 12345678.0, "CGF": "antes"}}
+    con.execute("DELETE FROM raw_bloco")
+    con.execute(
+        "UPDATE pendencias_raw SET raw_json=? WHERE arquivo_origem=? AND aba_origem=? AND linha_origem=?",
+        (json.dumps(antigo, ensure_ascii=False), "coleta.xlsx", ABA, 2),
+    )
+    assert obter_linha_raw(con, "coleta.xlsx", ABA, 2) == antigo
+    assert obter_linha_raw(con, "coleta.xlsx", ABA, 3) is None
+
+
+def test_arquivo_reimportado_vale_a_importacao_mais_recente(tmp_path, con):
+    con.close()
+    # mesmo nome, conteúdo novo (hash diferente): importa de novo
+    novas = [list(LINHAS[0]), list(LINHAS[1])]
+    novas[0][2] = "ACME LTDA (NOVA RAZÃO)"
+    con2 = _importar(tmp_path, novas)
+    try:
+        assert obter_linha_raw(con2, "coleta.xlsx", ABA, 2)["row"]["RAZÃO"] == "ACME LTDA (NOVA RAZÃO)"
+        assert obter_linha_raw(con2, "coleta.xlsx", ABA, 3) == _esperado(
+            23456789, 60005678, "BETA ME", "03/2025", "2025-04-10 00:00:00", None)
+        # a linha 4 só existia na primeira importação
+        assert obter_linha_raw(con2, "coleta.xlsx", ABA, 4)["row"]["RAZÃO"] == "GAMA SA"
+    finally:
+        con2.close()